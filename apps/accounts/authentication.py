@@ -0,0 +1,60 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .cache import load_user
+from .tokens import InvalidToken, decode_token
+
+
+def user_from_claims(claims):
+    """
+    Return the user of access token claims, or None if it no longer exists.
+    The cached user is preferred; a miss loads the row (and caches it), so
+    a deactivated user is rejected without waiting for its token to expire.
+    """
+    return load_user(claims['sub'])
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Stateless bearer authentication with signed access tokens.
+
+        Authorization: Bearer <access token>
+
+    Verifying a token needs no database query: the signature and expiry
+    are checked locally, revocations come from an in-memory list and the
+    user from the cache (the row is only read on a cache miss).
+    """
+
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid bearer token header.'))
+
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid bearer token header.'))
+
+        return self.authenticate_credentials(token)
+
+    def authenticate_credentials(self, token):
+        try:
+            claims = decode_token(token)
+        except InvalidToken as e:
+            raise exceptions.AuthenticationFailed(str(e))
+
+        user = user_from_claims(claims)
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, claims)
+
+    def authenticate_header(self, request):
+        return f'{self.keyword} realm="api"'
@@ -0,0 +1,17 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .cache import load_user
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose ``get_user`` is served from the user cache.
+    Session-authenticated requests resolve ``request.user`` without
+    hitting the users table once the user is cached.
+    """
+
+    def get_user(self, user_id):
+        user = load_user(user_id)
+        if user is None:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,54 @@
+"""Per-user cache used on the authentication hot path"""
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+USER_CACHE_KEY = 'accounts:user:{user_id}'
+
+
+def _user_key(user_id) -> str:
+    return USER_CACHE_KEY.format(user_id=user_id)
+
+
+def _timeout() -> int:
+    return getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+
+
+def get_cached_user(user_id):
+    """Return the cached user instance for ``user_id`` or None on a miss"""
+    return cache.get(_user_key(user_id))
+
+
+def cache_user(user) -> None:
+    """
+    Write-through a freshly saved or loaded user.
+    Instances with deferred fields are dropped instead of cached, so a
+    partial instance never shadows the complete row.
+    """
+    if user.pk is None:
+        return
+    if user.get_deferred_fields():
+        invalidate_user(user.pk)
+        return
+    cache.set(_user_key(user.pk), user, _timeout())
+
+
+def invalidate_user(user_id) -> None:
+    """Remove a user from the cache"""
+    cache.delete(_user_key(user_id))
+
+
+def load_user(user_id) -> Optional[object]:
+    """Return the user from the cache, falling back to the database"""
+    from .models import User
+
+    user = get_cached_user(user_id)
+    if user is not None:
+        return user
+    try:
+        user = User._default_manager.get(pk=user_id)
+    except User.DoesNotExist:
+        return None
+    cache_user(user)
+    return user
@@ -0,0 +1,66 @@
+"""Transactional emails, built inside the mail queue worker"""
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMultiAlternatives
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .models import User
+
+
+def build_password_reset_email(email):
+    """Return the password reset message for ``email``, or None if no account uses it"""
+    user = User.objects.filter(email=email).first()
+    if user is None:
+        # Do not inform the user that the email does not exist (security)
+        return None
+
+    # Generate a unique token
+    token = default_token_generator.make_token(user)
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+
+    # Building the reset URL
+    reset_url = f"{settings.FRONTEND_URL}/reset-password/{uid}-{token}"
+
+    # Email preparation
+    subject = "Réinitialisation de votre mot de passe ThiCodeAI"
+    html_message = f"""
+    <h2>Réinitialisation de mot de passe</h2>
+    <p>Bonjour {user.username},</p>
+    
+    <p>Vous avez demandé la réinitialisation de votre mot de passe sur ThiCodeAI.</p>
+    
+    <p><a href="{reset_url}">Cliquez ici pour définir un nouveau mot de passe</a></p>
+    
+    <p>Ou copiez-collez ce lien dans votre navigateur :<br>
+    {reset_url}</p>
+    
+    <p>Ce lien est valable pendant 24 heures.</p>
+    
+    <p>Si vous n'avez pas demandé cette réinitialisation, ignorez simplement cet email.</p>
+    
+    <p>L'équipe ThiCodeAI</p>
+    """
+    message = f"""
+    Bonjour {user.username},
+    
+    Vous avez demandé la réinitialisation de votre mot de passe sur ThiCodeAI.
+    
+    Cliquez sur le lien suivant pour définir un nouveau mot de passe :
+    {reset_url}
+    
+    Ce lien est valable pendant 24 heures.
+    
+    Si vous n'avez pas demandé cette réinitialisation, ignorez simplement cet email.
+    
+    L'équipe ThiCodeAI
+    """
+
+    email_message = EmailMultiAlternatives(
+        subject=subject,
+        body=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email]
+    )
+    email_message.attach_alternative(html_message, "text/html")
+    return email_message
@@ -0,0 +1,70 @@
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.conf import settings
+from django.core.cache import cache
+from django.test import RequestFactory
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.accounts.authentication import SignedTokenAuthentication
+from apps.accounts.models import User
+from apps.accounts.tokens import issue_token_pair
+from apps.core.benchmark import BenchmarkCommand, measure
+
+
+def _view_for(authentication_class):
+    class BenchView(APIView):
+        authentication_classes = [authentication_class]
+        permission_classes = [IsAuthenticated]
+
+        def get(self, request):
+            return Response({'id': request.user.pk})
+
+    return BenchView.as_view()
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare per-request authentication overhead (session, DRF token, signed token)'
+
+    def run(self, iterations, **options):
+        user = User.objects.create_user('bench-auth', 'bench-auth@example.com', 'bench-password')
+        factory = RequestFactory()
+
+        session_store = SessionMiddleware(lambda r: None).SessionStore()
+        session_store[SESSION_KEY] = str(user.pk)
+        session_store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session_store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session_store.save()
+
+        drf_token = Token.objects.create(user=user)
+        access = issue_token_pair(user)['access']
+
+        def through_middleware(view):
+            return SessionMiddleware(AuthenticationMiddleware(view))
+
+        modes = [
+            ('session', through_middleware(_view_for(SessionAuthentication)),
+             lambda: factory.get('/', HTTP_COOKIE=f'{settings.SESSION_COOKIE_NAME}={session_store.session_key}')),
+            ('drf-token', through_middleware(_view_for(TokenAuthentication)),
+             lambda: factory.get('/', HTTP_AUTHORIZATION=f'Token {drf_token.key}')),
+            ('signed-token', through_middleware(_view_for(SignedTokenAuthentication)),
+             lambda: factory.get('/', HTTP_AUTHORIZATION=f'Bearer {access}')),
+        ]
+
+        rows = []
+        for name, view, make_request in modes:
+            for state in ('cold', 'warm'):
+                if state == 'cold':
+                    cache.clear()
+
+                def call():
+                    response = view(make_request())
+                    assert response.status_code == 200, (name, response.status_code)
+
+                rows.append({'mode': name, 'cache': state, **measure(call, iterations if state == 'warm' else 1)})
+
+        self.report(rows, ['mode', 'cache', 'iterations', 'mean_us', 'p50_us', 'p95_us', 'queries_per_call'])
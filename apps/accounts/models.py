@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from .preferences import merge_patch
+
 class User(AbstractUser):
     """
     Extension of Django's basic User model.
@@ -23,7 +25,34 @@ class User(AbstractUser):
         preferences = self.preferences.copy()
         preferences['ai_model'] = model_name
         self.preferences = preferences
-        self.save()
+        self.save(update_fields=['preferences', 'date_modified'])
+
+    def update_preferences(self, patch):
+        """
+        Merge ``patch`` into the preferences (JSON merge patch semantics).
+        Only the preferences column is written, and only when it changes.
+        """
+        preferences = merge_patch(self.preferences, patch)
+        if preferences != self.preferences:
+            self.preferences = preferences
+            self.save(update_fields=['preferences', 'date_modified'])
+        return self.preferences
+
+    class Meta:
+        db_table = 'users' # Explicit name in database
+
+class RevokedToken(models.Model):
+    """
+    Revoked signed token (see tokens.py).
+    Rows are only needed until the token would have expired anyway.
+    """
+
+    jti = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.jti
 
     class Meta:
-        db_table = 'users' # Explicit name in database
\ No newline at end of file
+        db_table = 'revoked_tokens'
@@ -0,0 +1,20 @@
+"""User preferences helpers"""
+import copy
+
+
+def merge_patch(target, patch):
+    """
+    Apply a JSON merge patch (RFC 7396) to ``target`` and return the result.
+    Objects are merged recursively, ``None`` removes a key and any other
+    value replaces the existing one. ``target`` is left untouched.
+    """
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+
+    result = copy.deepcopy(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
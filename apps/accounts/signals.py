@@ -0,0 +1,29 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import cache_user, get_cached_user, invalidate_user
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def write_through_user_cache(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the cached copy in sync with every save.
+    Partial saves only patch the saved fields onto the cached copy, so a
+    stale instance saving ``last_login`` can't roll back newer preferences.
+    """
+    if not update_fields:
+        cache_user(instance)
+        return
+
+    cached = get_cached_user(instance.pk)
+    if cached is None:
+        return
+    for field_name in update_fields:
+        setattr(cached, field_name, getattr(instance, field_name))
+    cache_user(cached)
+
+
+@receiver(post_delete, sender=User)
+def evict_user_cache(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
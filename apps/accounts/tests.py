@@ -1,3 +1,59 @@
+import time
+
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import SignedTokenAuthentication
+from .models import User
+from .tokens import InvalidToken, decode_token, issue_token_pair, revocation_list, rotate_refresh_token
+
+
+class SignedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('tokens', 'tokens@example.com', 'x')
+        self.token = issue_token_pair(self.user)['access']
+        self.authentication = SignedTokenAuthentication()
+
+    def test_valid_token(self):
+        user, claims = self.authentication.authenticate_credentials(self.token)
+        self.assertEqual((user.pk, claims), (self.user.pk, decode_token(self.token)))
+
+    def test_deactivated_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token)
+
+    def test_deactivated_user_is_rejected_on_a_cache_miss(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.clear()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token)
+
+    def test_deleted_user_is_rejected(self):
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token)
+
+
+class RefreshTokenTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('refresh', 'refresh@example.com', 'x')
+        self.refresh = issue_token_pair(self.user)['refresh']
+        self.addCleanup(revocation_list.clear)
+
+    def test_refresh_token_is_single_use(self):
+        user, tokens = rotate_refresh_token(self.refresh)
+        self.assertEqual(user, self.user)
+        self.assertEqual(decode_token(tokens['refresh'], 'refresh')['sub'], self.user.pk)
+
+        # Another process, whose in-memory list has not seen the revocation yet
+        revocation_list.clear()
+        revocation_list._loaded_at = time.monotonic()
+        with self.assertRaisesMessage(InvalidToken, 'Token has been revoked'):
+            rotate_refresh_token(self.refresh)
 
-# Create your tests here.
+    def test_access_token_only_identifies_the_user(self):
+        claims = decode_token(issue_token_pair(self.user)['access'])
+        self.assertEqual(set(claims), {'sub', 'typ', 'jti', 'iat', 'exp'})
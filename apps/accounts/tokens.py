@@ -0,0 +1,183 @@
+"""
+Stateless signed tokens for the API.
+
+Access tokens are short-lived and only identify the user (``sub``); the
+user itself comes from the user cache. Refresh tokens are long-lived and
+rotated on every use. Tokens are signed with ``django.core.signing``:
+the current key signs, fallback keys still verify, which gives key
+rotation without invalidating tokens in flight.
+"""
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+TOKEN_SALT = 'apps.accounts.tokens'
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+DEFAULTS = {
+    'ACCESS_LIFETIME': 300,
+    'REFRESH_LIFETIME': 14 * 24 * 3600,
+    'SIGNING_KEY': None,
+    'FALLBACK_KEYS': [],
+    'REVOCATION_RELOAD_INTERVAL': 30,
+}
+
+
+class InvalidToken(Exception):
+    """Raised when a token is malformed, badly signed, expired or revoked"""
+    pass
+
+
+def token_settings(name):
+    return getattr(settings, 'SIGNED_TOKENS', {}).get(name, DEFAULTS[name])
+
+
+def _signing_key():
+    return token_settings('SIGNING_KEY') or settings.SECRET_KEY
+
+
+def _encode(claims) -> str:
+    return signing.dumps(claims, key=_signing_key(), salt=TOKEN_SALT)
+
+
+def _claims_for(user, token_type: str, lifetime: int) -> dict:
+    now = int(time.time())
+    return {
+        'sub': user.pk,
+        'typ': token_type,
+        'jti': uuid.uuid4().hex,
+        'iat': now,
+        'exp': now + lifetime,
+    }
+
+
+def issue_token_pair(user) -> dict:
+    """Issue a new access/refresh token pair for ``user``"""
+    access_lifetime = token_settings('ACCESS_LIFETIME')
+    return {
+        'access': _encode(_claims_for(user, ACCESS, access_lifetime)),
+        'refresh': _encode(_claims_for(user, REFRESH, token_settings('REFRESH_LIFETIME'))),
+        'token_type': 'Bearer',
+        'expires_in': access_lifetime,
+    }
+
+
+def decode_token(token: str, token_type: str = ACCESS) -> dict:
+    """Verify the signature, type, expiry and revocation state of a token"""
+    try:
+        claims = signing.loads(
+            token,
+            key=_signing_key(),
+            salt=TOKEN_SALT,
+            fallback_keys=token_settings('FALLBACK_KEYS'),
+        )
+    except signing.BadSignature:
+        raise InvalidToken('Invalid token signature')
+
+    if not isinstance(claims, dict) or claims.get('typ') != token_type:
+        raise InvalidToken('Invalid token type')
+    if claims.get('exp', 0) <= time.time():
+        raise InvalidToken('Token has expired')
+    if revocation_list.is_revoked(claims['jti']):
+        raise InvalidToken('Token has been revoked')
+    return claims
+
+
+def revoke(claims: dict) -> None:
+    """Revoke a decoded token until it expires"""
+    revocation_list.revoke(claims['jti'], claims['exp'])
+
+
+def rotate_refresh_token(token: str):
+    """
+    Exchange a refresh token for a new pair.
+    The old refresh token is revoked so it can't be replayed. Revoking is
+    the claim itself: the insert of its jti is unique, so of two concurrent
+    refreshes with the same token only one gets a new pair, whatever the
+    in-memory list says.
+    """
+    from .models import RevokedToken, User
+
+    claims = decode_token(token, REFRESH)
+
+    try:
+        user = User.objects.get(pk=claims['sub'], is_active=True)
+    except User.DoesNotExist:
+        raise InvalidToken('User not found')
+
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(
+                jti=claims['jti'],
+                expires_at=datetime.fromtimestamp(claims['exp'], tz=dt_timezone.utc),
+            )
+    except IntegrityError:
+        raise InvalidToken('Token has been revoked')
+    revocation_list.add(claims['jti'])
+
+    return user, issue_token_pair(user)
+
+
+class RevocationList:
+    """
+    In-memory copy of the revoked token ids.
+    Reloaded from the database at most every REVOCATION_RELOAD_INTERVAL
+    seconds, so authenticating an access token costs no query. Revocations
+    made by this process are visible immediately; other processes see them
+    after the next reload, which is well below the access token lifetime.
+    """
+
+    def __init__(self):
+        self._jtis = frozenset()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _is_stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return time.monotonic() - self._loaded_at > token_settings('REVOCATION_RELOAD_INTERVAL')
+
+    def reload(self) -> None:
+        from .models import RevokedToken
+
+        jtis = RevokedToken.objects.filter(
+            expires_at__gt=timezone.now()
+        ).values_list('jti', flat=True)
+        with self._lock:
+            self._jtis = frozenset(jtis)
+            self._loaded_at = time.monotonic()
+
+    def is_revoked(self, jti: str) -> bool:
+        if self._is_stale():
+            self.reload()
+        return jti in self._jtis
+
+    def revoke(self, jti: str, expires_at: int) -> None:
+        from .models import RevokedToken
+
+        RevokedToken.objects.get_or_create(
+            jti=jti,
+            defaults={'expires_at': datetime.fromtimestamp(expires_at, tz=dt_timezone.utc)},
+        )
+        self.add(jti)
+
+    def add(self, jti: str) -> None:
+        """Record a revocation already stored in the database"""
+        with self._lock:
+            self._jtis = self._jtis | {jti}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._jtis = frozenset()
+            self._loaded_at = None
+
+
+revocation_list = RevocationList()
@@ -15,8 +15,11 @@ urlpatterns = [
     path('api/login/', views.api_login, name='api_login'),
     path('api/register/', views.api_register, name='api_register'),
     path('api/logout/', views.api_logout, name='api_logout'),
+    path('api/token/', views.token_obtain, name='token_obtain'),
+    path('api/token/refresh/', views.token_refresh, name='token_refresh'),
+    path('api/token/revoke/', views.token_revoke, name='token_revoke'),
     path('current-user/', views.current_user, name='current_user'),
-    path('settings/', views.update_preferences, name='api_settings'),
+    path('api/settings/', views.update_preferences, name='api_settings'),
     path('api/reset-password/', views.request_password_reset, name='request_password_reset'),
     path('api/verify-reset-token/<str:token>/', views.verify_reset_token, name='verify_reset_token'),
     path('api/reset-password/confirm/', views.confirm_password_reset, name='confirm_password_reset'),
@@ -2,14 +2,13 @@ from django.contrib.auth.tokens import default_token_generator
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout, password_validation
 from django.contrib import messages
-from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.views.generic import CreateView
 from django.urls import reverse_lazy
 from django.shortcuts import render, redirect
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
-from django.utils.encoding import force_bytes, force_str as force_text
+from django.utils.http import urlsafe_base64_decode
+from django.utils.encoding import force_str as force_text
 
 from .models import User
 from .forms import SignUpForm
@@ -19,9 +18,13 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from .serializers import UserSerializer
+from .emails import build_password_reset_email
+from .tokens import InvalidToken, decode_token, issue_token_pair, revoke, rotate_refresh_token, REFRESH
+
+from functools import partial
+
+from apps.core.mail import mail_queue
 
-from django.core.mail import send_mail
-from django.utils.html import strip_tags
 class SignUpView(CreateView):
     model = User
     form_class = SignUpForm 
@@ -64,11 +67,13 @@ def current_user(request):
 @api_view(['PATCH'])
 @permission_classes([permissions.IsAuthenticated])
 def update_preferences(request):
-    """Endpoint pour mettre à jour les préférences utilisateur"""
+    """Endpoint pour mettre à jour les préférences utilisateur (JSON merge patch)"""
     user = request.user
     if 'preferences' in request.data:
-        user.preferences = request.data['preferences']
-        user.save()
+        patch = request.data['preferences']
+        if not isinstance(patch, dict):
+            return Response({'error': 'Preferences must be an object'}, status=status.HTTP_400_BAD_REQUEST)
+        user.update_preferences(patch)
         return Response(UserSerializer(user).data)
     return Response({'error': 'No preferences provided'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -117,6 +122,44 @@ def api_logout(request):
     logout(request)
     return Response({'message': 'Déconnexion réussie'})
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def token_obtain(request):
+    """Issue a signed access/refresh token pair from credentials"""
+    user = authenticate(username=request.data.get('username'), password=request.data.get('password'))
+    if user is None:
+        return Response(
+            {'message': 'Nom d\'utilisateur ou mot de passe incorrect'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    return Response({**issue_token_pair(user), 'user': UserSerializer(user).data})
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def token_refresh(request):
+    """Rotate a refresh token into a new token pair"""
+    token = request.data.get('refresh')
+    if not token:
+        return Response({'error': 'refresh is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        _user, tokens = rotate_refresh_token(token)
+    except InvalidToken as e:
+        return Response({'error': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+    return Response(tokens)
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def token_revoke(request):
+    """Revoke a refresh token (logout for token clients)"""
+    token = request.data.get('refresh')
+    if not token:
+        return Response({'error': 'refresh is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        revoke(decode_token(token, REFRESH))
+    except InvalidToken as e:
+        return Response({'error': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+    return Response({'message': 'Token révoqué'})
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def request_password_reset(request):
@@ -126,67 +169,9 @@ def request_password_reset(request):
     if not email:
         return Response({'error': 'Email obligatoire'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # User search by email
-    try:
-        user = User.objects.get(email=email)
-        
-        # Generate a unique token
-        token = default_token_generator.make_token(user)
-        uid = urlsafe_base64_encode(force_bytes(user.pk))
-        
-        # Building the reset URL
-        reset_url = f"{settings.FRONTEND_URL}/reset-password/{uid}-{token}"
-        
-        # Email preparation
-        subject = "Réinitialisation de votre mot de passe ThiCodeAI"
-        html_message = f"""
-        <h2>Réinitialisation de mot de passe</h2>
-        <p>Bonjour {user.username},</p>
-        
-        <p>Vous avez demandé la réinitialisation de votre mot de passe sur ThiCodeAI.</p>
-        
-        <p><a href="{reset_url}">Cliquez ici pour définir un nouveau mot de passe</a></p>
-        
-        <p>Ou copiez-collez ce lien dans votre navigateur :<br>
-        {reset_url}</p>
-        
-        <p>Ce lien est valable pendant 24 heures.</p>
-        
-        <p>Si vous n'avez pas demandé cette réinitialisation, ignorez simplement cet email.</p>
-        
-        <p>L'équipe ThiCodeAI</p>
-        """
-        message = f"""
-        Bonjour {user.username},
-        
-        Vous avez demandé la réinitialisation de votre mot de passe sur ThiCodeAI.
-        
-        Cliquez sur le lien suivant pour définir un nouveau mot de passe :
-        {reset_url}
-        
-        Ce lien est valable pendant 24 heures.
-        
-        Si vous n'avez pas demandé cette réinitialisation, ignorez simplement cet email.
-        
-        L'équipe ThiCodeAI
-        """
-        
-        # Envoi explicite via SendGrid
-        from django.core.mail import EmailMultiAlternatives
-        from django.utils.html import strip_tags
-
-        email_message = EmailMultiAlternatives(
-            subject=subject,
-            body=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[email]
-        )
-        email_message.attach_alternative(html_message, "text/html")
-        email_message.send()
-        
-    except User.DoesNotExist:
-        # Do not inform the user that the email does not exist (security)
-        pass
+    # Lookup, token generation and SMTP all happen in the mail queue, so
+    # the response time is the same whether the email exists or not
+    mail_queue.submit(partial(build_password_reset_email, email))
     
     # Always return a success, even if the email doesn't exist
     return Response({'message': 'Si votre email est associé à un compte, vous recevrez un lien de réinitialisation'})
@@ -1,14 +1,40 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+
+from apps.core.admin import LargeTableAdmin, MonthListFilter
+
 from .models import Conversation, Message
 
+# Searches use `icontains`, served on PostgreSQL by the trigram indexes of
+# migration 0010: shorter terms can't use them and would scan the table
+MIN_SEARCH_LENGTH = 3
+
+
+class TrigramSearchMixin:
+    search_help_text = f'At least {MIN_SEARCH_LENGTH} characters'
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if search_term and len(search_term) < MIN_SEARCH_LENGTH:
+            self.message_user(request, self.search_help_text, messages.WARNING)
+            return queryset.none(), False
+        return super().get_search_results(request, queryset, search_term)
+
+
 @admin.register(Conversation)
-class ConversationAdmin(admin.ModelAdmin):
-    list_display = ('title', 'user', 'created_at', 'updated_at')
-    search_fields = ('title', 'user__username')
-    list_filter = ('created_at',)
+class ConversationAdmin(TrigramSearchMixin, LargeTableAdmin):
+    list_display = ('title', 'user', 'status', 'created_at', 'updated_at')
+    list_select_related = ('user',)
+    list_filter = ('status', ('created_at', MonthListFilter))
+    search_fields = ('title',)
+    raw_id_fields = ('user',)
+    ordering = ('-id',)
+
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
-    list_display = ('conversation', 'role', 'created_at')
-    list_filter = ('role', 'created_at')
-    search_fields = ('content',)
\ No newline at end of file
+class MessageAdmin(TrigramSearchMixin, LargeTableAdmin):
+    list_display = ('id', 'conversation', 'role', 'created_at')
+    list_select_related = ('conversation__user',)
+    list_filter = ('role', ('created_at', MonthListFilter))
+    search_fields = ('content',)
+    raw_id_fields = ('conversation', 'parent')
+    ordering = ('-id',)
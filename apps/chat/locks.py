@@ -1,4 +1,4 @@
-from django.core.cache import cache
+from django.core.cache import caches
 from contextlib import contextmanager
 from .exceptions import ConcurrentMessageError
 
@@ -15,7 +15,7 @@ def conversation_lock(conversation_id):
     lock_id = f'conversation_lock_{conversation_id}'
     
     # Try to acquire the lock
-    acquired = cache.add(lock_id, 'lock', LOCK_TIMEOUT)
+    acquired = caches['shared'].add(lock_id, 'lock', LOCK_TIMEOUT)
     
     if not acquired:
         raise ConcurrentMessageError('Conversation is currently locked')
@@ -24,7 +24,7 @@ def conversation_lock(conversation_id):
         yield
     finally:
         # Release the lock
-        cache.delete(lock_id)
+        caches['shared'].delete(lock_id)
 
 
 @contextmanager
@@ -39,7 +39,7 @@ def message_lock(conversation_id, message_id=None):
         lock_id = f'message_creation_lock_{conversation_id}'
     
     # Try to acquire the lock
-    acquired = cache.add(lock_id, 'lock', LOCK_TIMEOUT)
+    acquired = caches['shared'].add(lock_id, 'lock', LOCK_TIMEOUT)
     
     if not acquired:
         raise ConcurrentMessageError('Message operation is currently locked')
@@ -48,4 +48,4 @@ def message_lock(conversation_id, message_id=None):
         yield
     finally:
         # Release the lock
-        cache.delete(lock_id)
+        caches['shared'].delete(lock_id)
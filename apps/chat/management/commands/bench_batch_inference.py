@@ -0,0 +1,43 @@
+from apps.chat.services.enrichment import EnrichmentJob
+from apps.core.benchmark import BenchmarkCommand
+from apps.core.inference import BatchInference, StubProvider
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Throughput and cost per item of conversation enrichment with the stub provider, '
+        'one item per call versus packed prompts and concurrent calls'
+    )
+    default_iterations = 1
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--items', type=int, default=200)
+        parser.add_argument('--latency', type=float, default=0.05, help='Simulated seconds per model call')
+        parser.add_argument('--provider-name', default='mistral', help="Prices used: BATCH_INFERENCE['PRICES'][name]")
+
+    def run(self, iterations, items, latency, provider_name, **options):
+        excerpt = (
+            'user: How do I prefetch related objects in Django without running one query per row?\n'
+            'assistant: Use prefetch_related with a Prefetch object and a filtered queryset...'
+        )
+        inputs = [f'{excerpt} ({n})' for n in range(items)]
+        job = EnrichmentJob(['summary', 'tags', 'category'])
+        rows = []
+        for pack_size, concurrency in ((1, 1), (1, 4), (10, 1), (10, 4), (25, 4)):
+            provider = StubProvider(latency)
+            provider.name = provider_name
+            engine = BatchInference(provider, pack_size=pack_size, concurrency=concurrency)
+            for _ in range(iterations):
+                results, stats = engine.run(job, inputs)
+            rows.append({
+                'pack_size': pack_size,
+                'concurrency': concurrency,
+                'calls': stats.calls,
+                'completed': stats.completed,
+                'items_per_s': stats.items_per_second,
+                'prompt_tokens': stats.prompt_tokens,
+                'cost_per_1k_items': stats.cost_per_item * 1000,
+            })
+        self.report(rows, ['pack_size', 'concurrency', 'calls', 'completed', 'items_per_s',
+                           'prompt_tokens', 'cost_per_1k_items'])
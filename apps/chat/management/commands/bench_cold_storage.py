@@ -0,0 +1,105 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+
+from apps.chat.models import Conversation, Message
+from apps.chat.services import ColdStorageService, MessageTreeService
+from apps.core.benchmark import BenchmarkCommand, measure
+
+
+def table_size(table):
+    """Bytes used by a table and its indexes (None if the backend can't tell)"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+            return cursor.fetchone()[0]
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name = %s "
+                "OR name IN (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                [table, table],
+            )
+            return cursor.fetchone()[0]
+    return None
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Size of the message table and latency of active-conversation queries, '
+        'before and after moving the archived conversations to cold storage'
+    )
+    default_iterations = 200
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--conversations', type=int, default=500)
+        parser.add_argument('--per-conversation', type=int, default=100)
+        parser.add_argument('--archived', type=float, default=0.8, help='Fraction of archived conversations')
+        parser.add_argument('--content-size', type=int, default=300)
+
+    def populate(self, user, conversations, per_conversation, archived, content_size):
+        content = ('lorem ipsum dolor sit amet ' * (content_size // 27 + 1))[:content_size]
+        archived_count = int(conversations * archived)
+        now = timezone.now()
+        created = Conversation.objects.bulk_create([
+            Conversation(
+                user=user, title=f'Bench {i}', slug=f'bench-{i}', message_count=per_conversation,
+                status='archived' if i < archived_count else 'active',
+                archived_at=now if i < archived_count else None,
+            )
+            for i in range(conversations)
+        ])
+        for start in range(0, len(created), 50):
+            Message.objects.bulk_create([
+                Message(
+                    conversation=conversation, seq=n + 1, path=f'{n + 1}/', depth=0,
+                    role='user' if n % 2 == 0 else 'assistant', content=content, status='sent',
+                )
+                for conversation in created[start:start + 50]
+                for n in range(per_conversation)
+            ], batch_size=2000)
+        return [c for c in created if c.status == 'active']
+
+    def measure_hot(self, label, active, iterations):
+        conversation = active[len(active) // 2]
+        queries = {
+            'message list': lambda: list(
+                conversation.messages.order_by('created_at').values_list('id', 'role', 'content', 'created_at')
+            ),
+            'leaf': lambda: MessageTreeService.get_leaf(conversation),
+            'pending check': lambda: conversation.messages.filter(status='pending').exists(),
+            'user message count': lambda: Message.objects.filter(
+                conversation__user_id=conversation.user_id, conversation__status='active'
+            ).count(),
+        }
+        size = table_size(Message._meta.db_table)
+        rows = []
+        for name, query in queries.items():
+            stats = measure(query, iterations, count_queries=False)
+            rows.append({
+                'state': label,
+                'query': name,
+                'mean_us': stats['mean_us'],
+                'p95_us': stats['p95_us'],
+                'message_rows': Message.objects.count(),
+                'table_mb': size / 1e6 if size is not None else None,
+            })
+        return rows
+
+    def run(self, iterations, conversations, per_conversation, archived, content_size, **options):
+        user = get_user_model().objects.create_user('bench-cold', 'bench-cold@example.com', 'x')
+        active = self.populate(user, conversations, per_conversation, archived, content_size)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+
+        rows = self.measure_hot('hot', active, iterations)
+        start = time.perf_counter()
+        packed = ColdStorageService.pack_archived(older_than_days=0)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Packed {packed} conversations in {elapsed:.2f}s ({packed / elapsed:,.0f}/s)')
+        rows += self.measure_hot('tiered', active, iterations)
+
+        self.report(rows, ['state', 'query', 'mean_us', 'p95_us', 'message_rows', 'table_mb'])
@@ -0,0 +1,110 @@
+import statistics
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+
+from apps.chat.models import Conversation, Message
+from apps.chat.services import ConversationService, GenerationService
+from apps.chat.services.generation import flush_replies
+from apps.core.benchmark import BenchmarkCommand
+
+
+class StubClient:
+    """Model client answering after a fixed latency"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_response(self, prompt):
+        time.sleep(self.latency)
+        return 'stub answer'
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Concurrent conversation creations with a slow stub model: first reply generated '
+        'inside the creation transaction (inline) vs after the commit, in the background'
+    )
+    default_iterations = 5
+    # Creator threads need committed rows; the command deletes its data instead
+    rollback = False
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--latency', type=float, default=2.0, help='Seconds the stub model takes per reply')
+        parser.add_argument('--modes', nargs='*', choices=['inline', 'background'], default=['inline', 'background'])
+
+    def create_inline(self, user, client, n):
+        # Former ConversationViewSet.create: the model runs inside the transaction
+        with transaction.atomic():
+            conversation = ConversationService.create_conversation(user=user, title=f'inline {n}')
+            user_message = ConversationService.add_message_to_conversation(conversation, f'question {n}', 'user')
+            GenerationService.reply(user_message, client)
+
+    def create_background(self, user, client, n):
+        with transaction.atomic():
+            conversation = ConversationService.create_conversation(user=user, title=f'background {n}')
+            user_message = ConversationService.add_message_to_conversation(conversation, f'question {n}', 'user')
+            GenerationService.schedule(user_message, client)
+
+    def creator(self, create, user, client, first, iterations, latencies, errors):
+        try:
+            for n in range(first, first + iterations):
+                start = time.perf_counter()
+                try:
+                    create(user, client, n)
+                except Exception as e:
+                    errors.append(e)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            connection.close()
+
+    def run_mode(self, user, mode, threads, iterations, client):
+        create = self.create_inline if mode == 'inline' else self.create_background
+        latencies, errors = [], []
+        workers = [
+            threading.Thread(target=self.creator, args=(create, user, client, t * iterations, iterations, latencies, errors))
+            for t in range(threads)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        flush_replies()
+        replied = time.perf_counter() - start
+
+        created = Conversation.objects.filter(user=user, title__startswith=mode).count()
+        latencies.sort()
+        return {
+            'mode': mode,
+            'created': created,
+            'errors': len(errors),
+            'creates_per_s': created / elapsed,
+            'p50_ms': statistics.median(latencies) * 1e3,
+            'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1e3,
+            'replies': Message.objects.filter(conversation__user=user, conversation__title__startswith=mode,
+                                              role='assistant').count(),
+            'all_replied_s': replied,
+        }
+
+    def run(self, iterations, threads, latency, modes, **options):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError('This benchmark needs a file-backed database')
+
+        user = get_user_model().objects.create_user('bench-create', 'bench-create@example.com', 'x')
+        client = StubClient(latency)
+        rows = []
+        try:
+            for mode in modes:
+                rows.append(self.run_mode(user, mode, threads, iterations, client))
+        finally:
+            user.delete()
+
+        self.stdout.write(f'{threads} threads x {iterations} conversations, stub model latency {latency}s')
+        self.report(rows, ['mode', 'created', 'errors', 'creates_per_s', 'p50_ms', 'p95_ms', 'replies', 'all_replied_s'])
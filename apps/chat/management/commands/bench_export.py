@@ -0,0 +1,93 @@
+import os
+import resource
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+
+from apps.chat.models import Conversation, Message
+from apps.chat.services import ExportService
+from apps.chat.services.export import available_compressions
+from apps.core.benchmark import BenchmarkCommand
+
+
+def _max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BenchmarkCommand):
+    help = 'Measure NDJSON export/import throughput and memory on a synthetic history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1_000_000)
+        parser.add_argument('--per-conversation', type=int, default=100)
+        parser.add_argument('--content-size', type=int, default=400)
+
+    def populate(self, user, messages, per_conversation, content_size):
+        content = ('lorem ipsum dolor sit amet ' * (content_size // 27 + 1))[:content_size]
+        remaining = messages
+        while remaining > 0:
+            batch = min(remaining, per_conversation * 50)
+            conversations = Conversation.objects.bulk_create([
+                Conversation(user=user, title=f'Bench {i}', slug=f'bench-{i}')
+                for i in range((batch + per_conversation - 1) // per_conversation)
+            ])
+            Message.objects.bulk_create([
+                Message(
+                    conversation=conversations[i // per_conversation],
+                    seq=i % per_conversation + 1,
+                    path=f'{i % per_conversation + 1}/',
+                    role='user' if i % 2 == 0 else 'assistant',
+                    content=content,
+                    status='sent',
+                )
+                for i in range(batch)
+            ], batch_size=2000)
+            remaining -= batch
+
+    def run(self, messages, per_conversation, content_size, **options):
+        User = get_user_model()
+        user = User.objects.create_user('bench-export', 'bench-export@example.com', 'x')
+        target = User.objects.create_user('bench-import', 'bench-import@example.com', 'x')
+
+        start = time.perf_counter()
+        self.populate(user, messages, per_conversation, content_size)
+        self.stdout.write(f'Populated {messages:,} messages in {time.perf_counter() - start:.1f}s')
+
+        rows = []
+        files = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for compression in available_compressions():
+                path = os.path.join(tmp, f'export.{compression}')
+                rss_before = _max_rss_mb()
+                start = time.perf_counter()
+                with open(path, 'wb') as f:
+                    for chunk in ExportService.stream(user, compression):
+                        f.write(chunk)
+                elapsed = time.perf_counter() - start
+                files[compression] = path
+                rows.append({
+                    'step': f'export/{compression}',
+                    'seconds': elapsed,
+                    'msgs_per_s': messages / elapsed,
+                    'size_mb': os.path.getsize(path) / 1e6,
+                    'peak_rss_growth_mb': _max_rss_mb() - rss_before,
+                })
+
+            for compression in ('none', 'gzip'):
+                rss_before = _max_rss_mb()
+                start = time.perf_counter()
+                with open(files[compression], 'rb') as f:
+                    result = ExportService.import_stream(target, f)
+                elapsed = time.perf_counter() - start
+                assert result['messages'] == messages, result
+                rows.append({
+                    'step': f'import/{compression}',
+                    'seconds': elapsed,
+                    'msgs_per_s': messages / elapsed,
+                    'size_mb': os.path.getsize(files[compression]) / 1e6,
+                    'peak_rss_growth_mb': _max_rss_mb() - rss_before,
+                })
+                Conversation.objects.filter(user=target).delete()
+
+        self.report(rows, ['step', 'seconds', 'msgs_per_s', 'size_mb', 'peak_rss_growth_mb'])
@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+
+from apps.chat.models import Conversation, Message
+from apps.chat.services import MessageTreeService
+from apps.core.benchmark import BenchmarkCommand, measure
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare parent-walking with materialized-path queries on a deep message tree'
+    default_iterations = 20
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--depth', type=int, default=1000)
+        parser.add_argument('--alternatives', type=int, default=3,
+                            help='Sibling branches created at every level')
+
+    def build_tree(self, conversation, depth, alternatives):
+        """Main branch of ``depth`` messages with dead-end siblings at each level"""
+        seq = 0
+        parent = None
+        leaf = None
+        for level in range(depth):
+            level_messages = []
+            for alt in range(alternatives):
+                seq += 1
+                level_messages.append(Message(
+                    conversation=conversation,
+                    parent=parent,
+                    seq=seq,
+                    path=f'{parent.path if parent else ""}{seq}/',
+                    depth=level,
+                    role='user' if level % 2 == 0 else 'assistant',
+                    content=f'level {level} alternative {alt}',
+                    status='sent',
+                ))
+            Message.objects.bulk_create(level_messages)
+            # The last alternative carries the main branch
+            parent = leaf = level_messages[-1]
+        return leaf
+
+    def run(self, iterations, depth, alternatives, **options):
+        user = get_user_model().objects.create_user('bench-tree', 'bench-tree@example.com', 'x')
+        conversation = Conversation.objects.create(user=user, title='Bench tree')
+        leaf = self.build_tree(conversation, depth, alternatives)
+        middle = Message.objects.get(conversation=conversation, depth=depth // 2, seq=(depth // 2 + 1) * alternatives)
+        root = Message.objects.get(conversation=conversation, seq=alternatives)
+
+        def walk_parents():
+            node, branch = Message.objects.get(pk=leaf.pk), []
+            while node is not None:
+                branch.append(node)
+                node = node.parent
+            assert len(branch) == depth
+
+        def materialized_branch():
+            assert len(MessageTreeService.branch(leaf)) == depth
+
+        def naive_descendants():
+            frontier, found = [root.pk], 0
+            while frontier:
+                frontier = list(Message.objects.filter(parent_id__in=frontier).values_list('pk', flat=True))
+                found += len(frontier)
+
+        def materialized_descendants():
+            list(MessageTreeService.descendants(root).values_list('pk', flat=True))
+
+        def alternatives_query():
+            assert MessageTreeService.alternatives(middle).count() == alternatives
+
+        rows = [
+            {'operation': 'branch: walk parents', **measure(walk_parents, iterations)},
+            {'operation': 'branch: materialized path', **measure(materialized_branch, iterations)},
+            {'operation': 'subtree: BFS on parent', **measure(naive_descendants, iterations)},
+            {'operation': 'subtree: path prefix', **measure(materialized_descendants, iterations)},
+            {'operation': 'alternatives', **measure(alternatives_query, iterations)},
+        ]
+        self.stdout.write(f'Tree: depth {depth}, {depth * alternatives} messages')
+        self.report(rows, ['operation', 'iterations', 'mean_us', 'p95_us', 'queries_per_call'])
@@ -0,0 +1,82 @@
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from rest_framework.renderers import JSONRenderer
+
+from apps.chat.models import Conversation, Message
+from apps.chat.serializers import FastMessageSerializer, MessageSerializer
+from apps.core.benchmark import BenchmarkCommand
+from apps.core.renderers import ORJSONRenderer, orjson
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Serialization throughput and allocations of a large message list: '
+        'DRF ModelSerializer vs values_list() fast path, stdlib json vs orjson'
+    )
+    default_iterations = 5
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--messages', type=int, default=10_000)
+        parser.add_argument('--content-size', type=int, default=400)
+
+    def populate(self, messages, content_size):
+        user = get_user_model().objects.create_user('bench-serializers', 'bench-serializers@example.com', 'x')
+        conversation = Conversation.objects.create(user=user, title='Bench')
+        content = ('lorem ipsum dolor sit amet ' * (content_size // 27 + 1))[:content_size]
+        Message.objects.bulk_create([
+            Message(
+                conversation=conversation, seq=i + 1, path=f'{i + 1}/',
+                role='user' if i % 2 == 0 else 'assistant', content=content,
+                additional_data={'index': i, 'tags': ['bench']} if i % 10 == 0 else {},
+            )
+            for i in range(messages)
+        ], batch_size=2000)
+        return conversation
+
+    def run(self, iterations, messages, content_size, **options):
+        conversation = self.populate(messages, content_size)
+
+        def queryset():
+            return conversation.messages.all().order_by('created_at')
+
+        variants = {
+            'drf+json': (MessageSerializer, JSONRenderer()),
+            'fast+json': (FastMessageSerializer, JSONRenderer()),
+        }
+        if orjson is not None:
+            variants['drf+orjson'] = (MessageSerializer, ORJSONRenderer())
+            variants['fast+orjson'] = (FastMessageSerializer, ORJSONRenderer())
+
+        reference = None
+        rows = []
+        for name, (serializer_class, renderer) in variants.items():
+            serialize_s = render_s = 0.0
+            for _ in range(iterations):
+                start = time.perf_counter()
+                data = serializer_class(queryset(), many=True).data
+                middle = time.perf_counter()
+                body = renderer.render(data)
+                serialize_s += middle - start
+                render_s += time.perf_counter() - middle
+
+            tracemalloc.start()
+            body = renderer.render(serializer_class(queryset(), many=True).data)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            reference = reference or body
+            rows.append({
+                'variant': name,
+                'serialize_ms': serialize_s / iterations * 1000,
+                'render_ms': render_s / iterations * 1000,
+                'msgs_per_s': messages * iterations / (serialize_s + render_s),
+                'peak_alloc_mb': peak / 1e6,
+                'body_mb': len(body) / 1e6,
+                'identical': body == reference,
+            })
+
+        self.report(rows, ['variant', 'serialize_ms', 'render_ms', 'msgs_per_s',
+                           'peak_alloc_mb', 'body_mb', 'identical'])
@@ -0,0 +1,113 @@
+import statistics
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test.utils import override_settings
+
+from apps.chat.models import Conversation
+from apps.chat.services import ConversationService
+from apps.core.benchmark import BenchmarkCommand
+from apps.core.write_queue import write_queue
+from config.database import sqlite_options
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Concurrent message inserts on the SQLite database: stock settings, '
+        'tuned connections (WAL...) and tuned connections + write queue'
+    )
+    default_iterations = 100
+    # Writer threads need committed rows; the command deletes its data instead
+    rollback = False
+
+    MODES = {
+        'stock': {'tuned': False, 'queue': False},
+        'wal': {'tuned': True, 'queue': False},
+        'wal+queue': {'tuned': True, 'queue': True},
+    }
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--modes', nargs='*', choices=list(self.MODES), default=list(self.MODES))
+
+    def configure(self, tuned):
+        """Reconnect with the requested OPTIONS (read by every new connection)"""
+        settings_dict = connections.settings[DEFAULT_DB_ALIAS]
+        settings_dict['OPTIONS'] = sqlite_options() if tuned else {}
+        connection.close()
+        with connection.cursor() as cursor:
+            # WAL is persistent in the file: switch back explicitly
+            cursor.execute('PRAGMA journal_mode=%s' % ('WAL' if tuned else 'DELETE'))
+
+    def writer(self, conversation, iterations, latencies, errors):
+        parent = None
+        try:
+            for i in range(iterations):
+                start = time.perf_counter()
+                try:
+                    parent = ConversationService.add_message_to_conversation(
+                        conversation=conversation,
+                        content=f'message {i}',
+                        role='user' if i % 2 == 0 else 'assistant',
+                        parent_message=parent,
+                    )
+                except Exception as e:
+                    errors.append(e)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            connection.close()
+
+    def run_mode(self, user, mode, threads, iterations):
+        options = self.MODES[mode]
+        self.configure(options['tuned'])
+        conversations = [
+            Conversation.objects.create(user=user, title=f'{mode} {n}') for n in range(threads)
+        ]
+        latencies, errors = [], []
+        queue_settings = {'ENABLED': options['queue'], 'BATCH_SIZE': 64, 'FLUSH_INTERVAL': 0.002, 'TIMEOUT': 60}
+        with override_settings(WRITE_QUEUE=queue_settings):
+            workers = [
+                threading.Thread(target=self.writer, args=(c, iterations, latencies, errors))
+                for c in conversations
+            ]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+            write_queue.stop()
+
+        inserted = sum(c.messages.count() for c in conversations)
+        latencies.sort()
+        return {
+            'mode': mode,
+            'inserted': inserted,
+            'errors': len(errors),
+            'msgs_per_s': inserted / elapsed,
+            'p50_ms': statistics.median(latencies) * 1e3,
+            'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1e3,
+            'max_ms': latencies[-1] * 1e3,
+        }
+
+    def run(self, iterations, threads, modes, **options):
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            raise CommandError('This benchmark needs a file-backed SQLite default database')
+
+        original_options = dict(connections.settings[DEFAULT_DB_ALIAS].get('OPTIONS', {}))
+        user = get_user_model().objects.create_user('bench-sqlite', 'bench-sqlite@example.com', 'x')
+        rows = []
+        try:
+            for mode in modes:
+                rows.append(self.run_mode(user, mode, threads, iterations))
+        finally:
+            connections.settings[DEFAULT_DB_ALIAS]['OPTIONS'] = original_options
+            connection.close()
+            user.delete()
+
+        self.stdout.write(f'{threads} threads x {iterations} messages, one conversation per thread')
+        self.report(rows, ['mode', 'inserted', 'errors', 'msgs_per_s', 'p50_ms', 'p95_ms', 'max_ms'])
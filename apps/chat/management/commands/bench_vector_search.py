@@ -0,0 +1,67 @@
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import CommandError
+
+from apps.core import vectors
+from apps.core.benchmark import BenchmarkCommand, measure
+
+
+class Command(BenchmarkCommand):
+    help = 'Build time, latency and recall@10 of the flat and IVF vector indexes, loaded memory-mapped'
+    default_iterations = 200
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--count', type=int, default=100000, help='Vectors in the index')
+        parser.add_argument('--dimensions', type=int, default=256)
+        parser.add_argument('--topics', type=int, default=500, help='Clusters the synthetic vectors gather around')
+        parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16])
+
+    def run(self, iterations, count, dimensions, topics, nprobe, **options):
+        if not vectors.numpy_available():
+            raise CommandError('numpy is required')
+        np = vectors.np
+        rng = np.random.default_rng(0)
+        centers = vectors.normalize(rng.standard_normal((topics, dimensions)))
+        data = vectors.normalize(
+            centers[rng.integers(0, topics, count)] + 0.08 * rng.standard_normal((count, dimensions))
+        )
+        ids = np.arange(count, dtype=np.int64)
+        queries = vectors.normalize(
+            centers[rng.integers(0, topics, iterations)] + 0.08 * rng.standard_normal((iterations, dimensions))
+        )
+
+        rows = []
+        with tempfile.TemporaryDirectory() as tmp:
+            expected = None
+            for index_class in (vectors.FlatIndex, vectors.IVFIndex):
+                start = time.perf_counter()
+                built = index_class.build(ids, data)
+                path = Path(tmp) / index_class.kind
+                vectors.save_index(built, path, {})
+                build_s = time.perf_counter() - start
+                index, _ = vectors.load_index(path)
+
+                settings = [None] if index_class is vectors.FlatIndex else nprobe
+                for probes in settings:
+                    results = [index.search(query, 10, nprobe=probes)[0] for query in queries]
+                    if expected is None:
+                        expected = results
+                    recall = np.mean([
+                        len(set(found) & set(exact)) / len(exact) for found, exact in zip(results, expected)
+                    ])
+                    position = iter(range(len(queries)))
+                    stats = measure(lambda: index.search(queries[next(position)], 10, nprobe=probes),
+                                    iterations, count_queries=False)
+                    rows.append({
+                        'index': index_class.kind,
+                        'nprobe': probes,
+                        'vectors': count,
+                        'build_s': build_s,
+                        'mean_us': stats['mean_us'],
+                        'p95_us': stats['p95_us'],
+                        'recall@10': float(recall),
+                    })
+        self.report(rows, ['index', 'nprobe', 'vectors', 'build_s', 'mean_us', 'p95_us', 'recall@10'])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.chat.services import SyncService
+
+
+class Command(BaseCommand):
+    help = 'Delete sync changelog entries superseded by a later change of the same object'
+
+    def handle(self, *args, **options):
+        deleted = SyncService.compact()
+        self.stdout.write(f'{deleted} changelog entries deleted')
@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.chat.models import MessageEmbedding
+from apps.chat.services import EmbeddingService, VectorIndexService
+
+
+class Command(BaseCommand):
+    help = 'Embed the messages that have no embedding yet and rebuild the vector indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username (default: every user)')
+        parser.add_argument('--no-index', action='store_true', help='Only embed, leave the indexes as they are')
+
+    def handle(self, *args, user=None, no_index=False, **options):
+        if not EmbeddingService.enabled():
+            raise CommandError("Semantic search is disabled (SEMANTIC_SEARCH['ENABLED'] or numpy missing)")
+        if user is not None:
+            try:
+                user = get_user_model().objects.get(username=user)
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'Unknown user: {user}')
+
+        embedded = EmbeddingService.backfill(user)
+        self.stdout.write(f'{embedded} message(s) embedded with {EmbeddingService.model_name()}')
+        if no_index:
+            return
+        if user is not None:
+            user_ids = [user.pk]
+        else:
+            user_ids = MessageEmbedding.objects.filter(
+                model=EmbeddingService.model_name()
+            ).values_list('user_id', flat=True).distinct()
+        for user_id in user_ids:
+            meta = VectorIndexService.build(user_id)
+            self.stdout.write(f"User {user_id}: {meta['kind']} index of {meta['count']} vectors")
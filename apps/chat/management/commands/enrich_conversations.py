@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from apps.chat.models import Conversation
+from apps.chat.services import EnrichmentService
+from apps.chat.services.enrichment import FIELDS
+from apps.core.inference import BatchInference, get_provider
+
+
+class Command(BaseCommand):
+    help = 'Fill conversation summaries, tags, categories (or titles) with batched model calls'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fields', default=None, help=f"Comma-separated, among {', '.join(FIELDS)}")
+        parser.add_argument('--status', default='archived', help="Conversation status ('all' for any)")
+        parser.add_argument('--limit', type=int, default=None)
+        parser.add_argument('--overwrite', action='store_true', help='Replace values already set')
+        parser.add_argument('--provider', default=None, help="Default: BATCH_INFERENCE['PROVIDER']")
+        parser.add_argument('--pack-size', type=int, default=None)
+        parser.add_argument('--concurrency', type=int, default=None)
+        parser.add_argument('--chunk', type=int, default=200, help='Conversations loaded per round')
+
+    def handle(self, *args, fields=None, status='archived', limit=None, overwrite=False, provider=None,
+               pack_size=None, concurrency=None, chunk=200, **options):
+        fields = fields.split(',') if fields else None
+        if fields and set(fields) - set(FIELDS):
+            raise CommandError(f"Unknown field(s): {', '.join(sorted(set(fields) - set(FIELDS)))}")
+        try:
+            engine = BatchInference(get_provider(provider), pack_size=pack_size, concurrency=concurrency)
+        except Exception as e:
+            raise CommandError(f'No inference provider: {e}')
+
+        conversations = Conversation.objects.exclude(status='deleted').order_by('pk')
+        if status != 'all':
+            conversations = conversations.filter(status=status)
+        if not overwrite:
+            empty = Q()
+            for field in fields or EnrichmentService.default_fields():
+                empty |= Q(**{field: [] if field == 'tags' else ''})
+            conversations = conversations.filter(empty)
+        ids = list(conversations.values_list('pk', flat=True)[:limit])
+
+        totals = {'items': 0, 'completed': 0, 'calls': 0, 'elapsed': 0.0, 'cost': 0.0}
+        for start in range(0, len(ids), chunk):
+            stats = EnrichmentService.enrich(ids[start:start + chunk], fields, overwrite, engine)
+            totals['items'] += stats.items
+            totals['completed'] += stats.completed
+            totals['calls'] += stats.calls
+            totals['elapsed'] += stats.elapsed
+            totals['cost'] += stats.cost
+            self.stdout.write(f'{min(start + chunk, len(ids))}/{len(ids)} conversations processed')
+
+        completed = totals['completed']
+        self.stdout.write(
+            f"{completed}/{totals['items']} conversations enriched in {totals['calls']} model call(s), "
+            f"{completed / totals['elapsed'] if totals['elapsed'] else 0:,.1f} conversations/s, "
+            f"cost {totals['cost']:.4f} ({totals['cost'] / completed if completed else 0:.6f} per conversation)"
+        )
@@ -0,0 +1,30 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.chat.services import ExportService
+from apps.chat.services.export import available_compressions
+
+
+class Command(BaseCommand):
+    help = "Stream a user's conversations and messages as NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--output', '-o', help='Output file (default: stdout)')
+        parser.add_argument('--compression', default='none', choices=available_compressions())
+
+    def handle(self, *args, username, output, compression, **options):
+        try:
+            user = get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'Unknown user: {username}')
+
+        target = open(output, 'wb') if output else sys.stdout.buffer
+        try:
+            for chunk in ExportService.stream(user, compression):
+                target.write(chunk)
+        finally:
+            if output:
+                target.close()
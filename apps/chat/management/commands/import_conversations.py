@@ -0,0 +1,33 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.chat.services import ExportService
+from apps.chat.services.exceptions import InvalidExportError
+
+
+class Command(BaseCommand):
+    help = 'Import an NDJSON export (plain, gzip or zstd) into a user account'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('input', nargs='?', help='Export file (default: stdin)')
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, username, input, batch_size, **options):
+        try:
+            user = get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'Unknown user: {username}')
+
+        source = open(input, 'rb') if input else sys.stdin.buffer
+        try:
+            result = ExportService.import_stream(user, source, batch_size=batch_size)
+        except InvalidExportError as e:
+            raise CommandError(str(e))
+        finally:
+            if input:
+                source.close()
+
+        self.stdout.write(f"Imported {result['conversations']} conversation(s) and {result['messages']} message(s)")
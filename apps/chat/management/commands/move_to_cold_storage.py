@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.chat.services import ColdStorageService
+
+
+class Command(BaseCommand):
+    help = 'Move the messages of conversations archived long ago to cold storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help="Archived for at least this many days (default: COLD_STORAGE['AFTER_DAYS'])",
+        )
+
+    def handle(self, *args, days=None, **options):
+        packed = ColdStorageService.pack_archived(days)
+        self.stdout.write(f'{packed} conversation(s) moved to cold storage')
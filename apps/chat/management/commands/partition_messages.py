@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from apps.chat import partitions
+from apps.chat.models import Message
+
+
+class Command(BaseCommand):
+    help = 'Convert the message table to monthly range partitions (PostgreSQL, locks the table)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int, default=None,
+            help="Partitions created past the current month (default: MESSAGE_PARTITIONS['MONTHS_AHEAD'])",
+        )
+        parser.add_argument(
+            '--sql', action='store_true',
+            help='Print the conversion statements instead of running them (secondary indexes excluded)',
+        )
+
+    def handle(self, *args, months_ahead=None, sql=False, **options):
+        if months_ahead is None:
+            months_ahead = partitions.partition_settings('MONTHS_AHEAD')
+        if sql:
+            oldest = Message.objects.aggregate(oldest=Min('created_at'))['oldest'] or timezone.now()
+            for statement in partitions.conversion_sql(partitions.month_start(oldest), months_ahead):
+                self.stdout.write(f'{statement};')
+            return
+
+        try:
+            statements = partitions.convert(months_ahead)
+        except NotImplementedError as e:
+            raise CommandError(str(e))
+        if not statements:
+            self.stdout.write(f'{partitions.TABLE} is already partitioned')
+            return
+        self.stdout.write(
+            f'{partitions.TABLE} partitioned: {len(partitions.list_partitions())} monthly partitions. '
+            "Set MESSAGE_PARTITIONS['ENABLED'] to prune them in queries."
+        )
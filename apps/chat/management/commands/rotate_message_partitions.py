@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.chat import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create the coming monthly message partitions and drop the expired ones (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int, default=None,
+            help="Partitions to have past the current month (default: MESSAGE_PARTITIONS['MONTHS_AHEAD'])",
+        )
+        parser.add_argument(
+            '--retention-months', type=int, default=None,
+            help="Drop the partitions older than this many months (default: MESSAGE_PARTITIONS['RETENTION_MONTHS'], "
+                 "none dropped when unset)",
+        )
+
+    def handle(self, *args, months_ahead=None, retention_months=None, **options):
+        if retention_months is None:
+            retention_months = partitions.partition_settings('RETENTION_MONTHS')
+        try:
+            if not partitions.is_partitioned():
+                raise CommandError(f'{partitions.TABLE} is not partitioned, run partition_messages first')
+            created = partitions.ensure_partitions(months_ahead)
+            dropped = []
+            if retention_months is not None:
+                cutoff = partitions.add_months(partitions.month_start(timezone.now()), -retention_months)
+                dropped = partitions.drop_partitions_before(cutoff)
+        except NotImplementedError as e:
+            raise CommandError(str(e))
+
+        for name in created:
+            self.stdout.write(f'Created {name}')
+        for name in dropped:
+            self.stdout.write(f'Dropped {name}')
+        self.stdout.write(f'{len(created)} partition(s) created, {len(dropped)} dropped')
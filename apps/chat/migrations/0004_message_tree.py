@@ -0,0 +1,101 @@
+# Generated by Django 5.1.4 on 2026-10-19 14:00
+
+from django.db import migrations, models
+
+
+def backfill_message_tree(apps, schema_editor):
+    """Number existing messages per conversation and materialize their paths"""
+    Message = apps.get_model('chat', 'Message')
+    Conversation = apps.get_model('chat', 'Conversation')
+
+    for conversation_id in Conversation.objects.values_list('id', flat=True).iterator():
+        messages = list(
+            Message.objects.filter(conversation_id=conversation_id).order_by('created_at', 'id')
+        )
+        by_id = {message.id: message for message in messages}
+        for seq, message in enumerate(messages, start=1):
+            message.seq = seq
+
+        for message in messages:
+            # Walk up to the first resolved ancestor, then fill paths downwards
+            chain, node = [], message
+            while node is not None and not node.path and node not in chain:
+                chain.append(node)
+                node = by_id.get(node.parent_id)
+            for node in reversed(chain):
+                parent = by_id.get(node.parent_id)
+                if parent is not None and parent.path:
+                    node.path, node.depth = f'{parent.path}{node.seq}/', parent.depth + 1
+                else:
+                    node.path, node.depth = f'{node.seq}/', 0
+        Message.objects.bulk_update(messages, ['seq', 'path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_conversation_archived_at_conversation_category_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='path',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='conversation',
+            name='additional_data',
+            field=models.JSONField(blank=True, default=dict, help_text='Additional structured data'),
+        ),
+        migrations.AlterField(
+            model_name='conversation',
+            name='category',
+            field=models.CharField(blank=True, help_text='Conversation category', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='conversation',
+            name='is_pinned',
+            field=models.BooleanField(default=False, help_text='Pin the conversation'),
+        ),
+        migrations.AlterField(
+            model_name='conversation',
+            name='summary',
+            field=models.TextField(blank=True, help_text='Automatic conversation summary'),
+        ),
+        migrations.AlterField(
+            model_name='conversation',
+            name='tags',
+            field=models.JSONField(blank=True, default=list, help_text='List of tags associated with the conversation'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='additional_data',
+            field=models.JSONField(blank=True, default=dict, help_text='Additional structured data (code, citations...)'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='content_type',
+            field=models.CharField(default='text', help_text='Content type (text, code, markdown...)', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='metadata',
+            field=models.JSONField(blank=True, default=dict, help_text='Technical metadata (tokens, response time...)'),
+        ),
+        migrations.RunPython(backfill_message_tree, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(fields=('conversation', 'seq'), name='chat_message_conversation_seq'),
+        ),
+    ]
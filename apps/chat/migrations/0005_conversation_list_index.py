@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-19 14:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_message_tree'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user', 'status', 'updated_at'], name='chat_conv_user_status_upd'),
+        ),
+    ]
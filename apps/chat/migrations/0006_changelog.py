@@ -0,0 +1,56 @@
+# Generated by Django 5.1.4 on 2026-10-19 14:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_changelog(apps, schema_editor):
+    """One entry per existing conversation and message, so cursor 0 is a full sync"""
+    ChangeLogEntry = apps.get_model('chat', 'ChangeLogEntry')
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+
+    batch = []
+    rows = [
+        ('conversation', Conversation.objects.order_by('id').values_list('id', 'id', 'user_id')),
+        ('message', Message.objects.order_by('id').values_list('id', 'conversation_id', 'conversation__user_id')),
+    ]
+    for object_type, queryset in rows:
+        for object_id, conversation_id, user_id in queryset.iterator(chunk_size=2000):
+            batch.append(ChangeLogEntry(
+                user_id=user_id, object_type=object_type, object_id=object_id,
+                conversation_id=conversation_id, action='upsert',
+            ))
+            if len(batch) >= 2000:
+                ChangeLogEntry.objects.bulk_create(batch)
+                batch = []
+    ChangeLogEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_conversation_list_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('conversation', 'Conversation'), ('message', 'Message')], max_length=12)),
+                ('object_id', models.BigIntegerField()),
+                ('conversation_id', models.BigIntegerField(help_text='Conversation of the changed object (itself for conversations)')),
+                ('action', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], default='upsert', max_length=6)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'chat_changelog',
+                'indexes': [models.Index(fields=['user', 'id'], name='chat_changelog_user_cursor'), models.Index(fields=['object_type', 'object_id'], name='chat_changelog_object')],
+            },
+        ),
+        migrations.RunPython(backfill_changelog, migrations.RunPython.noop),
+    ]
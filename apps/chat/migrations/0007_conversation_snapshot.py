@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-19 14:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('detail', 'Conversation detail'), ('messages', 'Message list')], max_length=10)),
+                ('version', models.DateTimeField(help_text='updated_at of the conversation the snapshot was built from')),
+                ('encoding', models.CharField(help_text='Content coding of body (gzip, br, zstd)', max_length=10)),
+                ('body', models.BinaryField()),
+                ('size', models.PositiveIntegerField(help_text='Uncompressed size in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='chat.conversation')),
+            ],
+            options={
+                'db_table': 'chat_conversation_snapshot',
+                'constraints': [models.UniqueConstraint(fields=('conversation', 'kind'), name='chat_snapshot_conversation_kind')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-19 14:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_conversation_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='storage_tier',
+            field=models.CharField(choices=[('hot', 'Messages in the message table'), ('cold', 'Messages packed in cold storage')], default='hot', max_length=4),
+        ),
+        migrations.CreateModel(
+            name='ConversationColdStorage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('encoding', models.CharField(help_text='Compression of the blob (gzip, br, zstd)', max_length=10)),
+                ('data', models.BinaryField(blank=True, null=True)),
+                ('location', models.CharField(blank=True, help_text='File name in the cold store directory', max_length=255)),
+                ('message_count', models.PositiveIntegerField()),
+                ('size', models.PositiveBigIntegerField(help_text='Uncompressed size in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cold_storage', to='chat.conversation')),
+            ],
+            options={
+                'db_table': 'chat_conversation_cold_storage',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 14:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_cold_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.BigIntegerField()),
+                ('conversation_id', models.BigIntegerField()),
+                ('model', models.CharField(help_text='Embedder and dimensions, e.g. hashing-256', max_length=40)),
+                ('vector', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'chat_message_embedding',
+                'indexes': [models.Index(fields=['user', 'model', 'id'], name='chat_embedding_user_model_id'), models.Index(fields=['conversation_id'], name='chat_embedding_conversation')],
+                'constraints': [models.UniqueConstraint(fields=('message_id', 'model'), name='chat_embedding_message_model')],
+            },
+        ),
+    ]
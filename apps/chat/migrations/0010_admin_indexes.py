@@ -0,0 +1,101 @@
+# Generated by Django 5.1.4 on 2026-10-19 14:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+# On PostgreSQL every index is built CONCURRENTLY (outside a transaction),
+# so writes to chat_message keep going during the build. `icontains`
+# compiles to UPPER(column) LIKE UPPER(%s): a trigram index on
+# UPPER(column) serves the admin searches.
+INDEXES = [
+    ('chat_conv_created', 'chat_conversation', '(created_at)'),
+    ('chat_message_created', 'chat_message', '(created_at)'),
+    ('chat_message_content_trgm', 'chat_message', 'USING gin (UPPER(content) gin_trgm_ops)'),
+    ('chat_conv_title_trgm', 'chat_conversation', 'USING gin (UPPER(title) gin_trgm_ops)'),
+]
+
+CREATED_AT_INDEXES = [
+    ('conversation', models.Index(fields=['created_at'], name='chat_conv_created')),
+    ('message', models.Index(fields=['created_at'], name='chat_message_created')),
+]
+
+
+def _partitions(cursor, table):
+    """Partitions of ``table`` if it is partitioned (see apps/chat/partitions.py), else None"""
+    cursor.execute(
+        "SELECT relkind FROM pg_class WHERE relname = %s AND relnamespace = current_schema()::regnamespace",
+        [table],
+    )
+    row = cursor.fetchone()
+    if row is None or row[0] != 'p':
+        return None
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'JOIN pg_class p ON p.oid = i.inhparent '
+        'WHERE p.relname = %s AND p.relnamespace = current_schema()::regnamespace',
+        [table],
+    )
+    return [name for name, in cursor.fetchall()]
+
+
+def create_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        for model_name, index in CREATED_AT_INDEXES:
+            schema_editor.add_index(apps.get_model('chat', model_name), index)
+        return
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, table, definition in INDEXES:
+            partitions = _partitions(cursor, table)
+            if partitions is None:
+                cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote(name)} ON {quote(table)} {definition}')
+                continue
+            # CONCURRENTLY isn't supported on a partitioned table: build each
+            # partition's index concurrently, then attach it to the parent's
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {quote(name)} ON ONLY {quote(table)} {definition}')
+            for partition in partitions:
+                partition_index = f'{partition}_{name}'[:63]
+                cursor.execute(
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote(partition_index)} '
+                    f'ON {quote(partition)} {definition}'
+                )
+                cursor.execute(f'ALTER INDEX {quote(name)} ATTACH PARTITION {quote(partition_index)}')
+
+
+def drop_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        for model_name, index in CREATED_AT_INDEXES:
+            schema_editor.remove_index(apps.get_model('chat', model_name), index)
+        return
+    with connection.cursor() as cursor:
+        for name, table, definition in INDEXES:
+            # Partition indexes attached to a partitioned one are dropped with it
+            if _partitions(cursor, table) is None:
+                cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {connection.ops.quote_name(name)}')
+            else:
+                cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(name)}')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('chat', '0009_message_embedding'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name=model_name, index=index)
+                for model_name, index in CREATED_AT_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(create_indexes, drop_indexes),
+            ],
+        ),
+    ]
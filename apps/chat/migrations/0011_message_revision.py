@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-19 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.BigIntegerField()),
+                ('conversation_id', models.BigIntegerField()),
+                ('revision', models.PositiveIntegerField()),
+                ('kind', models.CharField(choices=[('snapshot', 'Full content'), ('diff', 'Diff against the previous revision')], max_length=8)),
+                ('data', models.BinaryField()),
+                ('encoding', models.CharField(blank=True, help_text='Compression of data (gzip, br, zstd)', max_length=10)),
+                ('size', models.PositiveIntegerField(help_text='Length of the content of the revision')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'chat_message_revision',
+                'indexes': [models.Index(fields=['conversation_id'], name='chat_revision_conversation')],
+                'constraints': [models.UniqueConstraint(fields=('message_id', 'revision'), name='chat_revision_message_revision')],
+            },
+        ),
+    ]
@@ -1,19 +1,49 @@
-from dotenv import load_dotenv
-from langchain_mistralai.chat_models import ChatMistralAI
-from langchain.schema import HumanMessage
+"""
+Client du modèle Mistral (langchain_mistralai).
+
+langchain is imported when the first client is built, not with this
+module, so workers start without it. ``get_client()`` returns the
+process-wide client, whose HTTP connection pool is reused from one
+request to the next (``STARTUP['PREWARM']`` can build it at start-up).
+The API key comes from the environment (.env is loaded by the settings).
+"""
 import os
+import threading
+
+_client = None
+_client_lock = threading.Lock()
 
-load_dotenv()
 
 class MistralClient:
     def __init__(self):
+        from langchain.schema import HumanMessage
+        from langchain_mistralai.chat_models import ChatMistralAI
+
+        self.message_class = HumanMessage
         self.llm = ChatMistralAI(
             model="mistral-large-latest",
             api_key=os.getenv("MISTRAL_API_KEY")
         )
-    
+
     def generate_response(self, prompt):
         """Génère une réponse à partir du prompt donné"""
-        message = HumanMessage(content=prompt)
+        message = self.message_class(content=prompt)
         response = self.llm([message])
-        return response.content
\ No newline at end of file
+        return response.content
+
+    def stream_response(self, prompt):
+        """Génère la réponse morceau par morceau (tokens)"""
+        message = self.message_class(content=prompt)
+        for chunk in self.llm.stream([message]):
+            if chunk.content:
+                yield chunk.content
+
+
+def get_client() -> MistralClient:
+    """The process-wide client, built on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MistralClient()
+    return _client
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError
@@ -12,6 +12,13 @@ class Conversation(models.Model):
         ('deleted', 'Deleted')
     ]
     
+    HOT = 'hot'
+    COLD = 'cold'
+    STORAGE_TIER_CHOICES = [
+        (HOT, 'Messages in the message table'),
+        (COLD, 'Messages packed in cold storage'),
+    ]
+    
     # Base relations and fields
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversations')
     title = models.CharField(max_length=255, blank=True)
@@ -27,6 +34,7 @@ class Conversation(models.Model):
     is_pinned = models.BooleanField(default=False, help_text='Pin the conversation')
     last_message_at = models.DateTimeField(null=True, blank=True)
     message_count = models.PositiveIntegerField(default=0)
+    storage_tier = models.CharField(max_length=4, choices=STORAGE_TIER_CHOICES, default=HOT)
     
     # Champs temporels
     created_at = models.DateTimeField(auto_now_add=True)
@@ -47,12 +55,15 @@ class Conversation(models.Model):
             self.slug = slugify(self.title) if self.title else 'nouvelle-conversation'
         
         # Only update message-related fields if the conversation already exists
-        if self.pk:
+        # (cold conversations have no rows left to count) and they are saved
+        update_fields = kwargs.get('update_fields')
+        counts_saved = update_fields is None or {'message_count', 'last_message_at'} & set(update_fields)
+        if self.pk and self.storage_tier == self.HOT and counts_saved:
             # Update message counter
-            self.message_count = self.messages.count()
+            self.message_count = self.bounded_messages().count()
             
             # Update last_message_at
-            last_message = self.messages.order_by('-created_at').first()
+            last_message = self.bounded_messages().order_by('-created_at').first()
             if last_message:
                 self.last_message_at = last_message.created_at
         
@@ -64,6 +75,20 @@ class Conversation(models.Model):
             self.slug = f'conversation-{self.pk}'
             super().save(update_fields=['slug'])
     
+    def bounded_messages(self):
+        """
+        ``messages``, bounded by the conversation's creation date when the
+        message table is partitioned: a message is never older than its
+        conversation, and the bound lets Postgres skip the older partitions.
+        There is no upper bound, so a long-lived conversation still scans
+        every partition from its first month on: ``last_message_at`` would
+        be stale on an instance loaded before a concurrent insert, and the
+        seq allocation relies on this queryset seeing every message.
+        """
+        if self.created_at is None or not getattr(settings, 'MESSAGE_PARTITIONS', {}).get('ENABLED', False):
+            return self.messages.all()
+        return self.messages.filter(created_at__gte=self.created_at)
+    
     def archive(self):
         """Archive the conversation"""
         from django.utils import timezone
@@ -82,6 +107,12 @@ class Conversation(models.Model):
     
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # Conversation list and its ETag (latest update of the user's conversations)
+            models.Index(fields=['user', 'status', 'updated_at'], name='chat_conv_user_status_upd'),
+            # Admin month filters (created_at ranges)
+            models.Index(fields=['created_at'], name='chat_conv_created'),
+        ]
 
 class Message(models.Model):
     """Message model in a conversation with metadata"""
@@ -103,6 +134,12 @@ class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='replies')
     
+    # Materialized branch: `seq` numbers messages within the conversation and
+    # `path` lists the seq of every ancestor down to this message ("1/2/5/")
+    seq = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    path = models.TextField(blank=True, default='', editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
+    
     # Content and metadata
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
     content = models.TextField()
@@ -122,16 +159,71 @@ class Message(models.Model):
     additional_data = models.JSONField(default=dict, blank=True, help_text='Additional structured data (code, citations...)')
     metadata = models.JSONField(default=dict, blank=True, help_text='Technical metadata (tokens, response time...)')
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Content as loaded, to tell edits from the other saves
+        instance._loaded_content = instance.__dict__.get('content')
+        return instance
+    
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or 'content' in fields:
+            self._loaded_content = self.__dict__.get('content')
+    
     def save(self, *args, **kwargs):
-        # Update edit_count if message is modified
-        if self.id and self.is_edited:
+        # An edit is a save that changes the content: the previous version
+        # goes to the revision store (post_save signal, MessageRevision)
+        previous = getattr(self, '_loaded_content', None)
+        update_fields = kwargs.get('update_fields')
+        self._edited_from = None
+        if (
+            self.id and previous is not None and self.content != previous
+            and (update_fields is None or 'content' in update_fields)
+        ):
+            self.is_edited = True
             self.edit_count += 1
+            self._edited_from = previous
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'is_edited', 'edit_count'}
         
-        super().save(*args, **kwargs)
+        if self.seq is None:
+            # seq is allocated and inserted under the conversation row lock
+            with transaction.atomic(using=kwargs.get('using')):
+                self.assign_tree_position()
+                super().save(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
+        if update_fields is None or 'content' in update_fields:
+            self._loaded_content = self.content
         
         # Update parent conversation
         self.conversation.save()
     
+    def assign_tree_position(self):
+        """
+        Allocate the next seq in the conversation and derive path/depth from
+        the parent. Must run in a transaction: the conversation row is locked
+        until it ends, so concurrent writers can't take the same seq (a no-op
+        on SQLite, where writes are serialized anyway).
+        """
+        list(Conversation.objects.select_for_update().filter(pk=self.conversation_id).values_list('pk'))
+        last_seq = self.conversation.bounded_messages().aggregate(models.Max('seq'))['seq__max']
+        self.seq = (last_seq or 0) + 1
+        
+        parent = self.parent
+        if parent is not None and parent.conversation_id == self.conversation_id:
+            self.path = f'{parent.path}{self.seq}/'
+            self.depth = parent.depth + 1
+        else:
+            self.path = f'{self.seq}/'
+            self.depth = 0
+    
+    @property
+    def path_seqs(self):
+        """Seq of every message of the branch, from the root to this message"""
+        return [int(part) for part in self.path.split('/') if part]
+    
     def mark_as_delivered(self):
         """Mark message as delivered"""
         from django.utils import timezone
@@ -143,4 +235,178 @@ class Message(models.Model):
         return f"Message de {self.role} dans {self.conversation} ({self.status})"
     
     class Meta:
-        ordering = ['created_at']
\ No newline at end of file
+        ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'seq'], name='chat_message_conversation_seq'),
+        ]
+        indexes = [
+            # Admin month filters (created_at ranges)
+            models.Index(fields=['created_at'], name='chat_message_created'),
+        ]
+
+class ChangeLogEntry(models.Model):
+    """
+    One change of a conversation or message, for delta sync.
+    The auto-increment id is the sync cursor: clients ask for the entries
+    after the last id they saw. Superseded entries are removed by
+    ``compact_changelog``; deleting a conversation leaves one tombstone
+    for it and none for its messages.
+    """
+
+    CONVERSATION = 'conversation'
+    MESSAGE = 'message'
+    OBJECT_TYPE_CHOICES = [
+        (CONVERSATION, 'Conversation'),
+        (MESSAGE, 'Message'),
+    ]
+
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTION_CHOICES = [
+        (UPSERT, 'Created or updated'),
+        (DELETE, 'Deleted'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    object_type = models.CharField(max_length=12, choices=OBJECT_TYPE_CHOICES)
+    object_id = models.BigIntegerField()
+    conversation_id = models.BigIntegerField(help_text='Conversation of the changed object (itself for conversations)')
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES, default=UPSERT)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'#{self.pk} {self.action} {self.object_type} {self.object_id}'
+
+    class Meta:
+        db_table = 'chat_changelog'
+        indexes = [
+            # Sync: range scan of a user's entries after a cursor
+            models.Index(fields=['user', 'id'], name='chat_changelog_user_cursor'),
+            # Compaction: latest entry per object
+            models.Index(fields=['object_type', 'object_id'], name='chat_changelog_object'),
+        ]
+
+
+class ConversationSnapshot(models.Model):
+    """
+    Precomputed, compressed JSON response of an archived conversation
+    (detail or message list), served as a blob. Only valid while
+    ``version`` equals the conversation's ``updated_at``.
+    """
+
+    DETAIL = 'detail'
+    MESSAGES = 'messages'
+    KIND_CHOICES = [
+        (DETAIL, 'Conversation detail'),
+        (MESSAGES, 'Message list'),
+    ]
+
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='snapshots')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    version = models.DateTimeField(help_text='updated_at of the conversation the snapshot was built from')
+    encoding = models.CharField(max_length=10, help_text='Content coding of body (gzip, br, zstd)')
+    body = models.BinaryField()
+    size = models.PositiveIntegerField(help_text='Uncompressed size in bytes')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.kind} snapshot of conversation {self.conversation_id} ({self.encoding})'
+
+    class Meta:
+        db_table = 'chat_conversation_snapshot'
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'kind'], name='chat_snapshot_conversation_kind'),
+        ]
+
+
+class ConversationColdStorage(models.Model):
+    """
+    Messages of an archived conversation packed into one compressed blob
+    (NDJSON lines, see apps/chat/services/cold_storage.py), kept in
+    ``data`` or in a file of the cold store directory.
+    """
+
+    conversation = models.OneToOneField(Conversation, on_delete=models.CASCADE, related_name='cold_storage')
+    encoding = models.CharField(max_length=10, help_text='Compression of the blob (gzip, br, zstd)')
+    data = models.BinaryField(null=True, blank=True)
+    location = models.CharField(max_length=255, blank=True, help_text='File name in the cold store directory')
+    message_count = models.PositiveIntegerField()
+    size = models.PositiveBigIntegerField(help_text='Uncompressed size in bytes')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Cold storage of conversation {self.conversation_id} ({self.message_count} messages)'
+
+    class Meta:
+        db_table = 'chat_conversation_cold_storage'
+
+
+class MessageEmbedding(models.Model):
+    """
+    Embedding of a message for semantic search (float32 bytes, normalized).
+    Plain ids rather than foreign keys: the message table may be
+    partitioned, and packed (cold) messages keep their embedding. The
+    per-user index files (apps/chat/services/search.py) are built from
+    these rows; the rows added since the last build are scanned directly.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    message_id = models.BigIntegerField()
+    conversation_id = models.BigIntegerField()
+    model = models.CharField(max_length=40, help_text='Embedder and dimensions, e.g. hashing-256')
+    vector = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.model} embedding of message {self.message_id}'
+
+    class Meta:
+        db_table = 'chat_message_embedding'
+        constraints = [
+            models.UniqueConstraint(fields=['message_id', 'model'], name='chat_embedding_message_model'),
+        ]
+        indexes = [
+            # Index builds and the delta scan: a user's rows after an id
+            models.Index(fields=['user', 'model', 'id'], name='chat_embedding_user_model_id'),
+            models.Index(fields=['conversation_id'], name='chat_embedding_conversation'),
+        ]
+
+
+class MessageRevision(models.Model):
+    """
+    One version of the content of an edited message. Revision 0 is the
+    original content, revision ``n`` the content after the n-th edit (the
+    last one equals ``Message.content``). Most rows hold a compact diff
+    against the previous revision; every ``CHAT_REVISIONS['SNAPSHOT_EVERY']``
+    revisions the full content is stored, so rebuilding a revision applies
+    a bounded number of diffs (apps/chat/services/revisions.py). Plain ids,
+    as for embeddings: the message table may be partitioned.
+    """
+
+    SNAPSHOT = 'snapshot'
+    DIFF = 'diff'
+    KIND_CHOICES = [
+        (SNAPSHOT, 'Full content'),
+        (DIFF, 'Diff against the previous revision'),
+    ]
+
+    message_id = models.BigIntegerField()
+    conversation_id = models.BigIntegerField()
+    revision = models.PositiveIntegerField()
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    data = models.BinaryField()
+    encoding = models.CharField(max_length=10, blank=True, help_text='Compression of data (gzip, br, zstd)')
+    size = models.PositiveIntegerField(help_text='Length of the content of the revision')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Revision {self.revision} of message {self.message_id} ({self.kind})'
+
+    class Meta:
+        db_table = 'chat_message_revision'
+        constraints = [
+            models.UniqueConstraint(fields=['message_id', 'revision'], name='chat_revision_message_revision'),
+        ]
+        indexes = [
+            models.Index(fields=['conversation_id'], name='chat_revision_conversation'),
+        ]
@@ -0,0 +1,277 @@
+"""
+Monthly range partitioning of ``chat_message`` on PostgreSQL (optional).
+
+``manage.py partition_messages`` converts the table in place:
+``chat_message`` becomes a table partitioned by ``created_at`` with one
+partition per month (``chat_message_y2025m01``...) and a default
+partition for out-of-range rows. ``manage.py rotate_message_partitions``
+then creates the partitions of the coming months and drops the ones past
+the retention period: expired messages go away with a ``DROP TABLE``
+instead of ``DELETE`` + vacuum.
+
+Postgres requires the partition key in every unique constraint, hence
+these differences with the Django schema:
+
+- the primary key is ``(id, created_at)``; ids still come from one
+  sequence and stay unique,
+- ``(conversation, seq)`` is only unique together with ``created_at``
+  (writers serialize seq allocation with ``message_lock`` anyway),
+- ``parent_id`` has no foreign key constraint (Django applies
+  ``SET_NULL`` itself).
+
+With ``MESSAGE_PARTITIONS['ENABLED']``, the conversation-scoped queries
+bound ``created_at`` by the conversation's creation date (a message is
+never older than its conversation, see ``Conversation.bounded_messages``)
+so that Postgres only scans the partitions from that month on.
+
+Dropping a partition bypasses Django's signals, so
+``drop_partitions_before`` does their work in SQL first: it deletes the
+embeddings, revisions and snapshots of the dropped messages, detaches
+the replies pointing into the partition (``parent_id`` set to NULL),
+writes sync tombstones, and recounts the affected conversations.
+"""
+import datetime
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ChangeLogEntry, Conversation, ConversationSnapshot, Message, MessageEmbedding, MessageRevision
+
+TABLE = Message._meta.db_table
+UNPARTITIONED = f'{TABLE}_unpartitioned'
+SEQUENCE = f'{TABLE}_id_seq_partitioned'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+_BOUNDS_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def partition_settings(name):
+    defaults = {'ENABLED': False, 'MONTHS_AHEAD': 3, 'RETENTION_MONTHS': None}
+    return getattr(settings, 'MESSAGE_PARTITIONS', {}).get(name, defaults[name])
+
+
+def month_start(value) -> datetime.datetime:
+    value = value.astimezone(datetime.timezone.utc)
+    return datetime.datetime(value.year, value.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def add_months(month: datetime.datetime, count: int) -> datetime.datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime.datetime) -> str:
+    return f'{TABLE}_y{month:%Y}m{month:%m}'
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def check_supported() -> None:
+    if connection.vendor != 'postgresql':
+        raise NotImplementedError('Message partitioning requires PostgreSQL')
+
+
+def is_partitioned() -> bool:
+    check_supported()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace',
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """``(name, lower, upper)`` of the monthly partitions, oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent '
+            'WHERE p.relname = %s AND p.relnamespace = current_schema()::regnamespace',
+            [TABLE],
+        )
+        partitions = []
+        for name, bound in cursor.fetchall():
+            match = _BOUNDS_RE.search(bound or '')
+            if match:
+                lower, upper = (datetime.datetime.fromisoformat(value) for value in match.groups())
+                partitions.append((name, lower, upper))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition_sql(month: datetime.datetime) -> str:
+    return (
+        f'CREATE TABLE IF NOT EXISTS {_quote(partition_name(month))} PARTITION OF {_quote(TABLE)} '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+def ensure_partitions(months_ahead: int = None, since: datetime.datetime = None) -> list:
+    """Create the missing monthly partitions up to ``months_ahead`` months from now"""
+    check_supported()
+    months_ahead = partition_settings('MONTHS_AHEAD') if months_ahead is None else months_ahead
+    current = month_start(timezone.now())
+    month = month_start(since) if since is not None else current
+    existing = {name for name, _, _ in list_partitions()}
+    created = []
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            while month <= add_months(current, months_ahead):
+                if partition_name(month) not in existing:
+                    # Rows of that month parked in the default partition would
+                    # make CREATE fail: move them in the new partition
+                    cursor.execute(
+                        f'CREATE TEMP TABLE _moved ON COMMIT DROP AS WITH moved AS ('
+                        f'DELETE FROM {_quote(DEFAULT_PARTITION)} WHERE created_at >= %s AND created_at < %s '
+                        f'RETURNING *) SELECT * FROM moved',
+                        [month, add_months(month, 1)],
+                    )
+                    cursor.execute(create_partition_sql(month))
+                    cursor.execute(f'INSERT INTO {_quote(TABLE)} SELECT * FROM _moved')
+                    cursor.execute('DROP TABLE _moved')
+                    created.append(partition_name(month))
+                month = add_months(month, 1)
+    return created
+
+
+def drop_partitions_before(cutoff: datetime.datetime) -> list:
+    """Detach and drop the partitions holding only messages older than ``cutoff``"""
+    check_supported()
+    dropped = []
+    for name, lower, upper in list_partitions():
+        if upper > cutoff:
+            break
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {_quote(TABLE)} DETACH PARTITION {_quote(name)}')
+                _forget_messages(cursor, _quote(name))
+                cursor.execute(f'DROP TABLE {_quote(name)}')
+                _recount_conversations(cursor)
+        dropped.append(name)
+    return dropped
+
+
+def _forget_messages(cursor, partition) -> None:
+    """
+    What the delete signals would do for every message of the detached
+    ``partition``, set-based. The affected conversations are kept in a
+    temporary table for ``_recount_conversations``.
+    """
+    ids = f'SELECT id FROM {partition}'
+    cursor.execute(
+        f'CREATE TEMP TABLE _dropped_conversations ON COMMIT DROP AS '
+        f'SELECT DISTINCT conversation_id AS id FROM {partition}'
+    )
+    for model in (MessageEmbedding, MessageRevision):
+        cursor.execute(f'DELETE FROM {_quote(model._meta.db_table)} WHERE message_id IN ({ids})')
+    # Replies in later months lose their parent, as with on_delete=SET_NULL
+    cursor.execute(
+        f'UPDATE {_quote(TABLE)} SET parent_id = NULL WHERE parent_id IN ({ids})'
+    )
+    cursor.execute(
+        f'DELETE FROM {_quote(ConversationSnapshot._meta.db_table)} '
+        f'WHERE conversation_id IN (SELECT id FROM _dropped_conversations)'
+    )
+    # Sync: a tombstone per message replaces its earlier entries
+    changelog = _quote(ChangeLogEntry._meta.db_table)
+    cursor.execute(
+        f'DELETE FROM {changelog} WHERE object_type = %s AND object_id IN ({ids})',
+        [ChangeLogEntry.MESSAGE],
+    )
+    cursor.execute(
+        f'INSERT INTO {changelog} (user_id, object_type, object_id, conversation_id, action, created_at) '
+        f'SELECT c.user_id, %s, m.id, m.conversation_id, %s, clock_timestamp() FROM {partition} m '
+        f'JOIN {_quote(Conversation._meta.db_table)} c ON c.id = m.conversation_id ORDER BY m.id',
+        [ChangeLogEntry.MESSAGE, ChangeLogEntry.DELETE],
+    )
+
+
+def _recount_conversations(cursor) -> None:
+    """Refresh the counters of the conversations that lost messages, and announce them to sync"""
+    conversations, table = _quote(Conversation._meta.db_table), _quote(TABLE)
+    cursor.execute(
+        f'UPDATE {conversations} c SET '
+        f'message_count = (SELECT COUNT(*) FROM {table} m WHERE m.conversation_id = c.id), '
+        f'last_message_at = (SELECT MAX(created_at) FROM {table} m WHERE m.conversation_id = c.id) '
+        f'WHERE c.id IN (SELECT id FROM _dropped_conversations) AND c.storage_tier = %s',
+        [Conversation.HOT],
+    )
+    cursor.execute(
+        f'INSERT INTO {_quote(ChangeLogEntry._meta.db_table)} '
+        f'(user_id, object_type, object_id, conversation_id, action, created_at) '
+        f'SELECT c.user_id, %s, c.id, c.id, %s, clock_timestamp() FROM {conversations} c '
+        f'WHERE c.id IN (SELECT id FROM _dropped_conversations) ORDER BY c.id',
+        [ChangeLogEntry.CONVERSATION, ChangeLogEntry.UPSERT],
+    )
+    cursor.execute('DROP TABLE _dropped_conversations')
+
+
+def conversion_sql(first_month: datetime.datetime, months_ahead: int) -> list:
+    """Statements turning the plain table into a partitioned one (data copy included)"""
+    table, old = _quote(TABLE), _quote(UNPARTITIONED)
+    statements = [
+        f'ALTER TABLE {table} RENAME TO {old}',
+        # Constraint indexes share the schema's namespace: free the names
+        f'ALTER TABLE {old} RENAME CONSTRAINT {_quote(TABLE + "_pkey")} TO {_quote(UNPARTITIONED + "_pkey")}',
+        f'ALTER TABLE {old} RENAME CONSTRAINT chat_message_conversation_seq TO {_quote(UNPARTITIONED + "_seq")}',
+        f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)',
+        # The id column was an identity column of the old table
+        f'CREATE SEQUENCE IF NOT EXISTS {_quote(SEQUENCE)}',
+        f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')",
+        f'ALTER SEQUENCE {_quote(SEQUENCE)} OWNED BY {table}.id',
+        f"SELECT setval('{SEQUENCE}', COALESCE((SELECT MAX(id) FROM {old}), 0) + 1, false)",
+        f'ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)',
+        f'ALTER TABLE {table} ADD CONSTRAINT chat_message_conversation_seq '
+        f'UNIQUE (conversation_id, seq, created_at)',
+        f'ALTER TABLE {table} ADD CONSTRAINT chat_message_conversation_id_fk_partitioned '
+        f'FOREIGN KEY (conversation_id) REFERENCES {_quote("chat_conversation")} (id) '
+        f'DEFERRABLE INITIALLY DEFERRED',
+    ]
+    current = month_start(timezone.now())
+    month = first_month
+    while month <= add_months(current, months_ahead):
+        statements.append(create_partition_sql(month))
+        month = add_months(month, 1)
+    statements += [
+        f'CREATE TABLE {_quote(DEFAULT_PARTITION)} PARTITION OF {table} DEFAULT',
+        f'INSERT INTO {table} SELECT * FROM {old}',
+    ]
+    return statements
+
+
+def convert(months_ahead: int = None) -> list:
+    """
+    Partition the message table, copying its rows. Runs in one transaction
+    and locks the table for its duration: plan a maintenance window.
+    Returns the statements executed.
+    """
+    check_supported()
+    if is_partitioned():
+        return []
+    months_ahead = partition_settings('MONTHS_AHEAD') if months_ahead is None else months_ahead
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT MIN(created_at) FROM {_quote(TABLE)}')
+            oldest = cursor.fetchone()[0]
+            # Secondary indexes, recreated (same names) on the partitioned table
+            cursor.execute(
+                'SELECT indexdef FROM pg_indexes i WHERE tablename = %s AND schemaname = current_schema() '
+                'AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)',
+                [TABLE],
+            )
+            indexes = [row[0] for row in cursor.fetchall()]
+
+            statements = conversion_sql(month_start(oldest or timezone.now()), months_ahead)
+            statements.append(f'DROP TABLE {_quote(UNPARTITIONED)} CASCADE')
+            statements += [
+                re.sub(r' ON (\S+\.)?"?%s"? ' % re.escape(TABLE), f' ON {_quote(TABLE)} ', index, count=1)
+                for index in indexes
+            ]
+            for statement in statements:
+                cursor.execute(statement)
+    return statements
@@ -0,0 +1,111 @@
+"""
+Events pushed to the user's WebSocket (``/ws/chat/``).
+
+Every event is a JSON object with a ``type``:
+
+- ``message.created``: ``conversation_id``, ``message`` (as in the API)
+- ``generation.token``: ``conversation_id``, ``message_id`` (the user
+  message being answered), ``index`` and ``text`` (the next tokens)
+- ``generation.completed``: ``conversation_id``, ``message_id``,
+  ``ai_message``
+- ``generation.failed``: ``conversation_id``, ``message_id``, ``error``
+- ``conversation.updated``: ``conversation_id`` and the changed fields
+  (e.g. ``title`` once the generated title is saved)
+"""
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.core.events import hub
+
+
+def user_channel(user_id) -> str:
+    return f'user:{user_id}'
+
+
+def publish(user_id, event: dict) -> None:
+    hub.publish(user_channel(user_id), event)
+
+
+def message_created(message) -> None:
+    """Announce a new message once its transaction commits"""
+    from .serializers import MessageSerializer
+
+    def send():
+        publish(message.conversation.user_id, {
+            'type': 'message.created',
+            'conversation_id': message.conversation_id,
+            'message': MessageSerializer(message).data,
+        })
+
+    transaction.on_commit(send)
+
+
+def generation_completed(user_message, ai_message) -> None:
+    from .serializers import MessageSerializer
+
+    transaction.on_commit(partial(publish, user_message.conversation.user_id, {
+        'type': 'generation.completed',
+        'conversation_id': user_message.conversation_id,
+        'message_id': user_message.id,
+        'ai_message': MessageSerializer(ai_message).data,
+    }))
+
+
+def generation_failed(user_message, error) -> None:
+    publish(user_message.conversation.user_id, {
+        'type': 'generation.failed',
+        'conversation_id': user_message.conversation_id,
+        'message_id': user_message.id,
+        'error': str(error),
+    })
+
+
+def conversation_updated(conversation, fields) -> None:
+    event = {'type': 'conversation.updated', 'conversation_id': conversation.pk}
+    event.update((field, getattr(conversation, field)) for field in fields)
+    transaction.on_commit(partial(publish, conversation.user_id, event))
+
+
+class TokenPublisher:
+    """
+    Push the tokens of a generation as they arrive. Tokens are grouped
+    for ``REALTIME['TOKEN_FLUSH_INTERVAL']`` seconds so a fast model
+    doesn't produce one broker message per token.
+    """
+
+    def __init__(self, user_message):
+        self.user_id = user_message.conversation.user_id
+        self.conversation_id = user_message.conversation_id
+        self.message_id = user_message.id
+        self.interval = getattr(settings, 'REALTIME', {}).get('TOKEN_FLUSH_INTERVAL', 0.05)
+        self.index = 0
+        self.pending = []
+        self.next_flush = time.monotonic() + self.interval
+
+    def add(self, text: str) -> None:
+        self.pending.append(text)
+        if time.monotonic() >= self.next_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        self.next_flush = time.monotonic() + self.interval
+        if not self.pending:
+            return
+        publish(self.user_id, {
+            'type': 'generation.token',
+            'conversation_id': self.conversation_id,
+            'message_id': self.message_id,
+            'index': self.index,
+            'text': ''.join(self.pending),
+        })
+        self.index += 1
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
@@ -67,7 +67,10 @@ def handle_ai_service_error(func):
     
     @wraps(func)
     def wrapper(*args, **kwargs):
-        from django.core.cache import cache
+        from django.core.cache import caches
+        
+        # Shared tier: every worker sees the same error count
+        cache = caches['shared']
         
         # Check if circuit is open (service marked as down)
         error_count = cache.get(CIRCUIT_BREAKER_KEY, 0)
@@ -82,12 +85,13 @@ def handle_ai_service_error(func):
             return result
             
         except Exception as e:
-            # Increment error count
-            cache.set(
-                CIRCUIT_BREAKER_KEY,
-                error_count + 1,
-                RESET_TIMEOUT
-            )
+            # Increment error count atomically (concurrent failures all count)
+            if not cache.add(CIRCUIT_BREAKER_KEY, 1, RESET_TIMEOUT):
+                try:
+                    cache.incr(CIRCUIT_BREAKER_KEY)
+                except ValueError:
+                    # Expired between add() and incr()
+                    cache.set(CIRCUIT_BREAKER_KEY, 1, RESET_TIMEOUT)
             raise AIServiceError(str(e))
     
     return wrapper
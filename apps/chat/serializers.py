@@ -1,4 +1,8 @@
+from django.conf import settings
 from rest_framework import serializers
+
+from apps.core.serializers import ValuesSerializer
+
 from .models import Conversation, Message
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -13,4 +17,51 @@ class ConversationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Conversation
         fields = ['id', 'title', 'created_at', 'updated_at', 'messages', 'additional_data']
-        read_only_fields = ['id', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+
+class SyncConversationSerializer(serializers.ModelSerializer):
+    """Conversation without its messages (they sync separately)"""
+
+    class Meta:
+        model = Conversation
+        fields = ['id', 'title', 'status', 'is_pinned', 'category', 'tags', 'message_count',
+                  'last_message_at', 'created_at', 'updated_at', 'additional_data']
+
+
+class SyncMessageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Message
+        fields = ['id', 'conversation', 'parent', 'seq', 'role', 'content', 'status',
+                  'created_at', 'updated_at', 'additional_data']
+
+
+# Read-only fast path (same output, see apps/core/serializers.py),
+# used when CHAT_SERIALIZATION['FAST_READS'] is on
+
+def fast_reads_enabled() -> bool:
+    return getattr(settings, 'CHAT_SERIALIZATION', {}).get('FAST_READS', False)
+
+
+class FastMessageSerializer(ValuesSerializer):
+    fields = MessageSerializer.Meta.fields
+    datetime_fields = ('created_at',)
+
+
+class FastConversationSerializer(ValuesSerializer):
+    fields = ConversationSerializer.Meta.fields
+    sources = {'messages': 'id'}
+    datetime_fields = ('created_at', 'updated_at')
+
+    def get_converters(self, rows):
+        converters = super().get_converters(rows)
+        ids = [row[self.fields.index('id')] for row in rows]
+        messages = {}
+        # One query per 500 conversations
+        for start in range(0, len(ids), 500):
+            messages.update(FastMessageSerializer().serialize_grouped(
+                Message.objects.filter(conversation_id__in=ids[start:start + 500]).order_by('created_at', 'id'),
+                'conversation_id',
+            ))
+        converters['messages'] = lambda conversation_id: messages.get(conversation_id, [])
+        return converters
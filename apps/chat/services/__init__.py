@@ -1,5 +1,17 @@
+from .cold_storage import ColdStorageService
 from .conversation import ConversationService
+from .enrichment import EnrichmentService
+from .export import ExportService
+from .generation import GenerationService
 from .message import MessageService
 from .mistral import MistralService
+from .prompts import PromptService
+from .revisions import RevisionService
+from .retrieval import RetrievalService
+from .search import EmbeddingService, SearchService, VectorIndexService
+from .snapshot import SnapshotService
+from .sync import SyncService
+from .titles import TitleService
+from .tree import MessageTreeService
 
-__all__ = ['ConversationService', 'MessageService', 'MistralService']
+__all__ = ['ColdStorageService', 'ConversationService', 'EmbeddingService', 'EnrichmentService', 'ExportService', 'GenerationService', 'MessageService', 'MistralService', 'MessageTreeService', 'PromptService', 'RetrievalService', 'RevisionService', 'SearchService', 'SnapshotService', 'SyncService', 'TitleService', 'VectorIndexService']
@@ -0,0 +1,256 @@
+"""
+Cold storage for archived conversations.
+
+Packing moves the messages of an archived conversation out of the hot
+``Message`` table into one compressed blob (``ConversationColdStorage``),
+stored in the database or as a file (``COLD_STORAGE['BACKEND']``). The
+blob holds the export's NDJSON message lines, ids included, so the export
+copies it as is and unpacking (on restore) re-inserts the very same rows
+in bulk.
+
+While packed, the conversation's detail and message list are served from
+its snapshot (see ``SnapshotService``); endpoints addressing a single
+message answer 404 and search ignores its messages.
+"""
+import io
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import timedelta
+from functools import partial
+from pathlib import Path
+from typing import Iterator, List
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from apps.core.background import BatchWorker
+from apps.core.compression import available_encodings, compress, decompressing_reader
+
+from ..models import Conversation, ConversationColdStorage, Message
+from .export import MESSAGE_FIELDS, encode_line, parse_datetimes
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, 'COLD_STORAGE', {}).get(name, default)
+
+
+class DatabaseColdStore:
+    """Blobs in the ``data`` column"""
+
+    def put(self, record, blob: bytes) -> None:
+        record.data = blob
+
+    def open(self, record):
+        return io.BytesIO(record.data)
+
+    def delete(self, record) -> None:
+        pass
+
+
+class FileColdStore:
+    """
+    One file per conversation in ``COLD_STORAGE['PATH']``.
+    A blob is written as ``<name>.pending`` and renamed once the
+    transaction saving its record commits, so a rollback leaves no file
+    under a final name; ``sweep()`` removes the pending files it leaves.
+    """
+
+    PENDING_SUFFIX = '.pending'
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def put(self, record, blob: bytes) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        name = f'{record.conversation_id}-{uuid.uuid4().hex}.{record.encoding}'
+        with open(self.path / (name + self.PENDING_SUFFIX), 'wb') as f:
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        record.location = name
+        transaction.on_commit(partial(self.publish, name))
+
+    def publish(self, name: str) -> None:
+        try:
+            os.replace(self.path / (name + self.PENDING_SUFFIX), self.path / name)
+        except FileNotFoundError:
+            pass
+
+    def open(self, record):
+        try:
+            return open(self.path / record.location, 'rb')
+        except FileNotFoundError:
+            # Committed, not renamed yet
+            return open(self.path / (record.location + self.PENDING_SUFFIX), 'rb')
+
+    def delete(self, record) -> None:
+        (self.path / record.location).unlink(missing_ok=True)
+        (self.path / (record.location + self.PENDING_SUFFIX)).unlink(missing_ok=True)
+
+    def sweep(self, max_age: float) -> int:
+        """
+        Settle the pending files older than ``max_age`` seconds: rename those
+        whose record was committed, delete the others; returns the deletions
+        """
+        deleted = 0
+        cutoff = time.time() - max_age
+        for pending in self.path.glob('*' + self.PENDING_SUFFIX):
+            try:
+                if pending.stat().st_mtime > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            name = pending.name[:-len(self.PENDING_SUFFIX)]
+            if ConversationColdStorage.objects.filter(location=name).exists():
+                self.publish(name)
+            else:
+                pending.unlink(missing_ok=True)
+                deleted += 1
+        return deleted
+
+
+def store_for(record=None):
+    """The store holding ``record`` (or the one new blobs go to)"""
+    if record is not None:
+        is_file = bool(record.location)
+    else:
+        is_file = _setting('BACKEND', 'db') == 'file'
+    if is_file:
+        return FileColdStore(_setting('PATH', Path(settings.BASE_DIR) / 'cold_storage'))
+    return DatabaseColdStore()
+
+
+def _pack_batch(conversation_ids):
+    for conversation_id in dict.fromkeys(conversation_ids):
+        conversation = Conversation.objects.filter(pk=conversation_id).first()
+        if conversation is not None:
+            ColdStorageService.pack(conversation)
+
+
+cold_storage_queue = BatchWorker('cold-storage', _pack_batch, batch_size=10, flush_interval=0.5)
+
+
+class ColdStorageService:
+    """Service class for moving archived conversations to and from cold storage"""
+
+    @staticmethod
+    def pack(conversation: Conversation) -> bool:
+        """Move the messages of an archived conversation to cold storage"""
+        encoding = _setting('ENCODING', 'zstd')
+        if encoding not in available_encodings():
+            encoding = 'gzip'
+        store = store_for()
+        with transaction.atomic():
+            locked = Conversation.objects.select_for_update().get(pk=conversation.pk)
+            if locked.status != 'archived' or locked.storage_tier == Conversation.COLD:
+                return False
+
+            rows = Message.objects.filter(conversation=locked).order_by('id').values(*MESSAGE_FIELDS)
+            payload = bytearray()
+            count = 0
+            for row in rows.iterator(chunk_size=2000):
+                payload += encode_line({'type': 'message', **row})
+                count += 1
+
+            record = ConversationColdStorage(
+                conversation=locked, encoding=encoding, message_count=count, size=len(payload)
+            )
+            store.put(record, compress(bytes(payload), encoding, _setting('LEVEL', None)))
+            try:
+                record.save()
+                _delete_rows(locked.pk)
+                # update(): updated_at is kept, so the snapshots stay valid
+                Conversation.objects.filter(pk=locked.pk).update(storage_tier=Conversation.COLD)
+            except Exception:
+                store.delete(record)
+                raise
+        conversation.storage_tier = Conversation.COLD
+        return True
+
+    @staticmethod
+    def unpack(conversation: Conversation) -> int:
+        """Put the messages back in the message table, with their ids; returns their number"""
+        with transaction.atomic():
+            locked = Conversation.objects.select_for_update().get(pk=conversation.pk)
+            if locked.storage_tier != Conversation.COLD:
+                return 0
+            record = locked.cold_storage
+            messages = ColdStorageService.messages(record)
+            _insert_with_ids(messages)
+            # The file (if any) is removed once committed, see signals
+            record.delete()
+            Conversation.objects.filter(pk=locked.pk).update(storage_tier=Conversation.HOT)
+        conversation.storage_tier = Conversation.HOT
+        return len(messages)
+
+    @staticmethod
+    def message_lines(record: ConversationColdStorage) -> Iterator[bytes]:
+        """The packed NDJSON lines (export format), decompressed as they are read"""
+        with store_for(record).open(record) as blob:
+            yield from decompressing_reader(blob, record.encoding)
+
+    @staticmethod
+    def messages(record: ConversationColdStorage) -> List[Message]:
+        """Unsaved ``Message`` instances rebuilt from the blob, in id order"""
+        messages = []
+        for line in ColdStorageService.message_lines(record):
+            data = json.loads(line)
+            data.pop('type')
+            messages.append(Message(**parse_datetimes(data)))
+        return messages
+
+    @staticmethod
+    def schedule(conversation: Conversation) -> None:
+        """Pack in the background after commit, if ``COLD_STORAGE['ON_ARCHIVE']``"""
+        if _setting('ON_ARCHIVE', False):
+            transaction.on_commit(lambda: cold_storage_queue.submit(conversation.pk))
+
+    @staticmethod
+    def pack_archived(older_than_days: int = None) -> int:
+        """Pack every conversation archived more than ``older_than_days`` ago"""
+        days = _setting('AFTER_DAYS', 30) if older_than_days is None else older_than_days
+        store = store_for()
+        if isinstance(store, FileColdStore):
+            # Blobs of packs rolled back since the last run
+            store.sweep(_setting('PENDING_MAX_AGE', 3600))
+        candidates = Conversation.objects.filter(
+            status='archived', storage_tier=Conversation.HOT,
+            archived_at__lte=timezone.now() - timedelta(days=days),
+        ).order_by('id').values_list('id', flat=True)
+        packed = 0
+        for conversation_id in list(candidates):
+            try:
+                packed += ColdStorageService.pack(Conversation(pk=conversation_id))
+            except Exception:
+                logger.exception('Packing conversation %s failed', conversation_id)
+        return packed
+
+
+def _delete_rows(conversation_id) -> None:
+    """
+    Physical removal of the packed rows, not a deletion of the messages:
+    no signals, so no changelog tombstones, events or snapshot drops.
+    """
+    using = router.db_for_write(Message)
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(Message._meta.db_table)} WHERE conversation_id = %s',
+            [conversation_id],
+        )
+
+
+def _insert_with_ids(messages) -> None:
+    """Raw insert keeping ids and timestamps (like ``loaddata``)"""
+    using = router.db_for_write(Message)
+    connection = connections[using]
+    fields = Message._meta.concrete_fields
+    batch_size = max(connection.ops.bulk_batch_size(fields, messages), 1)
+    for start in range(0, len(messages), batch_size):
+        Message._base_manager._insert(messages[start:start + batch_size], fields=fields, raw=True, using=using)
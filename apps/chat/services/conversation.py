@@ -1,7 +1,7 @@
 from django.utils.text import slugify
 from django.utils import timezone
 from django.db.models import Q
-from django.db import transaction
+from django.db import OperationalError, transaction
 from typing import Optional, List, Dict, Any
 
 from ..models import Conversation, Message
@@ -9,10 +9,16 @@ from .exceptions import (
     InvalidConversationStateError,
     MessageOrderingError,
     OrphanedMessageError,
-    ConversationConflictError
+    ConversationConflictError,
+    LockAcquisitionError
 )
 from .locks import conversation_lock, message_lock
 from .retries import retry_on_error, recover_orphaned_messages
+from .cold_storage import ColdStorageService
+from .enrichment import EnrichmentService
+from .snapshot import SnapshotService
+from .titles import DEFAULT_TITLE, TitleService
+from apps.core.write_queue import write_queue
 
 
 class ConversationService:
@@ -29,7 +35,7 @@ class ConversationService:
             return conversation
 
     @staticmethod
-    @retry_on_error()
+    @retry_on_error(retryable_exceptions=(OperationalError, LockAcquisitionError))
     def add_message_to_conversation(conversation: Conversation, content: str, role: str,
                                   parent_message: Optional[Message] = None,
                                   content_type: str = 'text',
@@ -45,6 +51,14 @@ class ConversationService:
         if parent_message and parent_message.conversation_id != conversation.id:
             raise OrphanedMessageError('Parent message belongs to different conversation')
         
+        # Group-committed by the writer thread on SQLite (see apps/core/write_queue.py)
+        return write_queue.run(
+            ConversationService._insert_message,
+            conversation, content, role, parent_message, content_type, metadata
+        )
+
+    @staticmethod
+    def _insert_message(conversation, content, role, parent_message, content_type, metadata) -> Message:
         with transaction.atomic():
             with message_lock(conversation.id):
                 # Verify message ordering if it's a reply
@@ -67,25 +81,20 @@ class ConversationService:
                 
                 # Update conversation
                 conversation.last_message_at = timezone.now()
-                conversation.message_count = conversation.messages.count()
+                conversation.message_count = conversation.bounded_messages().count()
                 conversation.save()
                 
                 return message
 
     @staticmethod
-    def generate_title(conversation: Conversation) -> str:
-        """Generate a title for the conversation based on its content"""
-        # Get the first user message
-        first_message = conversation.messages.filter(role='user').first()
-        if first_message:
-            # Use the first 50 characters of the first message
-            title = first_message.content[:50]
-            # Clean it up
-            title = title.strip()
-            if len(first_message.content) > 50:
-                title += "..."
-            return title
-        return "New Conversation"
+    def generate_title(conversation: Conversation, first_message: Optional[str] = None) -> str:
+        """Heuristic title from the first user message (pass its text to spare the query)"""
+        if first_message is None:
+            message = conversation.bounded_messages().filter(role='user').order_by('seq').first()
+            if message is None:
+                return DEFAULT_TITLE
+            first_message = message.content
+        return TitleService.heuristic(first_message)
 
     @staticmethod
     def update_conversation_title(conversation: Conversation, title: Optional[str] = None) -> Conversation:
@@ -125,10 +134,15 @@ class ConversationService:
                 raise InvalidConversationStateError('Cannot archive deleted conversation')
             
             # Check for pending messages
-            if conversation.messages.filter(status='pending').exists():
+            if conversation.bounded_messages().filter(status='pending').exists():
                 raise ConversationConflictError('Cannot archive conversation with pending messages')
             
             conversation.archive()
+            # Reads of archived conversations are served from a precomputed blob
+            SnapshotService.schedule(conversation)
+            ColdStorageService.schedule(conversation)
+            # Summary, tags and category, batched with other conversations
+            EnrichmentService.schedule(conversation)
             return conversation
 
     @staticmethod
@@ -138,10 +152,14 @@ class ConversationService:
             if conversation.status == 'deleted':
                 raise InvalidConversationStateError('Cannot restore deleted conversation')
             
+            # Messages moved to cold storage come back first
+            ColdStorageService.unpack(conversation)
+            
             # Recover any orphaned messages before restoration
             recover_orphaned_messages(conversation)
             
             conversation.restore()
+            conversation.snapshots.all().delete()
             return conversation
 
     @staticmethod
@@ -0,0 +1,194 @@
+"""
+Conversation metadata filled in by the model: ``summary``, ``tags``,
+``category`` (and ``title`` on demand).
+
+None of it is needed while the user waits, so conversations are queued
+(after archiving with ``CHAT_ENRICHMENT['ON_ARCHIVE']``, or in bulk with
+``manage.py enrich_conversations``) and processed through the batch
+inference layer: several conversations per prompt, every requested field
+at once, results saved with ``update_fields``.
+"""
+import json
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.core.background import BatchWorker
+from apps.core.inference import BatchInference, InferenceJob, InferenceStats, parse_numbered_json
+
+from .. import realtime
+from ..models import Conversation
+from .cold_storage import ColdStorageService
+from .titles import TitleService
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('title', 'summary', 'tags', 'category')
+
+
+def _setting(name, default):
+    return getattr(settings, 'CHAT_ENRICHMENT', {}).get(name, default)
+
+
+def _enrich_batch(conversation_ids):
+    EnrichmentService.enrich(list(dict.fromkeys(conversation_ids)))
+
+
+enrichment_queue = BatchWorker('conversation-enrichment', _enrich_batch, batch_size=50, flush_interval=5.0)
+
+
+class EnrichmentJob(InferenceJob):
+    """The requested fields for a pack of conversation excerpts"""
+
+    name = 'enrichment'
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = [field for field in FIELDS if field in fields]
+        self.categories = list(_setting('CATEGORIES', ['other']))
+
+    def build_prompt(self, inputs: List[str]) -> str:
+        shape = {
+            'title': '"title": "at most 6 words"',
+            'summary': '"summary": "one or two sentences"',
+            'tags': '"tags": ["up to 5 short lowercase keywords"]',
+            'category': f'"category": one of {", ".join(self.categories)}',
+        }
+        lines = [
+            'For each conversation below, in the language of the conversation, give:',
+            '{' + ', '.join(shape[field] for field in self.fields) + '}',
+            'Answer with one JSON object mapping each conversation number to that object.',
+        ]
+        for number, text in enumerate(inputs, 1):
+            lines += ['', f'### {number}', text]
+        return '\n'.join(lines)
+
+    def parse(self, response: str, count: int) -> Dict[int, dict]:
+        results = {}
+        for index, data in parse_numbered_json(response, count).items():
+            if isinstance(data, dict):
+                values = self.clean(data)
+                if values:
+                    results[index] = values
+        return results
+
+    def clean(self, data: dict) -> dict:
+        """Validated values of the requested fields"""
+        values = {}
+        if 'title' in self.fields and isinstance(data.get('title'), str) and data['title'].strip():
+            values['title'] = TitleService.heuristic(data['title'], _setting('TITLE_LENGTH', 50))
+        if 'summary' in self.fields and isinstance(data.get('summary'), str) and data['summary'].strip():
+            values['summary'] = ' '.join(data['summary'].split())[:_setting('SUMMARY_LENGTH', 500)]
+        if 'tags' in self.fields and isinstance(data.get('tags'), list):
+            tags = [
+                ' '.join(tag.lower().split())[:30] for tag in data['tags'] if isinstance(tag, str) and tag.strip()
+            ]
+            values['tags'] = list(dict.fromkeys(tags))[:_setting('MAX_TAGS', 5)]
+        if 'category' in self.fields and isinstance(data.get('category'), str):
+            category = data['category'].strip().lower()
+            values['category'] = category if category in self.categories else 'other'
+        return values
+
+    def stub_response(self, inputs: List[str]) -> str:
+        answers = {}
+        for number, text in enumerate(inputs, 1):
+            words = [word.strip('.,;:!?()').lower() for word in text.split() if len(word) > 5]
+            answers[str(number)] = {
+                'title': TitleService.heuristic(text.split('\n', 1)[0].partition(': ')[2], 30),
+                'summary': ' '.join(text.split()[:20]),
+                'tags': list(dict.fromkeys(words))[:3],
+                'category': self.categories[len(text) % len(self.categories)],
+            }
+        return json.dumps(answers)
+
+
+class EnrichmentService:
+    """Service class for model-filled conversation metadata"""
+
+    @staticmethod
+    def default_fields() -> List[str]:
+        return [field for field in _setting('FIELDS', ['summary', 'tags', 'category']) if field in FIELDS]
+
+    @staticmethod
+    def excerpt(conversation: Conversation) -> str:
+        """First messages of the conversation, ``role: content`` lines, cut to ``EXCERPT_LENGTH``"""
+        limit = _setting('EXCERPT_LENGTH', 2000)
+        if conversation.storage_tier == Conversation.COLD:
+            messages = sorted(ColdStorageService.messages(conversation.cold_storage), key=lambda m: m.seq)
+            rows = [(m.role, m.content) for m in messages[:20]]
+        else:
+            rows = conversation.bounded_messages().order_by('seq').values_list('role', 'content')[:20]
+        lines, size = [], 0
+        for role, content in rows:
+            line = f'{role}: {" ".join(content.split())}'
+            lines.append(line[:limit - size])
+            size += len(line) + 1
+            if size >= limit:
+                break
+        return '\n'.join(lines)
+
+    @staticmethod
+    def enrich(conversation_ids: List[int], fields: Optional[Iterable[str]] = None,
+               overwrite: bool = False, engine: Optional[BatchInference] = None) -> InferenceStats:
+        """
+        Fill ``fields`` (default ``CHAT_ENRICHMENT['FIELDS']``) of the given
+        conversations; with ``overwrite`` False, only the empty ones
+        """
+        fields = [field for field in (fields or EnrichmentService.default_fields()) if field in FIELDS]
+        job = EnrichmentJob(fields)
+        conversations = list(Conversation.objects.filter(pk__in=conversation_ids).order_by('pk'))
+        if not overwrite:
+            # Rien à demander au modèle pour une conversation déjà remplie
+            conversations = [
+                conversation for conversation in conversations
+                if any(not getattr(conversation, field) for field in fields)
+            ]
+        inputs = [EnrichmentService.excerpt(conversation) for conversation in conversations]
+        keep = [i for i, text in enumerate(inputs) if text]
+        conversations = [conversations[i] for i in keep]
+        inputs = [inputs[i] for i in keep]
+
+        if engine is None:
+            try:
+                engine = BatchInference()
+            except Exception:
+                logger.exception('No inference provider for enrichment')
+                return InferenceStats('none')
+        results, stats = engine.run(job, inputs)
+
+        with transaction.atomic():
+            for conversation, values in zip(conversations, results):
+                if values:
+                    EnrichmentService.apply(conversation, values, overwrite)
+        logger.info(
+            'Enrichment: %d/%d conversations in %d call(s), %.1f/s, cost/item %.6f',
+            stats.completed, stats.items, stats.calls, stats.items_per_second, stats.cost_per_item,
+        )
+        return stats
+
+    @staticmethod
+    def apply(conversation: Conversation, values: dict, overwrite: bool = False) -> List[str]:
+        """Save the model's values (the empty fields only unless ``overwrite``); returns the saved fields"""
+        locked = Conversation.objects.select_for_update().filter(pk=conversation.pk).first()
+        if locked is None:
+            # Supprimée pendant l'appel au modèle
+            return []
+        changed = [
+            field for field, value in values.items()
+            if (overwrite or not getattr(locked, field)) and getattr(locked, field) != value
+        ]
+        if not changed:
+            return []
+        for field in changed:
+            setattr(locked, field, values[field])
+        # updated_at too: it versions the list ETag and the snapshots
+        locked.save(update_fields=changed + ['updated_at'])
+        realtime.conversation_updated(locked, changed)
+        return changed
+
+    @staticmethod
+    def schedule(conversation: Conversation) -> None:
+        """Queue the conversation once the current transaction commits, if ``ON_ARCHIVE``"""
+        if _setting('ON_ARCHIVE', False):
+            transaction.on_commit(lambda: enrichment_queue.submit(conversation.pk))
@@ -27,3 +27,11 @@ class OrphanedMessageError(ChatBaseException):
 class ConversationConflictError(ChatBaseException):
     """Erreur levée quand il y a un conflit dans l'état de la conversation"""
     pass
+
+class LockAcquisitionError(ConversationConflictError):
+    """Erreur levée quand un verrou de conversation est déjà pris"""
+    pass
+
+class InvalidExportError(ChatBaseException):
+    """Erreur levée quand un export de conversations est invalide ou illisible"""
+    pass
@@ -0,0 +1,335 @@
+"""
+Streaming export/import of a user's chat history as NDJSON.
+
+One JSON object per line: a header, then each conversation followed by
+its messages. Rows are read with ``.iterator()`` and written back with
+``bulk_create`` in batches, and id mappings are only kept for the
+conversation being processed, so memory stays flat whatever the size of
+the history.
+"""
+import datetime
+import gzip
+import io
+import json
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import Conversation, ConversationColdStorage, Message
+from .exceptions import InvalidExportError
+from .sync import SyncService
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+EXPORT_VERSION = 1
+
+CONVERSATION_FIELDS = [
+    'id', 'title', 'slug', 'summary', 'tags', 'category', 'status', 'is_pinned',
+    'last_message_at', 'message_count', 'created_at', 'updated_at', 'archived_at',
+    'additional_data',
+]
+MESSAGE_FIELDS = [
+    'id', 'conversation_id', 'parent_id', 'seq', 'path', 'depth', 'role', 'content', 'content_type', 'status',
+    'is_edited', 'edit_count', 'created_at', 'updated_at', 'delivered_at',
+    'additional_data', 'metadata',
+]
+DATETIME_FIELDS = {'last_message_at', 'created_at', 'updated_at', 'archived_at', 'delivered_at'}
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def _setting(name, default):
+    return getattr(settings, 'CHAT_EXPORT', {}).get(name, default)
+
+
+def available_compressions():
+    return ['none', 'gzip'] + (['zstd'] if zstandard is not None else [])
+
+
+class _ExportEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder without the millisecond truncation, so timestamps round-trip"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+_encoder = _ExportEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def encode_line(obj) -> bytes:
+    """One NDJSON line of the export format"""
+    return (_encoder.encode(obj) + '\n').encode()
+
+
+class ExportService:
+    """Service class for exporting and importing chat history"""
+
+    @staticmethod
+    def iter_lines(user) -> Iterator[bytes]:
+        """
+        Yield the NDJSON lines of the user's history.
+        Conversations and messages are two ordered server-side iterators
+        merged on the fly: two queries in total, plus one per conversation
+        in cold storage.
+        """
+        chunk_size = _setting('CHUNK_SIZE', 2000)
+        yield encode_line({'type': 'header', 'version': EXPORT_VERSION})
+
+        conversations = Conversation.objects.filter(user=user).order_by('id').values(
+            *CONVERSATION_FIELDS, 'storage_tier'
+        ).iterator(chunk_size=chunk_size)
+        messages = Message.objects.filter(conversation__user=user).order_by(
+            'conversation_id', 'id'
+        ).values(*MESSAGE_FIELDS).iterator(chunk_size=chunk_size)
+
+        pending = next(messages, None)
+        for conversation in conversations:
+            is_cold = conversation.pop('storage_tier') == Conversation.COLD
+            yield encode_line({'type': 'conversation', **conversation})
+            if is_cold:
+                # Packed as export lines already
+                from .cold_storage import ColdStorageService
+
+                record = ConversationColdStorage.objects.get(conversation_id=conversation['id'])
+                yield from ColdStorageService.message_lines(record)
+            while pending is not None and pending['conversation_id'] <= conversation['id']:
+                if pending['conversation_id'] == conversation['id']:
+                    yield encode_line({'type': 'message', **pending})
+                pending = next(messages, None)
+
+    @staticmethod
+    def stream(user, compression: str = 'none') -> Iterator[bytes]:
+        """Yield the export as bytes, compressed on the fly"""
+        lines = ExportService.iter_lines(user)
+        if compression == 'none':
+            yield from _buffered(lines)
+        elif compression == 'gzip':
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            for chunk in _buffered(lines):
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+        elif compression == 'zstd' and zstandard is not None:
+            compressor = zstandard.ZstdCompressor(level=3).compressobj()
+            for chunk in _buffered(lines):
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+        else:
+            raise InvalidExportError(f'Unsupported compression: {compression}')
+
+    @staticmethod
+    def import_stream(user, fileobj, batch_size: Optional[int] = None) -> dict:
+        """
+        Import an export (plain, gzip or zstd, detected from the first bytes)
+        into the user's account. Conversations always get new ids.
+        """
+        importer = _Importer(user, batch_size or _setting('IMPORT_BATCH_SIZE', 1000))
+        line_number = 0
+        with transaction.atomic():
+            try:
+                for line_number, line in enumerate(_iter_text_lines(fileobj), 1):
+                    if line.strip():
+                        importer.feed(line)
+                importer.finish()
+            except InvalidExportError as e:
+                raise InvalidExportError(f'Line {line_number}: {e}' if line_number else str(e)) from e
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                # Missing keys, bad datetimes or values: the whole import is rolled back
+                raise InvalidExportError(f'Line {line_number}: invalid record ({type(e).__name__}: {e})') from e
+            # Bulk inserts skip the signals feeding the sync changelog
+            SyncService.record_conversations(user.pk, importer.conversation_ids)
+        return {'conversations': importer.conversation_count, 'messages': importer.message_count}
+
+
+def _buffered(lines: Iterable[bytes], size: int = 64 * 1024) -> Iterator[bytes]:
+    """Group small lines into larger chunks for the response/compressor"""
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+class _PrefixedStream(io.RawIOBase):
+    """Replays the sniffed magic bytes before the rest of the stream"""
+
+    def __init__(self, head: bytes, stream):
+        self.head = head
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.head:
+            size = min(len(buffer), len(self.head))
+            buffer[:size], self.head = self.head[:size], self.head[size:]
+            return size
+        data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _iter_text_lines(fileobj) -> Iterator[str]:
+    head = fileobj.read(4)
+    stream = io.BufferedReader(_PrefixedStream(head, fileobj))
+    if head.startswith(GZIP_MAGIC):
+        stream = gzip.GzipFile(fileobj=stream)
+    elif head.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise InvalidExportError('zstd compressed export but zstandard is not installed')
+        stream = zstandard.ZstdDecompressor().stream_reader(stream)
+    return io.TextIOWrapper(stream, encoding='utf-8')
+
+
+def parse_datetimes(data: dict) -> dict:
+    """Parse the datetime fields of a decoded line, in place"""
+    for field in DATETIME_FIELDS & data.keys():
+        if data[field]:
+            data[field] = parse_datetime(data[field])
+    return data
+
+
+class _Importer:
+    """
+    Incremental importer. Messages of a conversation follow it in the
+    stream, so only the current conversation's id mappings are kept.
+    Tree paths are built from per-conversation seq numbers and are
+    imported as-is; only the parent foreign keys need remapping.
+    """
+
+    def __init__(self, user, batch_size: int):
+        self.user = user
+        self.batch_size = batch_size
+        self.conversation = None
+        self.old_conversation_id = None
+        self.message_ids = {}  # old id -> new id, current conversation only
+        self.pending = []  # (old id, old parent id, Message)
+        self.conversation_ids = []
+        self.conversation_count = 0
+        self.message_count = 0
+        self.header_seen = False
+
+    def feed(self, line: str) -> None:
+        try:
+            data = json.loads(line)
+            kind = data.pop('type')
+        except (ValueError, KeyError, AttributeError, TypeError):
+            raise InvalidExportError('Malformed export line')
+
+        if kind == 'header':
+            if data.get('version') != EXPORT_VERSION:
+                raise InvalidExportError(f"Unsupported export version: {data.get('version')}")
+            self.header_seen = True
+        elif not self.header_seen:
+            raise InvalidExportError('Missing export header')
+        elif kind == 'conversation':
+            self._start_conversation(data)
+        elif kind == 'message':
+            self._add_message(data)
+        else:
+            raise InvalidExportError(f'Unknown export record: {kind}')
+
+    def finish(self) -> None:
+        self._flush_messages()
+        self.conversation = None
+
+    def _start_conversation(self, data: dict) -> None:
+        self.finish()
+        old_id = data.pop('id')
+        data = parse_datetimes({k: v for k, v in data.items() if k in CONVERSATION_FIELDS})
+
+        conversation = Conversation(user=self.user, **data)
+        if not conversation.slug:
+            conversation.slug = 'nouvelle-conversation'
+        now = timezone.now()
+        conversation.created_at = conversation.created_at or now
+        conversation.updated_at = conversation.updated_at or now
+        # Skips Conversation.save() and its message recount
+        _bulk_insert_raw(Conversation, [conversation])
+
+        self.conversation = conversation
+        self.old_conversation_id = old_id
+        self.message_ids = {}
+        self.conversation_ids.append(conversation.pk)
+        self.conversation_count += 1
+
+    def _add_message(self, data: dict) -> None:
+        if self.conversation is None or data.get('conversation_id') != self.old_conversation_id:
+            raise InvalidExportError('Message outside of its conversation')
+        old_id = data.pop('id')
+        old_parent_id = data.pop('parent_id', None)
+        data.pop('conversation_id')
+        data = parse_datetimes({k: v for k, v in data.items() if k in MESSAGE_FIELDS})
+
+        message = Message(conversation=self.conversation, **data)
+        message.created_at = message.created_at or self.conversation.created_at
+        message.updated_at = message.updated_at or message.created_at
+        self.pending.append((old_id, old_parent_id, message))
+        if len(self.pending) >= self.batch_size:
+            self._flush_messages()
+
+    def _flush_messages(self) -> None:
+        if not self.pending:
+            return
+        messages = [message for _, _, message in self.pending]
+        _bulk_insert_raw(Message, messages)
+
+        for old_id, _, message in self.pending:
+            self.message_ids[old_id] = message.pk
+        with_parent = []
+        for _, old_parent_id, message in self.pending:
+            if old_parent_id is not None:
+                message.parent_id = self.message_ids.get(old_parent_id)
+                with_parent.append(message)
+
+        if with_parent:
+            Message.objects.bulk_update(with_parent, ['parent'])
+        self.message_count += len(messages)
+        self.pending = []
+
+
+def _bulk_insert_raw(model, objs) -> None:
+    """
+    ``bulk_create`` that keeps the imported ``auto_now``/``auto_now_add``
+    values instead of stamping the current time. This is the raw insert
+    path ``loaddata`` relies on, batched. Skips ``save()`` and signals.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    if not connection.features.can_return_rows_from_bulk_insert:
+        raise InvalidExportError('Import needs a database that returns ids from bulk inserts')
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    batch_size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+
+    for start in range(0, len(objs), batch_size):
+        batch = objs[start:start + batch_size]
+        rows = model._base_manager._insert(
+            batch,
+            fields=fields,
+            raw=True,
+            using=using,
+            returning_fields=model._meta.db_returning_fields,
+        )
+        for obj, row in zip(batch, rows):
+            obj.pk = row[0]
+            obj._state.adding = False
+            obj._state.db = using
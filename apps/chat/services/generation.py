@@ -0,0 +1,169 @@
+"""Service pour générer les réponses du modèle, avec diffusion des tokens"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from apps.core.background import BatchWorker
+
+from .. import realtime
+from ..models import Message
+from .conversation import ConversationService
+from .prompts import Prompt, PromptService
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, 'CHAT_REPLIES', {}).get(name, default)
+
+
+_executor = ThreadPoolExecutor(max_workers=_setting('CONCURRENCY', 8), thread_name_prefix='chat-reply')
+# One slot per running model call; the queue waits for a free one
+_slots = threading.BoundedSemaphore(_setting('CONCURRENCY', 8))
+
+
+def _reply(item):
+    try:
+        GenerationService.reply_in_background(*item)
+    finally:
+        _slots.release()
+
+
+def _reply_batch(items):
+    if reply_queue.eager:
+        for item in items:
+            GenerationService.reply_in_background(*item)
+        return
+    # Each reply starts as soon as a slot frees up: a slow model call
+    # doesn't hold back the rest of its batch, or the next one
+    for item in items:
+        _slots.acquire()
+        _executor.submit(_reply, item)
+
+
+def flush_replies(timeout: float = None) -> bool:
+    """Wait until queued and running background replies are done"""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    if not reply_queue.flush(timeout):
+        return False
+    concurrency = _setting('CONCURRENCY', 8)
+    acquired = 0
+    try:
+        while acquired < concurrency:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            if not _slots.acquire(timeout=remaining):
+                return False
+            acquired += 1
+        return True
+    finally:
+        for _ in range(acquired):
+            _slots.release()
+
+
+reply_queue = BatchWorker(
+    'chat-replies', _reply_batch,
+    batch_size=_setting('CONCURRENCY', 8), flush_interval=_setting('FLUSH_INTERVAL', 0.05),
+)
+
+
+class GenerationService:
+    """
+    Runs the model for a user message. When the client can stream
+    (``stream_response``), tokens are pushed to the user's WebSocket as
+    they arrive; ``generation.completed`` follows once the answer is saved.
+    """
+
+    @staticmethod
+    def prepare(user_message: Message) -> Prompt:
+        """Prompt for ``user_message`` (see ``PromptService``), with its prefix reuse in ``usage``"""
+        prompt = PromptService.build(user_message)
+        PromptService.track(prompt)
+        return prompt
+
+    @staticmethod
+    def generate_text(user_message: Message, client, prompt: str = None) -> str:
+        """
+        Model output for ``user_message``; ``generation.failed`` is pushed on error.
+        The default prompt is ``prepare(user_message).text``.
+        """
+        prompt = GenerationService.prepare(user_message).text if prompt is None else prompt
+        try:
+            if not hasattr(client, 'stream_response'):
+                return client.generate_response(prompt)
+            parts = []
+            with realtime.TokenPublisher(user_message) as tokens:
+                for text in client.stream_response(prompt):
+                    parts.append(text)
+                    tokens.add(text)
+            return ''.join(parts)
+        except Exception as e:
+            realtime.generation_failed(user_message, e)
+            raise
+
+    @staticmethod
+    def reply(user_message: Message, client) -> Message:
+        """Generate and save the assistant's answer to ``user_message``"""
+        prompt = GenerationService.prepare(user_message)
+        content = GenerationService.generate_text(user_message, client, prompt.text)
+        ai_message = ConversationService.add_message_to_conversation(
+            conversation=user_message.conversation,
+            content=content,
+            role='assistant',
+            parent_message=user_message,
+            content_type='text',
+            metadata={'prompt': prompt.usage}
+        )
+        realtime.generation_completed(user_message, ai_message)
+        return ai_message
+
+    @staticmethod
+    def is_pending(user_message: Message) -> bool:
+        """
+        Whether a background reply to ``user_message`` was scheduled less
+        than ``PENDING_TIMEOUT`` seconds ago (and has not failed)
+        """
+        scheduled_at = user_message.metadata.get('reply_scheduled_at')
+        if not scheduled_at:
+            return False
+        age = timezone.now() - datetime.fromisoformat(scheduled_at)
+        return age < timedelta(seconds=_setting('PENDING_TIMEOUT', 300))
+
+    @staticmethod
+    def schedule(user_message: Message, client=None) -> None:
+        """
+        Answer ``user_message`` in the background once the current
+        transaction commits; tokens and ``generation.completed`` /
+        ``generation.failed`` go to the WebSocket as usual
+        """
+        # Saved with the message, so every process sees the reply as pending
+        # from the commit on (a queryset update: not an edit, no changelog entry)
+        user_message.metadata['reply_scheduled_at'] = timezone.now().isoformat()
+        Message.objects.filter(pk=user_message.pk).update(metadata=user_message.metadata)
+        transaction.on_commit(lambda: reply_queue.submit((user_message.pk, client)))
+
+    @staticmethod
+    def reply_in_background(user_message_id, client=None) -> None:
+        user_message = None
+        try:
+            user_message = Message.objects.select_related('conversation').filter(pk=user_message_id).first()
+            if user_message is None or user_message.replies.filter(role='assistant').exists():
+                return
+            if client is None:
+                from ..mistral_client import get_client
+                client = get_client()
+            GenerationService.reply(user_message, client)
+        except Exception as e:
+            logger.exception('Background reply to message %s failed', user_message_id)
+            if user_message is not None:
+                # No longer pending: the status endpoint tries again inline
+                user_message.metadata.pop('reply_scheduled_at', None)
+                user_message.metadata['error'] = str(e)
+                user_message.save(update_fields=['metadata'])
+        finally:
+            close_old_connections()
@@ -1,32 +1,42 @@
 """Locks pour la gestion de la concurrence"""
+import uuid
 from contextlib import contextmanager
-from django.core.cache import cache
+from django.core.cache import caches
 from django.core.cache.backends.base import DEFAULT_TIMEOUT
 
+from .exceptions import LockAcquisitionError
+
 @contextmanager
-def conversation_lock(conversation_id: int, timeout: int = DEFAULT_TIMEOUT):
-    """Lock pour les opérations sur une conversation"""
-    lock_id = f'conversation_lock_{conversation_id}'
+def _cache_lock(lock_id: str, timeout, error: str):
+    """
+    Lock dans le cache partagé, identifié par un jeton unique.
+    Si le TTL expire pendant le bloc et qu'un autre détenteur prend le lock,
+    la sortie ne supprime pas le sien. Le get puis delete n'est pas atomique
+    (l'API de cache n'a pas de compare-and-delete) : il ne reste qu'une fenêtre
+    très courte, au lieu de supprimer le lock d'autrui à coup sûr.
+    """
+    cache = caches['shared']
+    token = uuid.uuid4().hex
+    # Acquérir le lock
+    if not cache.add(lock_id, token, timeout):
+        raise LockAcquisitionError(error)
     try:
-        # Acquérir le lock
-        acquired = cache.add(lock_id, 'locked', timeout)
-        if not acquired:
-            raise Exception(f'Could not acquire lock for conversation {conversation_id}')
         yield
     finally:
-        # Relâcher le lock
-        cache.delete(lock_id)
+        # Relâcher le lock (seulement le nôtre)
+        if cache.get(lock_id) == token:
+            cache.delete(lock_id)
+
+@contextmanager
+def conversation_lock(conversation_id: int, timeout: int = DEFAULT_TIMEOUT):
+    """Lock pour les opérations sur une conversation"""
+    with _cache_lock(f'conversation_lock_{conversation_id}', timeout,
+                     f'Could not acquire lock for conversation {conversation_id}'):
+        yield
 
 @contextmanager
 def message_lock(conversation_id: int, timeout: int = DEFAULT_TIMEOUT):
     """Lock pour les opérations sur les messages d'une conversation"""
-    lock_id = f'message_lock_{conversation_id}'
-    try:
-        # Acquérir le lock
-        acquired = cache.add(lock_id, 'locked', timeout)
-        if not acquired:
-            raise Exception(f'Could not acquire lock for messages in conversation {conversation_id}')
+    with _cache_lock(f'message_lock_{conversation_id}', timeout,
+                     f'Could not acquire lock for messages in conversation {conversation_id}'):
         yield
-    finally:
-        # Relâcher le lock
-        cache.delete(lock_id)
@@ -1,6 +1,5 @@
 """Service pour interagir avec Mistral AI"""
 import os
-import requests
 from django.conf import settings
 
 class MistralService:
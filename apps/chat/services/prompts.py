@@ -0,0 +1,172 @@
+"""
+Prompt layout for the model, prefix first.
+
+A prompt is a sequence of blocks serialized canonically (NFC, ``\\n`` line
+ends, one fixed block format), most stable first:
+
+1. the system prompt,
+2. the conversation summary,
+3. the branch history before the message being answered,
+4. then the parts that change every turn: retrieved context and the
+   message itself.
+
+Blocks 1-3 only grow from one turn to the next, so consecutive prompts
+share a byte-identical prefix that the provider's prompt cache can reuse.
+When the history exceeds ``PROMPT['HISTORY_TOKENS']``, its start moves by
+steps of ``WINDOW_STEP`` tokens rather than one message per turn, which
+keeps the prefix stable between two jumps.
+
+Each block gets a chained hash (hash of the previous one + block). The
+chain and per-block token counts of the last prompt of each conversation
+are cached: the next prompt counts tokens only for its new blocks and
+reports how many prompt tokens it shares with the previous one.
+"""
+import hashlib
+import unicodedata
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.core.inference import estimate_tokens
+
+from ..models import Message
+from .retrieval import RetrievalService
+
+DEFAULT_SYSTEM_PROMPT = (
+    'You are a helpful assistant. Answer in the language of the user, '
+    'concisely, and use the conversation history when it is relevant.'
+)
+
+
+def _setting(name, default):
+    return getattr(settings, 'PROMPT', {}).get(name, default)
+
+
+def canonical(text: str) -> str:
+    return unicodedata.normalize('NFC', text or '').replace('\r\n', '\n').replace('\r', '\n').strip()
+
+
+def block(role: str, text: str) -> str:
+    return f'[{role}]\n{canonical(text)}\n\n'
+
+
+class Prompt:
+    """Serialized prompt: ``blocks[:prefix_length]`` is the stable prefix"""
+
+    def __init__(self, conversation_id, blocks: List[str], prefix_length: int):
+        self.conversation_id = conversation_id
+        self.blocks = blocks
+        self.prefix_length = prefix_length
+        self.hashes = []
+        previous = b''
+        for text in blocks:
+            previous = hashlib.sha256(previous + text.encode()).digest()
+            self.hashes.append(previous.hex()[:32])
+        self.usage = {}
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.blocks).rstrip('\n')
+
+    @property
+    def prefix(self) -> str:
+        return ''.join(self.blocks[:self.prefix_length])
+
+    @property
+    def prefix_hash(self) -> Optional[str]:
+        return self.hashes[self.prefix_length - 1] if self.prefix_length else None
+
+
+class PromptService:
+    """Service class for building prompts and tracking prefix reuse"""
+
+    @staticmethod
+    def history(user_message: Message) -> List[Tuple[str, str]]:
+        """``(role, content)`` of the branch before ``user_message``, oldest first"""
+        seqs = user_message.path_seqs[:-1]
+        if not seqs:
+            return []
+        return list(
+            Message.objects.filter(conversation_id=user_message.conversation_id, seq__in=seqs)
+            .exclude(content='').order_by('depth').values_list('role', 'content')
+        )
+
+    @staticmethod
+    def window(history: List[Tuple[str, str]], budget: int, step: int) -> List[Tuple[str, str]]:
+        """
+        Most recent history within ``budget`` tokens. Over budget, the oldest
+        messages are dropped by multiples of ``step`` tokens (then up to the
+        next user message): the start only moves when the excess crosses a
+        multiple of ``step``, not on every turn
+        """
+        tokens = [estimate_tokens(content) for _, content in history]
+        excess = sum(tokens) - budget
+        if excess <= 0:
+            return history
+        cut = (excess // step + 1) * step
+        start, dropped = 0, 0
+        while start < len(history) and dropped < cut:
+            dropped += tokens[start]
+            start += 1
+        while start < len(history) and history[start][0] != 'user':
+            start += 1
+        return history[start:]
+
+    @staticmethod
+    def build(user_message: Message, context: Optional[List[dict]] = None) -> Prompt:
+        """
+        Prompt answering ``user_message``; ``context`` defaults to the
+        retrieved snippets when retrieval is enabled
+        """
+        conversation = user_message.conversation
+        blocks = [block('system', _setting('SYSTEM', None) or DEFAULT_SYSTEM_PROMPT)]
+        if conversation.summary:
+            blocks.append(block('summary', conversation.summary))
+        history = PromptService.window(
+            PromptService.history(user_message), _setting('HISTORY_TOKENS', 3000), _setting('WINDOW_STEP', 1000)
+        )
+        blocks += [block(role, content) for role, content in history]
+        prefix_length = len(blocks)
+
+        if context is None and RetrievalService.enabled():
+            result = RetrievalService.retrieve(user_message)
+            context = RetrievalService.within_budget(result.snippets, getattr(settings, 'RETRIEVAL', {}).get('TOKEN_BUDGET', 800))
+        if context:
+            blocks.append(block('context', RetrievalService.build_prompt('', context).rstrip()))
+        blocks.append(block('user', user_message.content))
+        return Prompt(conversation.pk, blocks, prefix_length)
+
+    @staticmethod
+    def state_key(conversation_id) -> str:
+        return f'chat:prompt-prefix:{conversation_id}'
+
+    @staticmethod
+    def track(prompt: Prompt) -> dict:
+        """
+        Compare with the conversation's previous prompt: tokens are counted
+        for new blocks only, and the shared prefix is reported as reused
+        """
+        key = PromptService.state_key(prompt.conversation_id)
+        previous = cache.get(key) or {'hashes': [], 'tokens': []}
+        known = dict(zip(previous['hashes'], previous['tokens']))
+
+        tokens, reused, shared = [], 0, True
+        for index, (text, digest) in enumerate(zip(prompt.blocks, prompt.hashes)):
+            count = known.get(digest)
+            if count is None:
+                count = estimate_tokens(text)
+            if shared and index < len(previous['hashes']) and previous['hashes'][index] == digest:
+                reused += count
+            else:
+                shared = False
+            tokens.append(count)
+
+        cache.set(key, {'hashes': prompt.hashes, 'tokens': tokens}, _setting('STATE_TIMEOUT', 86400))
+        prompt.usage = {
+            'prompt_tokens': sum(tokens),
+            'prefix_tokens': sum(tokens[:prompt.prefix_length]),
+            'reused_tokens': reused,
+            'prefix_hash': prompt.prefix_hash,
+        }
+        return prompt.usage
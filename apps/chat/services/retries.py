@@ -1,14 +1,19 @@
 """Fonctions de retry pour la gestion des erreurs"""
 import time
 from functools import wraps
-from typing import Optional, List
+from typing import List, Optional, Tuple, Type
 
 from django.db import transaction
 from ..models import Message, Conversation
 from .exceptions import OrphanedMessageError
 
-def retry_on_error(max_retries: int = 3, delay: float = 0.1):
-    """Décorateur pour réessayer une opération en cas d'erreur"""
+def retry_on_error(max_retries: int = 3, delay: float = 0.1,
+                   retryable_exceptions: Tuple[Type[Exception], ...] = (Exception,)):
+    """
+    Décorateur pour réessayer une opération en cas d'erreur.
+    Seules les ``retryable_exceptions`` sont réessayées, les autres
+    remontent immédiatement.
+    """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
@@ -16,7 +21,7 @@ def retry_on_error(max_retries: int = 3, delay: float = 0.1):
             for attempt in range(max_retries):
                 try:
                     return func(*args, **kwargs)
-                except Exception as e:
+                except retryable_exceptions as e:
                     last_error = e
                     if attempt < max_retries - 1:
                         time.sleep(delay * (attempt + 1))
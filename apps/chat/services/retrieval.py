@@ -0,0 +1,190 @@
+"""
+Retrieval-augmented prompts: snippets of the user's other conversations,
+found with the semantic search index, are put in front of the message.
+
+Retrieval must not delay the answer by more than
+``RETRIEVAL['TIMEOUT']`` seconds: it runs in a small thread pool and the
+prompt goes out without context when it isn't ready in time. A search
+still waiting for a thread at that point is cancelled; one already
+running finishes and caches its result. When ``MAX_PENDING`` searches
+are already queued or running, new ones are shed right away, so slow
+searches can't build a backlog that makes every later one time out.
+
+The vector search also has its own budget (``STAGE_BUDGETS['search']``).
+It can't be interrupted once started, so a search over budget is only
+logged: its results were paid for and are kept (``TIMEOUT`` is the
+deadline that bounds the wait). Results, empty ones included, are cached
+per conversation turn (the user message), so regenerating an answer
+doesn't search again.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import List
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from apps.core.inference import estimate_tokens
+
+from ..models import Message
+from .search import EmbeddingService, SearchService
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='retrieval')
+# Searches queued or running in _executor
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, 'RETRIEVAL', {}).get(name, default)
+
+
+def _search_done(future):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+class RetrievalResult:
+    """Snippets plus how they were obtained (for logs and metrics)"""
+
+    def __init__(self, snippets=None, timings=None, cached=False, timed_out=False, shed=False):
+        self.snippets = snippets or []
+        self.timings = timings or {}
+        self.cached = cached
+        self.timed_out = timed_out
+        self.shed = shed
+
+
+class RetrievalService:
+    """Service class for retrieval-augmented generation context"""
+
+    @staticmethod
+    def enabled() -> bool:
+        return _setting('ENABLED', False) and EmbeddingService.enabled()
+
+    @staticmethod
+    def cache_key(user_message: Message) -> str:
+        return f'chat:retrieval:{user_message.conversation_id}:{user_message.pk}:{EmbeddingService.model_name()}'
+
+    @staticmethod
+    def search(user_message: Message) -> RetrievalResult:
+        """Top-k snippets of the user's other conversations, within the stage budgets"""
+        budgets = _setting('STAGE_BUDGETS', {})
+        timings = {}
+        top_k = _setting('TOP_K', 4)
+
+        start = time.perf_counter()
+        user = get_user_model()(pk=user_message.conversation.user_id)
+        scores = SearchService.vector_candidates(user, user_message.content, top_k * 5)
+        timings['search'] = time.perf_counter() - start
+        min_score = _setting('MIN_SCORE', 0.3)
+        scores = {message_id: score for message_id, score in scores.items() if score >= min_score}
+        if timings['search'] > budgets.get('search', 0.1):
+            logger.warning(
+                'Retrieval search for message %s took %.3fs, over its %.3fs budget',
+                user_message.pk, timings['search'], budgets.get('search', 0.1),
+            )
+        if not scores:
+            return RetrievalResult(timings=timings)
+
+        start = time.perf_counter()
+        rows = (
+            Message.objects.filter(pk__in=scores, conversation__user_id=user.pk)
+            .exclude(conversation_id=user_message.conversation_id)
+            .exclude(conversation__status='deleted')
+            .values('id', 'conversation_id', 'conversation__title', 'role', 'content', 'created_at')
+        )
+        max_chars = _setting('SNIPPET_TOKENS', 150) * 4
+        snippets = [
+            {
+                'message_id': row['id'],
+                'conversation_id': row['conversation_id'],
+                'title': row['conversation__title'],
+                'role': row['role'],
+                'text': ' '.join(row['content'].split())[:max_chars],
+                'date': row['created_at'].date().isoformat(),
+                'score': scores[row['id']],
+            }
+            for row in rows
+        ]
+        snippets.sort(key=lambda snippet: -snippet['score'])
+        timings['fetch'] = time.perf_counter() - start
+        return RetrievalResult(snippets[:top_k], timings)
+
+    @staticmethod
+    def _search_and_cache(user_message: Message, key: str) -> RetrievalResult:
+        try:
+            result = RetrievalService.search(user_message)
+            cache.set(key, result.snippets, _setting('CACHE_TIMEOUT', 3600))
+            return result
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def retrieve(user_message: Message) -> RetrievalResult:
+        """Cached snippets, or a search bounded by ``TIMEOUT`` seconds"""
+        key = RetrievalService.cache_key(user_message)
+        snippets = cache.get(key)
+        if snippets is not None:
+            return RetrievalResult(snippets, cached=True)
+        global _pending
+        with _pending_lock:
+            if _pending >= _setting('MAX_PENDING', 8):
+                logger.warning('Retrieval for message %s shed (%d searches pending)', user_message.pk, _pending)
+                return RetrievalResult(shed=True)
+            _pending += 1
+        start = time.perf_counter()
+        future = _executor.submit(RetrievalService._search_and_cache, user_message, key)
+        future.add_done_callback(_search_done)
+        try:
+            return future.result(timeout=_setting('TIMEOUT', 0.25))
+        except TimeoutError:
+            # Still queued: drop it; already running: let it fill the cache
+            future.cancel()
+            logger.warning('Retrieval for message %s timed out, answering without context', user_message.pk)
+            return RetrievalResult(timings={'total': time.perf_counter() - start}, timed_out=True)
+        except Exception:
+            logger.exception('Retrieval for message %s failed', user_message.pk)
+            return RetrievalResult()
+
+    @staticmethod
+    def within_budget(snippets: List[dict], budget: int) -> List[dict]:
+        """Best snippets first, as long as they fit in ``budget`` tokens"""
+        kept, used = [], 0
+        for snippet in snippets:
+            tokens = estimate_tokens(snippet['text']) + estimate_tokens(snippet['title'] or '') + 8
+            if used + tokens > budget:
+                continue
+            kept.append(snippet)
+            used += tokens
+        return kept
+
+    @staticmethod
+    def build_prompt(content: str, snippets: List[dict]) -> str:
+        if not snippets:
+            return content
+        lines = ["Context from the user's earlier conversations (use it only if it is relevant):"]
+        for snippet in snippets:
+            lines.append(f"- [{snippet['date']}, \"{snippet['title']}\"] {snippet['role']}: {snippet['text']}")
+        lines += ['', 'Message:', content]
+        return '\n'.join(lines)
+
+    @staticmethod
+    def augment(user_message: Message) -> str:
+        """The prompt for ``user_message``: the message itself, with context when enabled and found"""
+        if not RetrievalService.enabled():
+            return user_message.content
+        result = RetrievalService.retrieve(user_message)
+        snippets = RetrievalService.within_budget(result.snippets, _setting('TOKEN_BUDGET', 800))
+        logger.debug(
+            'Retrieval for message %s: %d snippet(s), cached=%s, timed_out=%s, shed=%s, timings=%s',
+            user_message.pk, len(snippets), result.cached, result.timed_out, result.shed, result.timings,
+        )
+        return RetrievalService.build_prompt(user_message.content, snippets)
@@ -0,0 +1,149 @@
+"""
+Edit history of messages, stored as diffs.
+
+A diff is a list of operations on the previous revision, serialized as
+JSON: a positive integer copies that many characters, a negative one
+skips them, a string is inserted. It is computed on words and
+punctuation, so fixing a typo in a long message stores a few bytes. A
+revision whose diff would not be smaller than its content, and every
+``SNAPSHOT_EVERY``-th revision, is stored in full instead: rebuilding a
+revision reads the closest snapshot before it and applies at most
+``SNAPSHOT_EVERY - 1`` diffs.
+"""
+import difflib
+import json
+import re
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from apps.core import compression
+
+from ..models import Message, MessageRevision
+
+_TOKEN_RE = re.compile(r'\s+|\w+|[^\w\s]', re.U)
+
+
+def _setting(name, default):
+    return getattr(settings, 'CHAT_REVISIONS', {}).get(name, default)
+
+
+def diff(old: str, new: str) -> list:
+    """Operations turning ``old`` into ``new``"""
+    a, b = _TOKEN_RE.findall(old), _TOKEN_RE.findall(new)
+    ops = []
+
+    def add(op):
+        # Merge with the previous operation of the same kind
+        if ops and type(ops[-1]) is type(op) and (isinstance(op, str) or (ops[-1] > 0) == (op > 0)):
+            ops[-1] += op
+        else:
+            ops.append(op)
+
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            add(sum(len(token) for token in a[i1:i2]))
+            continue
+        if i2 > i1:
+            add(-sum(len(token) for token in a[i1:i2]))
+        if j2 > j1:
+            add(''.join(b[j1:j2]))
+    # Trailing copy is implied
+    if ops and isinstance(ops[-1], int) and ops[-1] > 0:
+        ops.pop()
+    return ops
+
+
+def patch(old: str, ops: list) -> str:
+    parts, position = [], 0
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            parts.append(old[position:position + op])
+            position += op
+        else:
+            position -= op
+    parts.append(old[position:])
+    return ''.join(parts)
+
+
+def _encode(text: str):
+    data = text.encode()
+    if len(data) > _setting('COMPRESS_ABOVE', 512):
+        encoding = compression.available_encodings()[0]
+        return compression.compress(data, encoding), encoding
+    return data, ''
+
+
+def _decode(row: MessageRevision) -> str:
+    data = bytes(row.data)
+    if row.encoding:
+        data = compression.decompress(data, row.encoding)
+    return data.decode()
+
+
+class RevisionService:
+    """Service class for the edit history of messages"""
+
+    @staticmethod
+    def _row(message: Message, revision: int, content: str, previous: Optional[str]) -> MessageRevision:
+        kind, payload = MessageRevision.SNAPSHOT, content
+        if previous is not None and revision % _setting('SNAPSHOT_EVERY', 10):
+            ops = json.dumps(diff(previous, content), ensure_ascii=False, separators=(',', ':'))
+            if len(ops) < len(content):
+                kind, payload = MessageRevision.DIFF, ops
+        data, encoding = _encode(payload)
+        return MessageRevision(
+            message_id=message.pk, conversation_id=message.conversation_id, revision=revision,
+            kind=kind, data=data, encoding=encoding, size=len(content),
+        )
+
+    @staticmethod
+    def record(message: Message, previous: str) -> None:
+        """Store the edit of ``message`` from ``previous`` to its current content"""
+        with transaction.atomic():
+            # Concurrent edits of the message are recorded one after the other
+            list(Message.objects.select_for_update().filter(pk=message.pk).values_list('pk'))
+            last = MessageRevision.objects.filter(message_id=message.pk).aggregate(last=Max('revision'))['last']
+            rows = []
+            if last is None:
+                # First edit: keep the original content as revision 0
+                rows.append(RevisionService._row(message, 0, previous, None))
+                last = 0
+            else:
+                # The diff applies to the latest stored revision, which a
+                # concurrent edit may have written after ``previous`` was loaded
+                latest = RevisionService.get(message, last)
+                previous = latest['content'] if latest is not None else None
+            rows.append(RevisionService._row(message, last + 1, message.content, previous))
+            MessageRevision.objects.bulk_create(rows)
+
+    @staticmethod
+    def history(message: Message) -> List[dict]:
+        return [
+            {'revision': revision, 'kind': kind, 'size': size, 'created_at': created_at}
+            for revision, kind, size, created_at in MessageRevision.objects.filter(message_id=message.pk)
+            .order_by('revision').values_list('revision', 'kind', 'size', 'created_at')
+        ]
+
+    @staticmethod
+    def get(message: Message, revision: int) -> Optional[dict]:
+        """Content of ``revision``, rebuilt from the closest snapshot; None if unknown"""
+        revisions = MessageRevision.objects.filter(message_id=message.pk)
+        base = (
+            revisions.filter(revision__lte=revision, kind=MessageRevision.SNAPSHOT)
+            .aggregate(base=Max('revision'))['base']
+        )
+        if base is None:
+            return None
+        rows = list(revisions.filter(revision__gte=base, revision__lte=revision).order_by('revision'))
+        if len(rows) != revision - base + 1:
+            return None
+        content = ''
+        for row in rows:
+            payload = _decode(row)
+            content = payload if row.kind == MessageRevision.SNAPSHOT else patch(content, json.loads(payload))
+        return {'revision': revision, 'content': content, 'created_at': rows[-1].created_at}
@@ -0,0 +1,388 @@
+"""
+Semantic search over a user's conversations.
+
+New messages are embedded in the background, in batches, once their
+transaction commits (``MessageEmbedding`` rows). Each user has a local
+vector index built from those rows under ``SEMANTIC_SEARCH['PATH']``: an
+exact ``FlatIndex`` for small histories, an ``IVFIndex`` past
+``IVF_THRESHOLD`` vectors, memory-mapped when loaded. Embeddings added
+after the last build are scored straight from the database, and the index
+is rebuilt in the background once there are ``REBUILD_AFTER`` of them.
+
+A search blends the vector similarity with a keyword score (share of the
+query's words found in the message, title or summary) and returns the
+best message of each matching conversation. Conversations in cold storage
+match at the conversation level (no message snippet).
+"""
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.core.background import BatchWorker
+
+from ..models import Conversation, Message, MessageEmbedding
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: builds of one user aren't serialized across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_TERM_RE = re.compile(r'\w{3,}', re.U)
+
+
+def _setting(name, default):
+    return getattr(settings, 'SEMANTIC_SEARCH', {}).get(name, default)
+
+
+def _embed_batch(message_ids):
+    EmbeddingService.embed_messages(list(dict.fromkeys(message_ids)))
+
+
+def _build_batch(user_ids):
+    for user_id in dict.fromkeys(user_ids):
+        VectorIndexService.build(user_id)
+
+
+embedding_queue = BatchWorker('message-embeddings', _embed_batch, batch_size=64, flush_interval=1.0)
+index_queue = BatchWorker('vector-index', _build_batch, batch_size=10, flush_interval=5.0)
+
+_embedders = {}
+# Loaded (memory-mapped) indexes, least recently used first
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+@contextmanager
+def _build_lock(user_path: Path):
+    """Exclusive per-user lock across processes, held while a build writes and switches"""
+    user_path.mkdir(parents=True, exist_ok=True)
+    with open(user_path / '.lock', 'w') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+class EmbeddingService:
+    """Service class for message embeddings"""
+
+    @staticmethod
+    def enabled() -> bool:
+        from apps.core import vectors  # numpy: imported on first use, not at startup
+
+        return _setting('ENABLED', True) and vectors.numpy_available()
+
+    @staticmethod
+    def model_name() -> str:
+        return f"{_setting('EMBEDDER', 'hashing')}-{_setting('DIMENSIONS', 256)}"
+
+    @staticmethod
+    def embedder():
+        from apps.core import vectors
+
+        key = EmbeddingService.model_name()
+        if key not in _embedders:
+            _embedders[key] = vectors.get_embedder(_setting('EMBEDDER', 'hashing'), _setting('DIMENSIONS', 256))
+        return _embedders[key]
+
+    @staticmethod
+    def embed(texts: List[str]):
+        max_chars = _setting('MAX_CHARS', 2000)
+        return EmbeddingService.embedder().embed([text[:max_chars] for text in texts])
+
+    @staticmethod
+    def schedule(message: Message) -> None:
+        """Embed the message in the background once the current transaction commits"""
+        if EmbeddingService.enabled() and message.role in ('user', 'assistant') and message.content:
+            transaction.on_commit(lambda: embedding_queue.submit(message.pk))
+
+    @staticmethod
+    def embed_messages(message_ids: List[int]) -> int:
+        """Embed the given messages (the ones not embedded yet); returns how many"""
+        model = EmbeddingService.model_name()
+        done = set(
+            MessageEmbedding.objects.filter(message_id__in=message_ids, model=model).values_list('message_id', flat=True)
+        )
+        rows = [
+            row for row in Message.objects.filter(pk__in=message_ids).exclude(content='').values_list(
+                'id', 'conversation_id', 'conversation__user_id', 'content'
+            )
+            if row[0] not in done
+        ]
+        if not rows:
+            return 0
+        embedded = EmbeddingService.embed([content for _, _, _, content in rows])
+        MessageEmbedding.objects.bulk_create([
+            MessageEmbedding(
+                user_id=user_id, message_id=message_id, conversation_id=conversation_id,
+                model=model, vector=vector.tobytes(),
+            )
+            for (message_id, conversation_id, user_id, _), vector in zip(rows, embedded)
+        ], ignore_conflicts=True)
+        for user_id in {user_id for _, _, user_id, _ in rows}:
+            VectorIndexService.maybe_rebuild(user_id)
+        return len(rows)
+
+    @staticmethod
+    def backfill(user=None, chunk: int = 500) -> int:
+        """Embed every message without an embedding (``manage.py embed_messages``)"""
+        model = EmbeddingService.model_name()
+        messages = Message.objects.filter(role__in=('user', 'assistant')).exclude(content='').exclude(
+            pk__in=MessageEmbedding.objects.filter(model=model).values('message_id')
+        )
+        if user is not None:
+            messages = messages.filter(conversation__user=user)
+        ids = list(messages.order_by('id').values_list('id', flat=True))
+        return sum(EmbeddingService.embed_messages(ids[start:start + chunk]) for start in range(0, len(ids), chunk))
+
+
+class VectorIndexService:
+    """Service class for the per-user vector index files"""
+
+    @staticmethod
+    def user_path(user_id) -> Path:
+        return Path(_setting('PATH', Path(settings.BASE_DIR) / 'vector_index')) / str(user_id)
+
+    @staticmethod
+    def build(user_id) -> dict:
+        """
+        Rebuild the user's index from the embedding rows, then switch to it.
+        Builds of one user are serialized (file lock), so the last one to
+        switch has read the most rows and no build is deleted while written.
+        """
+        from apps.core import vectors
+
+        user_path = VectorIndexService.user_path(user_id)
+        with _build_lock(user_path):
+            model = EmbeddingService.model_name()
+            rows = list(
+                MessageEmbedding.objects.filter(user_id=user_id, model=model).order_by('id')
+                .values_list('id', 'message_id', 'vector')
+            )
+            dimensions = EmbeddingService.embedder().dimensions
+            np = vectors.np
+            ids = np.fromiter((message_id for _, message_id, _ in rows), dtype=np.int64, count=len(rows))
+            matrix = np.frombuffer(b''.join(bytes(vector) for _, _, vector in rows), dtype=np.float32)
+            matrix = matrix.reshape(len(rows), dimensions)
+            if len(rows) >= _setting('IVF_THRESHOLD', 20000):
+                index = vectors.IVFIndex.build(
+                    ids, matrix, nlist=_setting('NLIST', None), nprobe=_setting('NPROBE', 8)
+                )
+            else:
+                index = vectors.FlatIndex.build(ids, matrix)
+
+            name = f'build-{uuid.uuid4().hex[:12]}'
+            meta = {
+                'model': model,
+                'max_embedding_id': rows[-1][0] if rows else 0,
+                'built_at': timezone.now().isoformat(),
+            }
+            vectors.save_index(index, user_path / name, meta)
+            # Readers follow the pointer: switching is one atomic rename
+            pointer = user_path / 'current'
+            try:
+                previous = pointer.read_text().strip()
+            except FileNotFoundError:
+                previous = None
+            tmp = user_path / f'current.{name}.tmp'
+            tmp.write_text(name)
+            os.replace(tmp, pointer)
+            # The previous build stays for readers that just read the pointer
+            for old in user_path.iterdir():
+                if old.is_dir() and old.name not in (name, previous):
+                    shutil.rmtree(old, ignore_errors=True)
+        return {**meta, 'kind': index.kind, 'count': len(index)}
+
+    @staticmethod
+    def load(user_id):
+        """``(index, meta)`` of the user's current build, or ``(None, None)``"""
+        from apps.core import vectors
+
+        pointer = VectorIndexService.user_path(user_id) / 'current'
+        try:
+            name = pointer.read_text().strip()
+        except FileNotFoundError:
+            return None, None
+        with _indexes_lock:
+            cached = _indexes.get(user_id)
+            if cached is None or cached[0] != name:
+                try:
+                    index, meta = vectors.load_index(pointer.parent / name)
+                except (FileNotFoundError, ValueError):
+                    return None, None
+                cached = _indexes[user_id] = (name, index, meta)
+                while len(_indexes) > _setting('MAX_LOADED_INDEXES', 100):
+                    _indexes.popitem(last=False)
+            _indexes.move_to_end(user_id)
+        _, index, meta = cached
+        if meta.get('model') != EmbeddingService.model_name():
+            return None, None
+        return index, meta
+
+    @staticmethod
+    def pending(user_id, after_id: int):
+        """Embedding rows added since the build: ``(message ids, vectors)``"""
+        from apps.core.vectors import np
+
+        rows = list(
+            MessageEmbedding.objects.filter(
+                user_id=user_id, model=EmbeddingService.model_name(), id__gt=after_id
+            ).values_list('message_id', 'vector')
+        )
+        ids = np.fromiter((message_id for message_id, _ in rows), dtype=np.int64, count=len(rows))
+        matrix = np.frombuffer(b''.join(bytes(vector) for _, vector in rows), dtype=np.float32)
+        return ids, matrix.reshape(len(rows), EmbeddingService.embedder().dimensions)
+
+    @staticmethod
+    def maybe_rebuild(user_id) -> None:
+        """Queue a rebuild once ``REBUILD_AFTER`` embeddings are not in the index"""
+        _, meta = VectorIndexService.load(user_id)
+        after_id = meta['max_embedding_id'] if meta else 0
+        pending = MessageEmbedding.objects.filter(
+            user_id=user_id, model=EmbeddingService.model_name(), id__gt=after_id
+        ).count()
+        if pending >= _setting('REBUILD_AFTER', 500):
+            index_queue.submit(user_id)
+
+
+class SearchService:
+    """Service class for hybrid (vector + keyword) conversation search"""
+
+    @staticmethod
+    def terms(query: str) -> List[str]:
+        """Query words, suffix trimmed (``migrations`` matches ``migration``)"""
+        words = (word.lower() for word in _TERM_RE.findall(query))
+        return list(dict.fromkeys(word[:max(4, len(word) - 2)] for word in words))[:8]
+
+    @staticmethod
+    def vector_candidates(user, query: str, k: int) -> dict:
+        """``{message_id: similarity}`` from the index and the rows added since"""
+        if not EmbeddingService.enabled():
+            return {}
+        from apps.core.vectors import np
+
+        query_vector = EmbeddingService.embed([query])[0]
+        index, meta = VectorIndexService.load(user.pk)
+        ids, matrix = VectorIndexService.pending(user.pk, meta['max_embedding_id'] if meta else 0)
+        scores = {}
+        if index is not None:
+            # An edited message is re-embedded after the build: its pending row replaces the indexed one
+            replaced = set(ids.tolist())
+            scores.update(
+                (message_id, similarity) for message_id, similarity in zip(*index.search(query_vector, k))
+                if message_id not in replaced
+            )
+        if len(ids):
+            similarities = matrix @ query_vector
+            top = np.argsort(-similarities)[:k]
+            scores.update(zip(ids[top].tolist(), similarities[top].tolist()))
+        if len(ids) >= _setting('REBUILD_AFTER', 500):
+            index_queue.submit(user.pk)
+        return scores
+
+    @staticmethod
+    def keyword_score(terms: List[str], *texts: str) -> float:
+        if not terms:
+            return 0.0
+        text = ' '.join(texts).lower()
+        return sum(term in text for term in terms) / len(terms)
+
+    @staticmethod
+    def snippet(content: str, terms: List[str], size: int = 160) -> str:
+        lowered = content.lower()
+        positions = [lowered.find(term) for term in terms if term in lowered]
+        start = max(min(positions) - size // 4, 0) if positions else 0
+        text = ' '.join(content[start:start + size].split())
+        return ('...' if start else '') + text + ('...' if start + size < len(content) else '')
+
+    @staticmethod
+    def search(user, query: str, limit: int = 10, status: Optional[str] = None) -> List[dict]:
+        """Best matching conversations, each with its best message"""
+        terms = SearchService.terms(query)
+        candidates = _setting('CANDIDATES', 200)
+        keyword_weight = _setting('KEYWORD_WEIGHT', 0.3)
+
+        conversations = Conversation.objects.filter(user=user).exclude(status='deleted')
+        if status:
+            conversations = conversations.filter(status=status)
+
+        vector_scores = SearchService.vector_candidates(user, query, candidates)
+        message_ids = set(vector_scores)
+        if terms:
+            matches = Q()
+            for term in terms:
+                matches |= Q(content__icontains=term)
+            message_ids.update(
+                Message.objects.filter(matches, conversation__in=conversations)
+                .order_by('-id').values_list('id', flat=True)[:candidates]
+            )
+        messages = {
+            row['id']: row for row in Message.objects.filter(pk__in=message_ids, conversation__in=conversations)
+            .values('id', 'conversation_id', 'role', 'content', 'created_at')
+        }
+        # Hits on packed messages count for their (cold) conversation
+        cold_hits = dict(
+            MessageEmbedding.objects.filter(message_id__in=set(vector_scores) - set(messages), user=user)
+            .values_list('message_id', 'conversation_id')
+        )
+
+        conversation_matches = Q(pk__in={row['conversation_id'] for row in messages.values()})
+        conversation_matches |= Q(pk__in=set(cold_hits.values()), storage_tier=Conversation.COLD)
+        if terms:
+            for term in terms:
+                conversation_matches |= Q(title__icontains=term) | Q(summary__icontains=term)
+        found = {
+            row['id']: row for row in conversations.filter(conversation_matches)
+            .values('id', 'title', 'summary', 'status', 'storage_tier', 'updated_at')[:candidates]
+        }
+
+        best = {}
+
+        def consider(conversation_id, message, vector_score, text):
+            conversation = found.get(conversation_id)
+            if conversation is None:
+                return
+            keyword = SearchService.keyword_score(terms, text, conversation['title'], conversation['summary'])
+            score = (1 - keyword_weight) * max(vector_score, 0.0) + keyword_weight * keyword
+            if conversation_id not in best or score > best[conversation_id]['score']:
+                best[conversation_id] = {
+                    'conversation': {key: conversation[key] for key in ('id', 'title', 'status', 'updated_at')},
+                    'message': message,
+                    'score': score,
+                    'vector_score': vector_score,
+                    'keyword_score': keyword,
+                }
+
+        for message_id, row in messages.items():
+            consider(row['conversation_id'], {
+                'id': message_id,
+                'role': row['role'],
+                'snippet': SearchService.snippet(row['content'], terms),
+                'created_at': row['created_at'],
+            }, vector_scores.get(message_id, 0.0), row['content'])
+        for message_id, conversation_id in cold_hits.items():
+            if found.get(conversation_id, {}).get('storage_tier') == Conversation.COLD:
+                consider(conversation_id, None, vector_scores[message_id], '')
+        for conversation_id in found:
+            # Title or summary matches without a matching message
+            consider(conversation_id, None, 0.0, '')
+
+        min_score = _setting('MIN_SCORE', 0.15)
+        results = sorted(
+            (result for result in best.values() if result['score'] >= min_score),
+            key=lambda result: (-result['score'], -result['conversation']['id']),
+        )
+        return results[:limit]
@@ -0,0 +1,128 @@
+"""
+Precomputed responses for archived conversations.
+
+An archived conversation no longer changes, so its detail and message
+list responses are serialized and compressed once (in the background,
+after the archive commits) and stored in ``ConversationSnapshot``. A read
+is then a single blob fetch, sent as is to clients accepting the stored
+coding. A snapshot is keyed by the conversation's ``updated_at``: any
+later save makes it stale, and it is rebuilt on the next read.
+"""
+import logging
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from apps.core.background import BatchWorker
+from apps.core.compression import available_encodings, compress, decompress, negotiate
+
+from ..models import Conversation, ConversationSnapshot
+from ..serializers import FastConversationSerializer, FastMessageSerializer
+from .cold_storage import ColdStorageService
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, 'CHAT_SNAPSHOTS', {}).get(name, default)
+
+
+def _build_batch(conversation_ids):
+    for conversation_id in dict.fromkeys(conversation_ids):
+        conversation = Conversation.objects.filter(pk=conversation_id).first()
+        if conversation is not None:
+            SnapshotService.build(conversation)
+
+
+snapshot_queue = BatchWorker('conversation-snapshots', _build_batch, batch_size=10, flush_interval=0.5)
+
+
+class SnapshotService:
+    """Service class for archived conversation snapshots"""
+
+    @staticmethod
+    def payload(conversation: Conversation, kind: str) -> bytes:
+        """The response body the API would send, as bytes"""
+        if conversation.storage_tier == Conversation.COLD:
+            messages = sorted(
+                ColdStorageService.messages(conversation.cold_storage), key=lambda m: (m.created_at, m.id)
+            )
+            message_data = FastMessageSerializer(messages, many=True).data
+            if kind == ConversationSnapshot.MESSAGES:
+                return JSONRenderer().render(message_data)
+            data = FastConversationSerializer(conversation).data
+            data['messages'] = message_data
+            return JSONRenderer().render(data)
+
+        if kind == ConversationSnapshot.DETAIL:
+            data = FastConversationSerializer(conversation).data
+        else:
+            data = FastMessageSerializer(conversation.bounded_messages().order_by('created_at'), many=True).data
+        return JSONRenderer().render(data)
+
+    @staticmethod
+    def build(conversation: Conversation) -> int:
+        """(Re)build the snapshots of an archived conversation, return how many"""
+        encoding = _setting('ENCODING', 'gzip')
+        if encoding not in available_encodings():
+            encoding = 'gzip'
+        with transaction.atomic():
+            # Lock the row: version and content must match
+            conversation = Conversation.objects.select_for_update().get(pk=conversation.pk)
+            if conversation.status != 'archived':
+                ConversationSnapshot.objects.filter(conversation=conversation).delete()
+                return 0
+            for kind, _ in ConversationSnapshot.KIND_CHOICES:
+                payload = SnapshotService.payload(conversation, kind)
+                ConversationSnapshot.objects.update_or_create(
+                    conversation=conversation, kind=kind,
+                    defaults={
+                        'version': conversation.updated_at,
+                        'encoding': encoding,
+                        'body': compress(payload, encoding, _setting('LEVEL', None)),
+                        'size': len(payload),
+                    },
+                )
+        return len(ConversationSnapshot.KIND_CHOICES)
+
+    @staticmethod
+    def schedule(conversation: Conversation) -> None:
+        """Build the snapshots in the background once the current transaction commits"""
+        if _setting('ENABLED', True):
+            transaction.on_commit(lambda: snapshot_queue.submit(conversation.pk))
+
+    @staticmethod
+    def get(conversation: Conversation, kind: str) -> Optional[ConversationSnapshot]:
+        """The snapshot if it is up to date; schedules a rebuild otherwise"""
+        if conversation.status != 'archived':
+            return None
+        if not _setting('ENABLED', True) and conversation.storage_tier != Conversation.COLD:
+            return None
+        snapshot = ConversationSnapshot.objects.filter(conversation=conversation, kind=kind).first()
+        if snapshot is None or snapshot.version != conversation.updated_at:
+            if conversation.storage_tier == Conversation.COLD:
+                # No rows to fall back on: build it now
+                SnapshotService.build(conversation)
+                return ConversationSnapshot.objects.filter(conversation=conversation, kind=kind).first()
+            SnapshotService.schedule(conversation)
+            return None
+        return snapshot
+
+    @staticmethod
+    def response(request, conversation: Conversation, kind: str) -> Optional[HttpResponse]:
+        """Response served from the snapshot, or None if there is no valid snapshot"""
+        snapshot = SnapshotService.get(conversation, kind)
+        if snapshot is None:
+            return None
+        body = bytes(snapshot.body)
+        if negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), [snapshot.encoding]):
+            response = HttpResponse(body, content_type='application/json')
+            response['Content-Encoding'] = snapshot.encoding
+        else:
+            response = HttpResponse(decompress(body, snapshot.encoding), content_type='application/json')
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
@@ -0,0 +1,158 @@
+"""
+Delta sync: what changed in a user's conversations since a cursor.
+
+Every create/update/delete of a conversation or message appends a
+``ChangeLogEntry``. Its auto-increment id is the cursor: a client stores
+the last cursor it received and asks for the entries after it, which is
+a range scan on the (user, id) index.
+
+Entries are written once the change is committed (``on_commit``), so a
+cursor never points past a change that is still invisible. Entries
+younger than ``SETTLE_SECONDS`` are held back for the next call: on
+Postgres, ids can be allocated out of commit order between concurrent
+transactions.
+"""
+import math
+from datetime import timedelta
+from functools import partial
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from ..models import ChangeLogEntry, Conversation, Message
+
+
+def _setting(name, default):
+    return getattr(settings, 'CHAT_SYNC', {}).get(name, default)
+
+
+def _insert(entries) -> None:
+    ChangeLogEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class SyncService:
+    """Service class for the sync changelog"""
+
+    @staticmethod
+    def record(user_id: int, object_type: str, object_id: int, conversation_id: int,
+               action: str = ChangeLogEntry.UPSERT) -> None:
+        """Append a change once the current transaction commits"""
+        entry = ChangeLogEntry(
+            user_id=user_id, object_type=object_type, object_id=object_id,
+            conversation_id=conversation_id, action=action,
+        )
+        transaction.on_commit(partial(_insert, [entry]))
+
+    @staticmethod
+    def record_conversations(user_id: int, conversation_ids: Iterable[int]) -> None:
+        """
+        Record conversations written in bulk (import) and all their
+        messages, after commit. Messages are read back in chunks, so only
+        the conversation ids are kept in memory.
+        """
+        transaction.on_commit(partial(_record_conversations, user_id, list(conversation_ids)))
+
+    @staticmethod
+    def changes_since(user, since: int = 0, limit: Optional[int] = None) -> dict:
+        """
+        Changes after cursor ``since``: the current state of every created or
+        updated object, and the ids of deleted ones. Three queries.
+        ``retry_after`` is the number of seconds before held-back entries
+        settle, or None when there are none.
+        """
+        limit = min(limit or _setting('PAGE_SIZE', 500), _setting('MAX_PAGE_SIZE', 5000))
+        settled = timezone.now() - timedelta(seconds=_setting('SETTLE_SECONDS', 1))
+        entries = list(
+            ChangeLogEntry.objects.filter(user=user, id__gt=since).order_by('id').values_list(
+                'id', 'object_type', 'object_id', 'action', 'created_at'
+            )[:limit + 1]
+        )
+
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        retry_after = None
+        for index, entry in enumerate(entries):
+            if entry[4] > settled:
+                # Hold back recent entries (and everything after them): the
+                # client asks again once they settle, not in a tight loop
+                retry_after = math.ceil((entry[4] - settled).total_seconds())
+                entries, has_more = entries[:index], False
+                break
+
+        # Only the latest entry of each object matters
+        latest = {}
+        for cursor, object_type, object_id, action, _ in entries:
+            latest[object_type, object_id] = action
+
+        def ids(object_type, action):
+            return [pk for (kind, pk), act in latest.items() if kind == object_type and act == action]
+
+        conversation_ids = ids(ChangeLogEntry.CONVERSATION, ChangeLogEntry.UPSERT)
+        message_ids = ids(ChangeLogEntry.MESSAGE, ChangeLogEntry.UPSERT)
+        # Objects deleted after their entry are missing here; their
+        # tombstone comes with a later cursor
+        conversations = list(
+            Conversation.objects.filter(user=user, id__in=conversation_ids).order_by('id')
+        ) if conversation_ids else []
+        messages = list(
+            Message.objects.filter(conversation__user=user, id__in=message_ids).order_by('id')
+        ) if message_ids else []
+
+        return {
+            'cursor': entries[-1][0] if entries else since,
+            'has_more': has_more,
+            'retry_after': retry_after,
+            'conversations': conversations,
+            'messages': messages,
+            'deleted': {
+                'conversations': ids(ChangeLogEntry.CONVERSATION, ChangeLogEntry.DELETE),
+                'messages': ids(ChangeLogEntry.MESSAGE, ChangeLogEntry.DELETE),
+            },
+        }
+
+    @staticmethod
+    def compact() -> int:
+        """
+        Delete the entries a client can never need: those superseded by a
+        later entry for the same object, and the message entries of deleted
+        conversations. Safe for any cursor.
+        """
+        latest = ChangeLogEntry.objects.values('object_type', 'object_id').annotate(
+            last=Max('id')
+        ).values('last')
+        superseded, _ = ChangeLogEntry.objects.exclude(id__in=latest).delete()
+
+        deleted_conversations = ChangeLogEntry.objects.filter(
+            object_type=ChangeLogEntry.CONVERSATION, action=ChangeLogEntry.DELETE
+        ).values('object_id')
+        orphaned, _ = ChangeLogEntry.objects.filter(
+            object_type=ChangeLogEntry.MESSAGE, conversation_id__in=deleted_conversations
+        ).delete()
+        return superseded + orphaned
+
+
+def _record_conversations(user_id, conversation_ids, chunk_size=500):
+    for start in range(0, len(conversation_ids), chunk_size):
+        chunk = conversation_ids[start:start + chunk_size]
+        batch = [
+            ChangeLogEntry(
+                user_id=user_id, object_type=ChangeLogEntry.CONVERSATION,
+                object_id=conversation_id, conversation_id=conversation_id,
+            )
+            for conversation_id in chunk
+        ]
+        messages = Message.objects.filter(conversation_id__in=chunk).order_by('id').values_list(
+            'id', 'conversation_id'
+        )
+        for message_id, conversation_id in messages.iterator(chunk_size=2000):
+            batch.append(ChangeLogEntry(
+                user_id=user_id, object_type=ChangeLogEntry.MESSAGE,
+                object_id=message_id, conversation_id=conversation_id,
+            ))
+            if len(batch) >= 2000:
+                _insert(batch)
+                batch = []
+        _insert(batch)
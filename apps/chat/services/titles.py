@@ -0,0 +1,151 @@
+"""
+Conversation titles.
+
+A conversation gets a heuristic title from its first message right away
+(no model call on the request path). Once the creation commits, the
+conversation is queued and a background worker asks the model for short
+titles for a whole batch of new conversations in a single call, then
+saves them with ``update_fields``. A title changed in the meantime (by the
+user, or given at creation) is left alone.
+"""
+import json
+import logging
+import re
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.core.background import BatchWorker
+from apps.core.inference import BatchInference, InferenceJob, parse_numbered_json
+
+from .. import realtime
+from ..models import Conversation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TITLE = 'New Conversation'
+
+_MARKUP_RE = re.compile(r'```.*?(```|$)|`|[*_#>~]+|\[([^\]]*)\]\([^)]*\)', re.S)
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s')
+_NUMBERED_LINE_RE = re.compile(r'^\s*(\d+)[.):-]\s*(.+?)\s*$')
+
+
+def _setting(name, default):
+    return getattr(settings, 'CHAT_TITLES', {}).get(name, default)
+
+
+def _title_batch(items):
+    TitleService.generate(items)
+
+
+title_queue = BatchWorker(
+    'conversation-titles', _title_batch,
+    batch_size=_setting('BATCH_SIZE', 20), flush_interval=_setting('FLUSH_INTERVAL', 2.0),
+)
+
+
+class TitleService:
+    """Service class for heuristic and model-generated conversation titles"""
+
+    @staticmethod
+    def heuristic(text: str, max_length: Optional[int] = None) -> str:
+        """First sentence of ``text`` without markup, cut on a word boundary"""
+        max_length = max_length or _setting('MAX_LENGTH', 50)
+        text = _MARKUP_RE.sub(lambda m: m.group(2) or ' ', text or '')
+        text = ' '.join(text.split())
+        if not text:
+            return DEFAULT_TITLE
+        text = _SENTENCE_END_RE.split(text, 1)[0]
+        if len(text) <= max_length:
+            return text
+        cut = text[:max_length].rsplit(' ', 1)[0] or text[:max_length]
+        return cut.rstrip(' ,;:-') + '...'
+
+    @staticmethod
+    def schedule(conversation: Conversation, first_message: str) -> None:
+        """Queue a model-generated title once the current transaction commits"""
+        if not _setting('LLM', True):
+            return
+        item = (conversation.pk, conversation.title, first_message)
+        transaction.on_commit(lambda: title_queue.submit(item))
+
+    @staticmethod
+    def build_prompt(texts: List[str]) -> str:
+        excerpt = _setting('EXCERPT_LENGTH', 500)
+        lines = [
+            'Give a short title (at most 6 words, in the language of the message, no quotes) '
+            'to each conversation below, from its first message.',
+            'Answer with a JSON object mapping each number to its title, e.g. {"1": "..."}.',
+            '',
+        ]
+        for number, text in enumerate(texts, 1):
+            lines.append(f'{number}. {" ".join(text[:excerpt].split())}')
+        return '\n'.join(lines)
+
+    @staticmethod
+    def parse(response: str, count: int) -> Dict[int, str]:
+        """Titles by position (0-based) from the model's answer; invalid entries are skipped"""
+        pairs = parse_numbered_json(response, count).items()
+        if not pairs:
+            # Numbered list fallback: "1. Title"
+            pairs = (
+                (int(m.group(1)) - 1, m.group(2))
+                for m in map(_NUMBERED_LINE_RE.match, (response or '').splitlines()) if m
+            )
+        max_length = _setting('MAX_LENGTH', 50)
+        titles = {}
+        for index, title in pairs:
+            if not isinstance(title, str) or not 0 <= index < count:
+                continue
+            title = ' '.join(title.strip().strip('"\'').split())
+            if title:
+                titles[index] = title if len(title) <= max_length else TitleService.heuristic(title, max_length)
+        return titles
+
+    @staticmethod
+    def generate(items, provider=None) -> int:
+        """
+        Title ``(conversation_id, heuristic_title, first_message)`` items with
+        one model call; returns the number of titles saved
+        """
+        if not items:
+            return 0
+        try:
+            engine = BatchInference(provider, pack_size=len(items), concurrency=1)
+        except Exception:
+            logger.exception('No inference provider for titles')
+            return 0
+        titles, stats = engine.run(TitleJob(), [text for _, _, text in items])
+        logger.info('Titles: %d/%d in %d call(s), cost %.6f', stats.completed, stats.items, stats.calls, stats.cost)
+        expected = {
+            conversation_id: (heuristic, title)
+            for (conversation_id, heuristic, _), title in zip(items, titles) if title is not None
+        }
+        saved = 0
+        with transaction.atomic():
+            for conversation in Conversation.objects.select_for_update().filter(pk__in=expected):
+                heuristic, title = expected[conversation.pk]
+                if conversation.title != heuristic:
+                    continue
+                conversation.title = title
+                # updated_at too: it versions the list ETag and the snapshots
+                conversation.save(update_fields=['title', 'updated_at'])
+                realtime.conversation_updated(conversation, ['title'])
+                saved += 1
+        return saved
+
+
+class TitleJob(InferenceJob):
+    """Titles for a pack of first messages"""
+
+    name = 'titles'
+
+    def build_prompt(self, inputs):
+        return TitleService.build_prompt(inputs)
+
+    def parse(self, response, count):
+        return TitleService.parse(response, count)
+
+    def stub_response(self, inputs):
+        return json.dumps({str(number): TitleService.heuristic(text, 30) for number, text in enumerate(inputs, 1)})
@@ -0,0 +1,102 @@
+"""Service pour naviguer dans l'arbre des messages (branches, alternatives)"""
+from typing import List, Optional
+
+from django.db import transaction
+
+from .. import realtime
+from ..models import Conversation, Message
+from .generation import GenerationService
+from .exceptions import InvalidConversationStateError, MessageOrderingError
+from .locks import message_lock
+
+
+class MessageTreeService:
+    """
+    Branch operations on the reply tree.
+    Every message stores its materialized path (``Message.path``), so a
+    branch, a subtree or a set of alternatives is a single indexed query
+    instead of one query per level.
+    """
+
+    @staticmethod
+    def get_leaf(conversation: Conversation) -> Optional[Message]:
+        """Most recent message, i.e. the tip of the branch being followed"""
+        return conversation.bounded_messages().order_by('-seq').first()
+
+    @staticmethod
+    def branch(message: Message) -> List[Message]:
+        """Messages from the root down to ``message`` (included), in one query"""
+        return list(
+            Message.objects.filter(
+                conversation_id=message.conversation_id,
+                seq__in=message.path_seqs
+            ).order_by('depth')
+        )
+
+    @staticmethod
+    def active_branch(conversation: Conversation) -> List[Message]:
+        """Branch ending at the conversation's latest message"""
+        leaf = MessageTreeService.get_leaf(conversation)
+        return MessageTreeService.branch(leaf) if leaf else []
+
+    @staticmethod
+    def descendants(message: Message):
+        """Every message below ``message`` in the tree"""
+        return Message.objects.filter(
+            conversation_id=message.conversation_id,
+            path__startswith=message.path
+        ).exclude(pk=message.pk).order_by('seq')
+
+    @staticmethod
+    def alternatives(message: Message):
+        """``message`` and its siblings of the same role (regenerations and edits)"""
+        siblings = Message.objects.filter(
+            conversation_id=message.conversation_id,
+            role=message.role,
+        )
+        if message.parent_id is None:
+            siblings = siblings.filter(depth=0)
+        else:
+            siblings = siblings.filter(parent_id=message.parent_id)
+        return siblings.order_by('seq')
+
+    @staticmethod
+    def add_sibling(message: Message, content: str, metadata: Optional[dict] = None) -> Message:
+        """Create a new branch next to ``message`` (same parent and role)"""
+        conversation = message.conversation
+        if conversation.status != 'active':
+            raise InvalidConversationStateError(
+                f'Cannot branch a {conversation.status} conversation'
+            )
+
+        with transaction.atomic():
+            with message_lock(conversation.id):
+                return Message.objects.create(
+                    conversation=conversation,
+                    parent=message.parent,
+                    role=message.role,
+                    content=content,
+                    content_type=message.content_type,
+                    metadata=metadata or {},
+                    status='sent'
+                )
+
+    @staticmethod
+    def edit_into_branch(message: Message, content: str) -> Message:
+        """Edit a user message by forking a sibling branch; the original is kept"""
+        if message.role != 'user':
+            raise MessageOrderingError('Only user messages can be edited into a new branch')
+        return MessageTreeService.add_sibling(message, content, {'edited_from': message.id})
+
+    @staticmethod
+    def regenerate(message: Message, client) -> Message:
+        """Generate a new assistant answer next to ``message``"""
+        if message.role != 'assistant' or message.parent is None:
+            raise MessageOrderingError('Only assistant replies can be regenerated')
+        prompt = GenerationService.prepare(message.parent)
+        content = GenerationService.generate_text(message.parent, client, prompt.text)
+        new_message = MessageTreeService.add_sibling(
+            message, content, {'regenerated_from': message.id, 'prompt': prompt.usage}
+        )
+        realtime.generation_completed(message.parent, new_message)
+        return new_message
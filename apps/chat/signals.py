@@ -0,0 +1,81 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import realtime
+from .models import (
+    ChangeLogEntry, Conversation, ConversationColdStorage, ConversationSnapshot, Message, MessageEmbedding,
+    MessageRevision
+)
+from .services.cold_storage import store_for
+from .services.revisions import RevisionService
+from .services.search import EmbeddingService
+from .services.sync import SyncService
+
+
+def _deleted_with(origin, model) -> bool:
+    """Was this delete cascaded from an instance or queryset of ``model``?"""
+    if isinstance(origin, QuerySet):
+        return origin.model is model
+    return isinstance(origin, model)
+
+
+@receiver(post_save, sender=Conversation)
+def record_conversation_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    SyncService.record(instance.user_id, ChangeLogEntry.CONVERSATION, instance.pk, instance.pk)
+
+
+@receiver(post_delete, sender=Conversation)
+def record_conversation_delete(sender, instance, origin=None, **kwargs):
+    # A deleted user takes its changelog with it
+    if not _deleted_with(origin, Conversation):
+        return
+    SyncService.record(
+        instance.user_id, ChangeLogEntry.CONVERSATION, instance.pk, instance.pk, ChangeLogEntry.DELETE
+    )
+    MessageEmbedding.objects.filter(conversation_id=instance.pk).delete()
+    MessageRevision.objects.filter(conversation_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=Message)
+def record_message_change(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    SyncService.record(
+        instance.conversation.user_id, ChangeLogEntry.MESSAGE, instance.pk, instance.conversation_id
+    )
+    if created:
+        realtime.message_created(instance)
+        EmbeddingService.schedule(instance)
+    elif getattr(instance, '_edited_from', None) is not None:
+        RevisionService.record(instance, instance._edited_from)
+        instance._edited_from = None
+        # The embedding of the previous content would keep matching it
+        MessageEmbedding.objects.filter(message_id=instance.pk).delete()
+        EmbeddingService.schedule(instance)
+
+
+@receiver(post_delete, sender=Message)
+def record_message_delete(sender, instance, origin=None, **kwargs):
+    # Messages deleted with their conversation are covered by its tombstone
+    if not _deleted_with(origin, Message):
+        return
+    SyncService.record(
+        instance.conversation.user_id, ChangeLogEntry.MESSAGE, instance.pk,
+        instance.conversation_id, ChangeLogEntry.DELETE
+    )
+    # Deletes don't touch the conversation's updated_at, which versions snapshots
+    ConversationSnapshot.objects.filter(conversation_id=instance.conversation_id).delete()
+    MessageEmbedding.objects.filter(message_id=instance.pk).delete()
+    MessageRevision.objects.filter(message_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=ConversationColdStorage)
+def delete_cold_storage_file(sender, instance, **kwargs):
+    if instance.location:
+        transaction.on_commit(partial(store_for(instance).delete, instance))
@@ -1,3 +1,1009 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from apps.accounts.tokens import issue_token_pair
+from apps.core.inference import BatchInference, StubProvider
+from apps.core.compression import available_encodings, decompress
+from apps.core.models import IdempotencyKey
+from apps.core.renderers import ORJSONRenderer
+
+from . import partitions, realtime
+from .models import (
+    ChangeLogEntry, Conversation, ConversationColdStorage, ConversationSnapshot, Message, MessageEmbedding, MessageRevision
+)
+from .serializers import (
+    ConversationSerializer, FastConversationSerializer, FastMessageSerializer, MessageSerializer
+)
+from .services import (
+    ColdStorageService, ConversationService, EmbeddingService, EnrichmentService, ExportService, MessageTreeService,
+    PromptService, RetrievalService, RevisionService, SearchService, SnapshotService, SyncService, TitleService,
+    VectorIndexService
+)
+from .services.exceptions import (
+    ConversationConflictError, InvalidExportError, LockAcquisitionError, MessageOrderingError, MistralAPIError
+)
+from .services.cold_storage import FileColdStore
+from .services.enrichment import EnrichmentJob
+from .services.export import available_compressions
+from .services import retrieval
+from .services.locks import message_lock
+from .services.prompts import block, canonical
+from .services.revisions import diff, patch
+from .websocket import CLOSE_UNAUTHORIZED, chat_events
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user('export', 'export@example.com', 'x')
+        self.other = User.objects.create_user('import', 'import@example.com', 'x')
+        self.conversation = ConversationService.create_conversation(self.user, title='Exported')
+        question = ConversationService.add_message_to_conversation(self.conversation, 'Question?', 'user')
+        ConversationService.add_message_to_conversation(self.conversation, 'Réponse.', 'assistant', question)
+
+    def export(self, compression='none'):
+        return b''.join(ExportService.stream(self.user, compression))
+
+    def test_round_trip(self):
+        for compression in available_compressions():
+            with self.subTest(compression=compression):
+                result = ExportService.import_stream(self.other, io.BytesIO(self.export(compression)))
+
+                self.assertEqual(result, {'conversations': 1, 'messages': 2})
+                imported = Conversation.objects.filter(user=self.other).latest('id')
+                self.assertNotEqual(imported.pk, self.conversation.pk)
+                self.assertEqual((imported.title, imported.message_count), ('Exported', 2))
+                question, answer = imported.messages.order_by('seq')
+                self.assertEqual((question.content, answer.content), ('Question?', 'Réponse.'))
+                self.assertEqual(answer.parent_id, question.pk)
+                self.assertEqual(answer.path, f'{question.seq}/{answer.seq}/')
+
+    def test_export_lines(self):
+        lines = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual([line['type'] for line in lines], ['header', 'conversation', 'message', 'message'])
+        self.assertEqual(lines[2]['created_at'], Message.objects.get(pk=lines[2]['id']).created_at.isoformat())
+
+    def test_invalid_line_rolls_the_import_back(self):
+        lines = self.export().splitlines()
+        cases = [
+            (lines[:2] + [b'not json'], 'Line 3: Malformed export line'),
+            (lines[:2] + [b'[1, 2]'], 'Line 3: Malformed export line'),
+            (lines[:2] + [b'{"type": "message", "conversation_id": %d}' % self.conversation.pk],
+             "Line 3: invalid record (KeyError: 'id')"),
+            (lines[1:], 'Line 1: Missing export header'),
+        ]
+        for data, error in cases:
+            with self.subTest(error=error):
+                with self.assertRaisesMessage(InvalidExportError, error):
+                    ExportService.import_stream(self.other, io.BytesIO(b'\n'.join(data)))
+                self.assertFalse(Conversation.objects.filter(user=self.other).exists())
+
+
+class MessageTreeTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('tree', 'tree@example.com', 'x')
+        self.conversation = ConversationService.create_conversation(user, title='Tree')
+        self.question = self.add('Question?', 'user')
+        self.answer = self.add('Answer.', 'assistant', self.question)
+        self.follow_up = self.add('Follow-up?', 'user', self.answer)
+
+    def add(self, content, role, parent=None):
+        return ConversationService.add_message_to_conversation(self.conversation, content, role, parent)
+
+    def test_paths_follow_the_replies(self):
+        self.assertEqual([self.question.seq, self.answer.seq, self.follow_up.seq], [1, 2, 3])
+        self.assertEqual((self.follow_up.path, self.follow_up.depth), ('1/2/3/', 2))
+        self.assertEqual(MessageTreeService.branch(self.follow_up), [self.question, self.answer, self.follow_up])
+        self.assertEqual(list(MessageTreeService.descendants(self.question)), [self.answer, self.follow_up])
+
+    def test_edit_forks_a_sibling_branch(self):
+        edited = MessageTreeService.edit_into_branch(self.follow_up, 'Better follow-up?')
+
+        self.assertEqual((edited.seq, edited.path, edited.parent_id), (4, '1/2/4/', self.answer.pk))
+        self.assertEqual(edited.metadata, {'edited_from': self.follow_up.pk})
+        self.assertEqual(list(MessageTreeService.alternatives(self.follow_up)), [self.follow_up, edited])
+        self.assertEqual(MessageTreeService.active_branch(self.conversation), [self.question, self.answer, edited])
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 4)
+
+    def test_only_user_messages_are_edited_into_a_branch(self):
+        with self.assertRaises(MessageOrderingError):
+            MessageTreeService.edit_into_branch(self.answer, 'Edited answer')
+
+    def test_consecutive_replies_of_the_same_role_are_refused(self):
+        with self.assertRaises(MessageOrderingError):
+            self.add('Another answer.', 'assistant', self.question)
+
+
+class LockTests(SimpleTestCase):
+    def test_lock_is_exclusive(self):
+        with message_lock(1):
+            with self.assertRaises(LockAcquisitionError):
+                with message_lock(1):
+                    pass
+            with message_lock(2):
+                pass
+        with message_lock(1):
+            pass
+
+    def test_expired_lock_taken_by_another_holder_is_left_alone(self):
+        with message_lock(3):
+            # Our TTL ran out and another worker took the lock
+            caches['shared'].set('message_lock_3', 'other holder')
+        self.assertEqual(caches['shared'].get('message_lock_3'), 'other holder')
+        caches['shared'].delete('message_lock_3')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('etag', 'etag@example.com', 'x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.conversation = ConversationService.create_conversation(self.user, title='Cached')
+        ConversationService.add_message_to_conversation(self.conversation, 'Question?', 'user')
+
+    def get(self, url, **headers):
+        return self.client.get(url, headers=headers)
+
+    def test_unchanged_resources_answer_304(self):
+        for url in ['/api/chat/conversations/', f'/api/chat/conversations/{self.conversation.pk}/',
+                    f'/api/chat/conversations/{self.conversation.pk}/messages/']:
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+                response = self.get(url, if_none_match=response['ETag'])
+                self.assertEqual((response.status_code, response.content), (304, b''))
+
+    def test_new_message_changes_the_etag(self):
+        url = f'/api/chat/conversations/{self.conversation.pk}/messages/'
+        etag = self.get(url)['ETag']
+        ConversationService.add_message_to_conversation(self.conversation, 'Another question?', 'user')
+
+        response = self.get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_honours_if_modified_since(self):
+        url = f'/api/chat/conversations/{self.conversation.pk}/'
+        response = self.get(url)
+        self.assertEqual(self.get(url, if_modified_since=response['Last-Modified']).status_code, 304)
+
+    def test_list_has_no_last_modified(self):
+        latest = ConversationService.create_conversation(self.user, title='Latest')
+        response = self.get('/api/chat/conversations/')
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        # Max(updated_at) goes backwards, the ETag still changes
+        latest.delete()
+        self.assertEqual(self.get('/api/chat/conversations/', if_none_match=response['ETag']).status_code, 200)
+
+
+class IdempotencyTests(TestCase):
+    url = '/api/chat/conversations/'
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('idempotency', 'idempotency@example.com', 'x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, key='key-1', message='Hello'):
+        return self.client.post(self.url, {'initial_message': message}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_gets_the_stored_response(self):
+        first = self.post()
+        retry = self.post()
+
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Conversation.objects.filter(user=self.user).count(), 1)
+
+    def test_key_reused_for_another_request(self):
+        self.post()
+        response = self.post(message='Something else')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Conversation.objects.filter(user=self.user).count(), 1)
+
+    @override_settings(IDEMPOTENCY={'WAIT_TIMEOUT': 0})
+    def test_in_flight_key_gets_a_conflict(self):
+        self.post()
+        IdempotencyKey.objects.update(response_status=None)
+        self.assertEqual(self.post().status_code, 409)
+
+    def test_retry_waits_for_the_first_request(self):
+        first = self.post()
+        record = IdempotencyKey.objects.get()
+        stored = (record.response_status, bytes(record.response_body), record.encoding)
+        IdempotencyKey.objects.update(response_status=None)
+
+        def first_request_answers(seconds):
+            IdempotencyKey.objects.update(
+                response_status=stored[0], response_body=stored[1], encoding=stored[2]
+            )
+
+        with mock.patch('apps.core.mixins.time.sleep', side_effect=first_request_answers) as sleep:
+            retry = self.post()
+
+        sleep.assert_called_once()
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+    def test_errors_and_conflicts_release_the_key(self):
+        for error, code in [(MistralAPIError('model down'), 503), (ConversationConflictError('busy'), 409)]:
+            with self.subTest(code=code):
+                with mock.patch.object(ConversationService, 'create_conversation', side_effect=error):
+                    self.assertEqual(self.post(key=f'key-{code}').status_code, code)
+                self.assertFalse(IdempotencyKey.objects.filter(key=f'key-{code}').exists())
+                self.assertEqual(self.post(key=f'key-{code}').status_code, 201)
+
+    def test_taken_over_key_is_not_overwritten(self):
+        create_conversation = ConversationService.create_conversation
+
+        def slow_create(*args, **kwargs):
+            # Past PENDING_TIMEOUT, a retry took the key over
+            IdempotencyKey.objects.all().delete()
+            return create_conversation(*args, **kwargs)
+
+        with mock.patch.object(ConversationService, 'create_conversation', side_effect=slow_create):
+            self.assertEqual(self.post().status_code, 201)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class StubClient:
+    def __init__(self, error=None):
+        self.error = error
+        self.prompts = []
+
+    def generate_response(self, prompt):
+        self.prompts.append(prompt)
+        if self.error:
+            raise self.error
+        return 'Use cProfile.'
+
+
+class ReplyStatusTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('replies', 'replies@example.com', 'x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self):
+        response = self.client.post(
+            '/api/chat/conversations/', {'title': 'Profiling', 'initial_message': 'How do I profile Python?'},
+            format='json',
+        )
+        self.assertEqual(response.json()['reply_status'], 'pending')
+        conversation = response.json()['id']
+        return f"/api/chat/conversations/{conversation}/messages/{response.json()['user_message']['id']}/status/"
+
+    def test_scheduled_reply_is_pending_in_every_process(self):
+        # The background reply hasn't started, and this process never saw it scheduled
+        url = self.create()
+        caches['shared'].clear()
+        with mock.patch('apps.chat.mistral_client.get_client') as get_client:
+            response = self.client.get(url)
+        self.assertEqual(response.json(), {'status': 'pending'})
+        get_client.assert_not_called()
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_background_reply_completes(self):
+        client = StubClient()
+        with mock.patch('apps.chat.mistral_client.get_client', return_value=client):
+            with self.captureOnCommitCallbacks(execute=True):
+                url = self.create()
+            response = self.client.get(url)
+        self.assertEqual(response.json()['status'], 'completed')
+        self.assertEqual(response.json()['ai_message']['content'], 'Use cProfile.')
+        self.assertEqual(len(client.prompts), 1)
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_failed_reply_is_generated_on_the_next_poll(self):
+        with mock.patch('apps.chat.mistral_client.get_client', return_value=StubClient(RuntimeError('model down'))):
+            with self.assertLogs('apps.chat.services.generation'), self.captureOnCommitCallbacks(execute=True):
+                url = self.create()
+        with mock.patch('apps.chat.mistral_client.get_client', return_value=StubClient()):
+            response = self.client.get(url)
+        self.assertEqual(response.json()['status'], 'completed')
+
+    @override_settings(CHAT_REPLIES={'PENDING_TIMEOUT': 0})
+    def test_stale_reply_is_generated_inline(self):
+        url = self.create()
+        with mock.patch('apps.chat.mistral_client.get_client', return_value=StubClient()):
+            response = self.client.get(url)
+        self.assertEqual(response.json()['status'], 'completed')
+
+
+@override_settings(CHAT_SYNC={'SETTLE_SECONDS': 0})
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('sync', 'sync@example.com', 'x')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.conversation = ConversationService.create_conversation(self.user, title='Synced')
+            self.message = ConversationService.add_message_to_conversation(self.conversation, 'Hi', 'user')
+
+    def test_changes_since_a_cursor(self):
+        changes = SyncService.changes_since(self.user)
+        self.assertEqual((changes['conversations'], changes['messages']), ([self.conversation], [self.message]))
+        self.assertEqual((changes['has_more'], changes['retry_after']), (False, None))
+
+        message_id = self.message.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.message.delete()
+        later = SyncService.changes_since(self.user, changes['cursor'])
+        self.assertEqual((later['conversations'], later['messages']), ([], []))
+        self.assertEqual(later['deleted'], {'conversations': [], 'messages': [message_id]})
+        self.assertEqual(SyncService.changes_since(self.user, later['cursor'])['cursor'], later['cursor'])
+
+    def test_pages(self):
+        first = SyncService.changes_since(self.user, limit=1)
+        self.assertTrue(first['has_more'])
+        rest = SyncService.changes_since(self.user, first['cursor'], limit=100)
+        self.assertFalse(rest['has_more'])
+        self.assertGreater(rest['cursor'], first['cursor'])
+
+    @override_settings(CHAT_SYNC={'SETTLE_SECONDS': 30})
+    def test_recent_entries_are_held_back(self):
+        changes = SyncService.changes_since(self.user, limit=1)
+        self.assertEqual((changes['cursor'], changes['has_more'], changes['conversations']), (0, False, []))
+        self.assertTrue(0 < changes['retry_after'] <= 30)
+
+    def test_compaction_keeps_the_latest_entry_of_each_object(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ConversationService.update_conversation_title(self.conversation, 'Renamed')
+            ConversationService.create_conversation(self.user, title='Deleted').delete()
+        before = ChangeLogEntry.objects.count()
+
+        SyncService.compact()
+
+        self.assertLess(ChangeLogEntry.objects.count(), before)
+        changes = SyncService.changes_since(self.user)
+        self.assertEqual(changes['conversations'][0].title, 'Renamed')
+        self.assertEqual(len(changes['deleted']['conversations']), 1)
+
+    def test_sync_view(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/chat/sync/', {'since': 0})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m['id'] for m in response.json()['messages']], [self.message.pk])
+        self.assertEqual(client.get('/api/chat/sync/', {'since': 'x'}).status_code, 400)
+
+
+class WebSocketTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('socket', 'socket@example.com', 'x')
+        self.token = issue_token_pair(self.user)['access']
+
+    def connect(self, query_string=b'', headers=()):
+        """Open /ws/chat/, ping, wait for one published event, disconnect; return what was sent"""
+        sent = []
+
+        async def session():
+            incoming = asyncio.Queue()
+            ready = asyncio.Event()
+
+            async def send(message):
+                sent.append(message)
+                if message.get('text') == json.dumps({'type': 'ready'}):
+                    ready.set()
+
+            await incoming.put({'type': 'websocket.connect'})
+            scope = {'type': 'websocket', 'path': '/ws/chat/', 'query_string': query_string, 'headers': headers}
+            connection = asyncio.ensure_future(chat_events(scope, incoming.get, send))
+            done, _ = await asyncio.wait([connection, asyncio.ensure_future(ready.wait())], timeout=5,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if connection in done:
+                return
+            await incoming.put({'type': 'websocket.receive', 'text': '{"type": "ping"}'})
+            realtime.publish(self.user.pk, {'type': 'conversation.updated', 'conversation_id': 1})
+            for _ in range(500):
+                if len(sent) >= 4:
+                    break
+                await asyncio.sleep(0.01)
+            await incoming.put({'type': 'websocket.disconnect'})
+            await asyncio.wait_for(connection, 5)
+
+        async_to_sync(session)()
+        return sent
+
+    def test_token_opens_the_event_stream(self):
+        sent = self.connect(f'token={self.token}'.encode())
+
+        self.assertEqual(sent[0], {'type': 'websocket.accept'})
+        events = sorted(json.loads(message['text'])['type'] for message in sent[1:])
+        self.assertEqual(events, ['conversation.updated', 'pong', 'ready'])
+
+    def test_invalid_token_is_refused(self):
+        self.assertEqual(self.connect(b'token=invalid'), [{'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED}])
+
+    def test_deactivated_user_is_refused(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.connect(f'token={self.token}'.encode()),
+                         [{'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED}])
+
+    def test_session_cookie_needs_a_trusted_origin(self):
+        self.client.force_login(self.user)
+        cookie = f'sessionid={self.client.cookies["sessionid"].value}'.encode()
+
+        foreign = self.connect(headers=[(b'cookie', cookie), (b'host', b'testserver'), (b'origin', b'http://evil.test')])
+        self.assertEqual(foreign, [{'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED}])
+        same_site = self.connect(headers=[(b'cookie', cookie), (b'host', b'testserver'),
+                                          (b'origin', b'http://testserver')])
+        self.assertEqual(same_site[0], {'type': 'websocket.accept'})
+
+
+class FastSerializerTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('fast', 'fast@example.com', 'x')
+        for n in range(3):
+            conversation = ConversationService.create_conversation(user, title=f'Conversation {n}')
+            conversation.additional_data = {'n': n, 'text': 'é\u2028'}
+            conversation.save()
+            for role, text in [('user', 'Question ✓?'), ('assistant', 'Answer.')][:n]:
+                ConversationService.add_message_to_conversation(conversation, text, role)
+        ConversationService.create_conversation(user, title='Empty')
+        self.conversations = Conversation.objects.filter(user=user).order_by('id')
+
+    @override_settings(TIME_ZONE='Europe/Paris')
+    def test_same_output_as_the_model_serializers(self):
+        self.assertEqual(FastConversationSerializer(self.conversations, many=True).data,
+                         ConversationSerializer(self.conversations, many=True).data)
+        messages = Message.objects.order_by('id')
+        self.assertEqual(FastMessageSerializer(messages, many=True).data, MessageSerializer(messages, many=True).data)
+        self.assertEqual(FastMessageSerializer(messages[0]).data, MessageSerializer(messages[0]).data)
+
+    def test_orjson_renderer_writes_the_same_bytes(self):
+        data = ConversationSerializer(self.conversations, many=True).data
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+@override_settings(RESPONSE_COMPRESSION={'MIN_SIZE': 1024, 'ENCODINGS': ['gzip']})
+class CompressionTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('gzip', 'gzip@example.com', 'x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.conversation = ConversationService.create_conversation(self.user, title='Compressed')
+        for n in range(20):
+            ConversationService.add_message_to_conversation(self.conversation, f'Message {n} ' * 10, 'user')
+        self.url = f'/api/chat/conversations/{self.conversation.pk}/messages/'
+
+    def test_large_responses_are_compressed(self):
+        plain = self.client.get(self.url)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get(self.url, headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(decompress(response.content, 'gzip'), plain.content)
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+
+    def test_small_responses_are_not(self):
+        response = self.client.get(f'/api/chat/conversations/?status=archived', headers={'accept-encoding': 'gzip'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_archived_conversation_is_served_from_its_snapshot(self):
+        with self.captureOnCommitCallbacks():
+            ConversationService.archive_conversation(self.conversation)
+        self.assertEqual(SnapshotService.build(self.conversation), 2)
+        live = ConversationSnapshot.objects.get(conversation=self.conversation, kind=ConversationSnapshot.MESSAGES)
+
+        url = f'{self.url}?status=archived'
+        response = self.client.get(url, headers={'accept-encoding': 'gzip'})
+        self.assertEqual((response['Content-Encoding'], response.content), ('gzip', bytes(live.body)))
+        response = self.client.get(url)
+        self.assertEqual(json.loads(response.content)[0]['content'], 'Message 0 ' * 10)
+
+    def test_stale_snapshot_is_not_served(self):
+        with self.captureOnCommitCallbacks():
+            ConversationService.archive_conversation(self.conversation)
+        SnapshotService.build(self.conversation)
+        conversation = Conversation.objects.get(pk=self.conversation.pk)
+        conversation.save()
+
+        with self.captureOnCommitCallbacks():
+            self.assertIsNone(SnapshotService.get(conversation, ConversationSnapshot.DETAIL))
+            response = self.client.get(f'/api/chat/conversations/{conversation.pk}/?status=archived')
+        self.assertEqual(response.json()['updated_at'][:19], conversation.updated_at.isoformat()[:19])
+
+
+class ColdStorageTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('cold', 'cold@example.com', 'x')
+        self.conversation = ConversationService.create_conversation(self.user, title='Packed')
+        question = ConversationService.add_message_to_conversation(self.conversation, 'Question?', 'user')
+        ConversationService.add_message_to_conversation(self.conversation, 'Réponse.', 'assistant', question)
+        self.rows = list(Message.objects.order_by('id').values())
+        with self.captureOnCommitCallbacks():
+            ConversationService.archive_conversation(self.conversation)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name)
+
+    def settings(self, backend, encoding='gzip'):
+        return override_settings(COLD_STORAGE={'BACKEND': backend, 'PATH': self.path, 'ENCODING': encoding})
+
+    def test_pack_and_unpack_keep_every_row(self):
+        for backend in ['db', 'file']:
+            for encoding in available_encodings():
+                with self.subTest(backend=backend, encoding=encoding), self.settings(backend, encoding):
+                    with self.captureOnCommitCallbacks(execute=True):
+                        self.assertTrue(ColdStorageService.pack(self.conversation))
+                    self.assertFalse(Message.objects.exists())
+                    record = ConversationColdStorage.objects.get()
+                    self.assertEqual((record.encoding, record.message_count), (encoding, 2))
+                    self.assertEqual(bool(record.location), backend == 'file')
+
+                    with self.captureOnCommitCallbacks(execute=True):
+                        self.assertEqual(ColdStorageService.unpack(self.conversation), 2)
+                    self.assertEqual(list(Message.objects.order_by('id').values()), self.rows)
+                    self.assertEqual(list(self.path.iterdir()), [])
+
+    def test_export_copies_the_packed_lines(self):
+        with self.settings('file'):
+            with self.captureOnCommitCallbacks(execute=True):
+                ColdStorageService.pack(self.conversation)
+            lines = [json.loads(line) for line in b''.join(ExportService.stream(self.user)).splitlines()]
+        self.assertEqual([line['content'] for line in lines if line['type'] == 'message'], ['Question?', 'Réponse.'])
+
+    def test_rolled_back_pack_leaves_no_file(self):
+        with self.settings('file'):
+            with self.captureOnCommitCallbacks(execute=True), mock.patch(
+                'apps.chat.services.cold_storage._delete_rows', side_effect=RuntimeError('disk full')
+            ):
+                with self.assertRaises(RuntimeError):
+                    ColdStorageService.pack(self.conversation)
+            self.assertEqual(list(self.path.iterdir()), [])
+            self.assertEqual(Message.objects.count(), 2)
+
+    def test_sweep_settles_old_pending_files(self):
+        with self.settings('file'):
+            with self.captureOnCommitCallbacks(execute=False):
+                ColdStorageService.pack(self.conversation)
+            record = ConversationColdStorage.objects.get()
+            orphan = self.path / f'{self.conversation.pk}-orphan.gzip.pending'
+            orphan.write_bytes(b'')
+            for pending in self.path.iterdir():
+                os.utime(pending, (0, 0))
+
+            self.assertEqual(FileColdStore(self.path).sweep(max_age=60), 1)
+            self.assertEqual([f.name for f in self.path.iterdir()], [record.location])
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client.force_login(user)
+        conversation = ConversationService.create_conversation(user, title='Admin changelist')
+        ConversationService.add_message_to_conversation(conversation, 'Hello there', 'user')
+
+    def test_changelists(self):
+        for url in ('/admin/chat/conversation/', '/admin/chat/message/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['cl'].result_count, 1)
+                # Month links instead of the date hierarchy
+                self.assertContains(response, 'created_at__gte=')
+
+    def test_short_searches_are_refused(self):
+        response = self.client.get('/admin/chat/message/', {'q': 'He'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+        self.assertContains(response, 'At least 3 characters')
+
+        response = self.client.get('/admin/chat/message/', {'q': 'Hello'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+class PartitionTests(TestCase):
+    def test_month_arithmetic(self):
+        month = partitions.month_start(datetime.datetime(2025, 11, 30, 23, 30, tzinfo=datetime.timezone.utc))
+        self.assertEqual(month, datetime.datetime(2025, 11, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(partitions.add_months(month, 2), datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(partitions.add_months(month, -11).month, 12)
+        self.assertEqual(partitions.partition_name(month), 'chat_message_y2025m11')
+        self.assertIn("FROM ('2025-11-01T00:00:00+00:00') TO ('2025-12-01T00:00:00+00:00')",
+                      partitions.create_partition_sql(month))
+
+    def test_postgres_only(self):
+        with self.assertRaises(NotImplementedError):
+            partitions.drop_partitions_before(datetime.datetime.now(datetime.timezone.utc))
+
+    def test_bounded_messages(self):
+        user = get_user_model().objects.create_user('partitions', 'partitions@example.com', 'x')
+        conversation = ConversationService.create_conversation(user, title='Bounded')
+        ConversationService.add_message_to_conversation(conversation, 'Hi', 'user')
+
+        self.assertNotIn('"created_at" >=', str(conversation.bounded_messages().query))
+        with override_settings(MESSAGE_PARTITIONS={'ENABLED': True}):
+            messages = conversation.bounded_messages()
+            self.assertIn('"created_at" >=', str(messages.query))
+            self.assertEqual(messages.count(), 1)
+
+
+class TitleParsingTests(SimpleTestCase):
+    def test_heuristic_takes_the_first_sentence_without_markup(self):
+        self.assertEqual(TitleService.heuristic('**How** do I reset `git`? It broke.'), 'How do I reset git ?')
+        self.assertEqual(TitleService.heuristic('See [the docs](http://x.y) please'), 'See the docs please')
+        self.assertEqual(TitleService.heuristic('   '), 'New Conversation')
+
+    def test_heuristic_cuts_on_a_word_boundary(self):
+        title = TitleService.heuristic('word ' * 30, max_length=22)
+        self.assertEqual(title, 'word word word word...')
+
+    def test_parse_json_answer(self):
+        response = 'Titles:\n{"1": " \\"Reset a password\\" ", "2": "Cake recipe", "3": "Out of range"}'
+        self.assertEqual(TitleService.parse(response, 2), {0: 'Reset a password', 1: 'Cake recipe'})
+
+    def test_parse_numbered_list_fallback(self):
+        response = '1. Reset a password\n2) Cake recipe\nsomething else'
+        self.assertEqual(TitleService.parse(response, 2), {0: 'Reset a password', 1: 'Cake recipe'})
+
+    def test_parse_skips_empty_and_invalid_titles(self):
+        self.assertEqual(TitleService.parse('{"1": "", "2": 42}', 2), {})
+
+    @override_settings(CHAT_TITLES={'MAX_LENGTH': 20})
+    def test_parse_shortens_long_titles(self):
+        titles = TitleService.parse(json.dumps({'1': 'A very long title about many different things'}), 1)
+        self.assertEqual(titles, {0: 'A very long title...'})
+
+
+class TitleGenerationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('titles', 'titles@example.com', 'x')
+
+    def test_generate_saves_titles_left_untouched(self):
+        first = ConversationService.create_conversation(self.user, title='How do I')
+        second = ConversationService.create_conversation(self.user, title='Renamed by the user')
+        items = [
+            (first.pk, 'How do I', 'How do I reset my password? Thanks'),
+            (second.pk, 'Chocolate', 'Chocolate cake recipe please'),
+        ]
+
+        saved = TitleService.generate(items, provider=StubProvider(latency=0))
+
+        self.assertEqual(saved, 1)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.title, 'How do I reset my password?')
+        self.assertEqual(second.title, 'Renamed by the user')
+
+
+class PromptTests(TestCase):
+    def setUp(self):
+        self.addCleanup(caches['default'].clear)
+        user = get_user_model().objects.create_user('prompts', 'prompts@example.com', 'x')
+        self.conversation = ConversationService.create_conversation(user, title='Prompts')
+
+    def add(self, content, role, parent=None):
+        return ConversationService.add_message_to_conversation(self.conversation, content, role, parent_message=parent)
+
+    def test_canonical_blocks(self):
+        self.assertEqual(canonical('  Cafe\u0301\r\nbis\r '), 'Café\nbis')
+        self.assertEqual(block('user', 'Cafe\u0301'), block('user', 'Café'))
+
+    def test_next_turn_reuses_the_previous_prompt(self):
+        first = self.add('How do I profile a Python program?', 'user')
+        previous = PromptService.build(first, context=[])
+        PromptService.track(previous)
+
+        reply = self.add('Use cProfile.', 'assistant', first)
+        second = self.add('And for memory?', 'user', reply)
+        prompt = PromptService.build(second, context=[])
+        usage = PromptService.track(prompt)
+
+        self.assertEqual(prompt.blocks[:2], previous.blocks)
+        self.assertEqual(prompt.prefix_length, 3)
+        self.assertEqual(usage['reused_tokens'], PromptService.track(previous)['prompt_tokens'])
+        self.assertLess(usage['reused_tokens'], usage['prefix_tokens'])
+        self.assertLess(usage['prefix_tokens'], usage['prompt_tokens'])
+
+    def test_context_comes_after_the_prefix(self):
+        message = self.add('And for memory?', 'user')
+        snippet = {'date': '2026-01-01', 'title': 'Profiling', 'role': 'user', 'text': 'Use tracemalloc'}
+
+        prompt = PromptService.build(message, context=[snippet])
+
+        self.assertEqual(prompt.prefix_length, 1)
+        self.assertTrue(prompt.blocks[1].startswith('[context]'))
+        self.assertEqual(prompt.blocks[-1], block('user', 'And for memory?'))
+        self.assertEqual(prompt.prefix_hash, PromptService.build(message, context=[]).prefix_hash)
+
+    def test_window_moves_by_steps(self):
+        history = [('user' if n % 2 == 0 else 'assistant', 'word ' * 8) for n in range(60)]
+        starts = [count - len(PromptService.window(history[:count], 200, 100)) for count in range(10, 60)]
+        # The start only moves every few turns, and always to a user message
+        self.assertEqual(starts, sorted(starts))
+        self.assertLess(len(set(starts)), len(starts) // 3)
+        self.assertTrue(all(start % 2 == 0 for start in starts))
+        self.assertEqual(PromptService.window(history[:2], 200, 100), history[:2])
+
+
+class EnrichmentParsingTests(SimpleTestCase):
+    def job(self, fields=('title', 'summary', 'tags', 'category')):
+        with override_settings(CHAT_ENRICHMENT={'CATEGORIES': ['programming', 'other']}):
+            return EnrichmentJob(fields)
+
+    def test_values_are_cleaned(self):
+        response = json.dumps({'1': {
+            'title': 'Reset   a password',
+            'summary': ' The user  asks\nhow to reset a password. ',
+            'tags': ['Password', 'password', ' Account ', '', 3, 'extra'],
+            'category': 'Programming',
+        }})
+        with override_settings(CHAT_ENRICHMENT={'MAX_TAGS': 2}):
+            results = self.job().parse(response, 1)
+
+        self.assertEqual(results, {0: {
+            'title': 'Reset a password',
+            'summary': 'The user asks how to reset a password.',
+            'tags': ['password', 'account'],
+            'category': 'programming',
+        }})
+
+    def test_unknown_category_becomes_other(self):
+        results = self.job(['category']).parse('{"1": {"category": "cooking"}}', 1)
+        self.assertEqual(results, {0: {'category': 'other'}})
+
+    def test_only_requested_and_valid_fields_are_kept(self):
+        response = '{"1": {"title": "T", "summary": 12, "tags": "a, b"}, "2": "not an object", "3": {}}'
+        self.assertEqual(self.job(['summary', 'tags']).parse(response, 3), {})
+        self.assertEqual(self.job(['title', 'summary']).parse(response, 3), {0: {'title': 'T'}})
+
+
+class EnrichmentTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('enrich', 'enrich@example.com', 'x')
+
+    def conversation(self, title, text):
+        conversation = ConversationService.create_conversation(self.user, title=title)
+        ConversationService.add_message_to_conversation(conversation, text, 'user')
+        return conversation
+
+    def test_enrich_fills_empty_fields(self):
+        first = self.conversation('Python', 'How do I profile a Python program quickly?')
+        second = self.conversation('Cake', 'Give me a chocolate cake recipe')
+        Conversation.objects.filter(pk=second.pk).update(summary='Kept as is')
+        engine = BatchInference(StubProvider(latency=0), pack_size=10)
+
+        stats = EnrichmentService.enrich([first.pk, second.pk], engine=engine)
+
+        self.assertEqual((stats.items, stats.completed, stats.calls), (2, 2, 1))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertTrue(first.summary.startswith('user: How do I profile'))
+        self.assertIn('profile', first.tags)
+        self.assertTrue(first.category)
+        self.assertEqual(second.summary, 'Kept as is')
+
+    def test_filled_conversations_are_not_sent(self):
+        first = self.conversation('Python', 'How do I profile a Python program quickly?')
+        second = self.conversation('Cake', 'Give me a chocolate cake recipe')
+        Conversation.objects.filter(pk=second.pk).update(summary='Kept as is')
+        engine = BatchInference(StubProvider(latency=0), pack_size=10)
+
+        stats = EnrichmentService.enrich([first.pk, second.pk], fields=['summary'], engine=engine)
+
+        self.assertEqual((stats.items, stats.completed), (1, 1))
+        second.refresh_from_db()
+        self.assertEqual(second.summary, 'Kept as is')
+
+    def test_deleted_conversation_is_skipped(self):
+        conversation = self.conversation('Python', 'How do I profile a Python program quickly?')
+        Conversation.objects.filter(pk=conversation.pk).delete()
+
+        self.assertEqual(EnrichmentService.apply(conversation, {'summary': 'Too late'}), [])
+
+    def test_overwrite(self):
+        conversation = self.conversation('Python', 'How do I profile a Python program quickly?')
+        Conversation.objects.filter(pk=conversation.pk).update(summary='Old summary')
+        engine = BatchInference(StubProvider(latency=0))
+
+        EnrichmentService.enrich([conversation.pk], fields=['summary'], overwrite=True, engine=engine)
+
+        conversation.refresh_from_db()
+        self.assertNotEqual(conversation.summary, 'Old summary')
+
+
+class EmbeddingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            BACKGROUND_TASKS_EAGER=True, SEMANTIC_SEARCH={'ENABLED': True, 'PATH': Path(directory.name)}
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = get_user_model().objects.create_user('embeddings', 'embeddings@example.com', 'x')
+        conversation = ConversationService.create_conversation(self.user, title='Embeddings')
+        with self.captureOnCommitCallbacks(execute=True):
+            created = ConversationService.add_message_to_conversation(
+                conversation, 'How do I profile a Python program?', 'user'
+            )
+        self.message = Message.objects.get(pk=created.pk)
+
+    def test_edited_message_is_embedded_again(self):
+        VectorIndexService.build(self.user.pk)
+        before = MessageEmbedding.objects.get(message_id=self.message.pk)
+
+        self.message.content = 'Give me a chocolate cake recipe'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.message.save()
+
+        after = MessageEmbedding.objects.get(message_id=self.message.pk)
+        self.assertGreater(after.pk, before.pk)
+        self.assertEqual(bytes(after.vector), EmbeddingService.embed([self.message.content])[0].tobytes())
+        # The indexed vector of the old content no longer matches
+        scores = SearchService.vector_candidates(self.user, 'How do I profile a Python program?', 10)
+        self.assertLess(scores[self.message.pk], 0.5)
+
+
+@override_settings(RETRIEVAL={'ENABLED': True, 'MIN_SCORE': 0.3, 'TIMEOUT': 0.05})
+class RetrievalTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            BACKGROUND_TASKS_EAGER=True, SEMANTIC_SEARCH={'ENABLED': True, 'PATH': Path(directory.name)}
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(caches['default'].clear)
+        user = get_user_model().objects.create_user('retrieval', 'retrieval@example.com', 'x')
+        earlier = ConversationService.create_conversation(user, title='Profiling')
+        current = ConversationService.create_conversation(user, title='Again')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.earlier = ConversationService.add_message_to_conversation(
+                earlier, 'How do I profile a slow Python program?', 'user'
+            )
+            self.message = ConversationService.add_message_to_conversation(
+                current, 'How should I profile my slow Python program?', 'user'
+            )
+
+    def test_search_finds_other_conversations(self):
+        result = RetrievalService.search(self.message)
+        self.assertEqual([snippet['message_id'] for snippet in result.snippets], [self.earlier.pk])
+
+    def test_search_over_budget_keeps_its_results(self):
+        with override_settings(RETRIEVAL={'STAGE_BUDGETS': {'search': -1}, 'MIN_SCORE': 0.3}):
+            with self.assertLogs('apps.chat.services.retrieval', 'WARNING'):
+                result = RetrievalService.search(self.message)
+        self.assertEqual([snippet['message_id'] for snippet in result.snippets], [self.earlier.pk])
+
+    def test_searches_are_shed_past_max_pending(self):
+        with mock.patch.object(retrieval, '_pending', 8), self.assertLogs('apps.chat.services.retrieval', 'WARNING'):
+            result = RetrievalService.retrieve(self.message)
+        self.assertTrue(result.shed)
+        self.assertEqual(result.snippets, [])
+
+    def test_slow_search_times_out_then_fills_the_cache(self):
+        finished = threading.Event()
+
+        def slow_candidates(*args):
+            time.sleep(0.2)
+            finished.set()
+            return {}
+
+        self.message.conversation  # loaded here, not in the search thread
+        key = RetrievalService.cache_key(self.message)
+        with mock.patch.object(SearchService, 'vector_candidates', slow_candidates):
+            with self.assertLogs('apps.chat.services.retrieval', 'WARNING') as logs:
+                result = RetrievalService.retrieve(self.message)
+                self.assertTrue(result.timed_out)
+                # The search goes on in its thread and caches its (empty) result
+                self.assertTrue(finished.wait(1))
+                for _ in range(50):
+                    if caches['default'].get(key) is not None:
+                        break
+                    time.sleep(0.01)
+        self.assertEqual(caches['default'].get(key), [])
+        self.assertIn('over its', logs.output[-1])
+
+    def test_results_are_cached_per_user_message(self):
+        RetrievalService._search_and_cache(self.message, RetrievalService.cache_key(self.message))
+        with mock.patch.object(SearchService, 'vector_candidates') as candidates:
+            result = RetrievalService.retrieve(self.message)
+        candidates.assert_not_called()
+        self.assertTrue(result.cached)
+        self.assertIn('Profiling', RetrievalService.augment(self.message))
+
+
+class RevisionDiffTests(SimpleTestCase):
+    cases = [
+        ('', 'Hello'),
+        ('Hello', ''),
+        ('Hello wrold, how are you?', 'Hello world, how are you?'),
+        ('one two three', 'zero one three four'),
+        ('same text', 'same text'),
+        ('Ligne 1\nligne 2\n', 'Ligne 1\n\nligne 2 modifiée\n'),
+    ]
+
+    def test_patch_rebuilds_the_new_text(self):
+        for old, new in self.cases:
+            with self.subTest(old=old, new=new):
+                self.assertEqual(patch(old, diff(old, new)), new)
+
+    def test_small_edit_gives_a_small_diff(self):
+        old = 'The quick brown fox jumps over the lazy dog. ' * 20
+        new = old.replace('lazy', 'sleepy', 1)
+        self.assertEqual(diff(old, new), [35, -4, 'sleepy'])
+
+    def test_identical_texts_have_an_empty_diff(self):
+        self.assertEqual(diff('same text', 'same text'), [])
+
+
+class RevisionTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('revisions', 'revisions@example.com', 'x')
+        conversation = ConversationService.create_conversation(user, title='Revisions')
+        created = ConversationService.add_message_to_conversation(conversation, 'The quick brown fox. ' * 10, 'user')
+        self.message = Message.objects.get(pk=created.pk)
+
+    def edit(self, count):
+        versions = [self.message.content]
+        for n in range(count):
+            self.message.content = self.message.content.replace('quick', f'quick {n}', 1)
+            self.message.save()
+            versions.append(self.message.content)
+        return versions
+
+    @override_settings(CHAT_REVISIONS={'SNAPSHOT_EVERY': 3})
+    def test_every_revision_is_rebuilt(self):
+        versions = self.edit(7)
+
+        history = RevisionService.history(self.message)
+        self.assertEqual([row['revision'] for row in history], list(range(8)))
+        self.assertEqual([row['kind'] for row in history if row['revision'] % 3 == 0], ['snapshot'] * 3)
+        self.assertEqual([row['kind'] for row in history if row['revision'] % 3], ['diff'] * 5)
+        for revision, content in enumerate(versions):
+            self.assertEqual(RevisionService.get(self.message, revision)['content'], content)
+        self.assertIsNone(RevisionService.get(self.message, 8))
+
+    def test_only_content_changes_count_as_edits(self):
+        self.message.status = 'delivered'
+        self.message.save()
+        self.message.save(update_fields=['metadata'])
+        self.assertEqual((self.message.edit_count, MessageRevision.objects.count()), (0, 0))
+
+        self.edit(2)
+
+        self.message.refresh_from_db()
+        self.assertEqual((self.message.edit_count, self.message.is_edited), (2, True))
+        self.assertEqual(MessageRevision.objects.filter(message_id=self.message.pk).count(), 3)
+
+    def test_concurrent_edits_chain_their_revisions(self):
+        other = Message.objects.get(pk=self.message.pk)
+        original = self.message.content
+        self.message.content = original.replace('quick', 'slow', 1)
+        self.message.save()
+        # Loaded before the first edit: its previous content is the original
+        other.content = original.replace('fox', 'cat', 1)
+        other.save()
+
+        contents = [RevisionService.get(self.message, revision)['content'] for revision in range(3)]
+        self.assertEqual(contents, [original, self.message.content, other.content])
+        self.assertEqual(MessageRevision.objects.get(message_id=self.message.pk, revision=2).kind, 'diff')
+
+    def test_revisions_are_deleted_with_their_message(self):
+        self.edit(2)
+        self.message.delete()
+        self.assertFalse(MessageRevision.objects.exists())
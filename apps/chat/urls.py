@@ -23,4 +23,7 @@ router.register(r'conversations', views.ConversationViewSet, basename='conversat
 urlpatterns = [
     path('', include(router.urls)),
     path('ask-mistral/', views.AskMistralView.as_view(), name='ask-mistral'),
+    path('export/', views.ExportView.as_view(), name='export'),
+    path('import/', views.ImportView.as_view(), name='import'),
+    path('sync/', views.SyncView.as_view(), name='sync'),
 ]
\ No newline at end of file
@@ -1,15 +1,29 @@
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status, views, permissions
 from rest_framework.decorators import action
+from rest_framework.parsers import BaseParser, DataAndFiles, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import Count, Max
 from django.utils import timezone
 
-from .models import Conversation, Message
-from .serializers import ConversationSerializer, MessageSerializer
-from .services import ConversationService, MistralService, MessageService
+from apps.core.mixins import ConditionalGetMixin, IdempotencyMixin, ReplicaReadMixin
+
+from .models import Conversation, ConversationSnapshot, Message
+from .serializers import (
+    ConversationSerializer, FastConversationSerializer, FastMessageSerializer, MessageSerializer,
+    SyncConversationSerializer, SyncMessageSerializer, fast_reads_enabled
+)
+from .services import (
+    ConversationService, MistralService, MessageService, ExportService, GenerationService,
+    MessageTreeService, RevisionService, SearchService, SnapshotService, SyncService, TitleService
+)
+from .services import exceptions as service_exceptions
+from .services.exceptions import InvalidExportError
+from .services.export import available_compressions
 from .exceptions import (
     ChatBaseException,
     InvalidConversationStateError,
@@ -19,19 +33,35 @@ from .exceptions import (
     AIServiceError
 )
 
-class ConversationViewSet(viewsets.ModelViewSet):
+class ConversationViewSet(ConditionalGetMixin, IdempotencyMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     """ViewSet for managing conversations with error handling"""
     serializer_class = ConversationSerializer
     permission_classes = [IsAuthenticated]
     http_method_names = ['get', 'post', 'patch', 'delete']  # Méthodes HTTP autorisées
+    # GET actions served by a read replica (message_status stays on the primary)
+    replica_actions = (
+        'list', 'retrieve', 'messages', 'message_branch', 'message_alternatives', 'message_revisions',
+        'message_revision', 'search',
+    )
+    # GET actions answering 304 when the client's copy is current
+    conditional_actions = ('list', 'retrieve', 'messages')
+    # POST actions replayed from the stored response on an Idempotency-Key retry
+    idempotent_actions = ('create', 'messages', 'edit_message', 'regenerate_message')
     
     def handle_exception(self, exc):
         """Custom exception handling for chat-specific errors"""
-        if isinstance(exc, ChatBaseException):
-            return Response(
-                {'error': str(exc)},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        if isinstance(exc, (ChatBaseException, service_exceptions.ChatBaseException)):
+            # Conflicts and model failures are transient: a retry with the
+            # same Idempotency-Key runs the request again instead of replaying
+            if isinstance(exc, service_exceptions.ConversationConflictError):
+                code = status.HTTP_409_CONFLICT
+            elif isinstance(exc, service_exceptions.MistralAPIError):
+                code = status.HTTP_503_SERVICE_UNAVAILABLE
+            elif isinstance(exc, ChatBaseException) and exc.status_code in (409, 503):
+                code = exc.status_code
+            else:
+                code = status.HTTP_400_BAD_REQUEST
+            return Response({'error': str(exc)}, status=code)
         elif isinstance(exc, ValidationError):
             return Response(
                 {'error': str(exc)},
@@ -51,6 +81,45 @@ class ConversationViewSet(viewsets.ModelViewSet):
             search_query=search
         )
     
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve') and fast_reads_enabled():
+            return FastConversationSerializer
+        return super().get_serializer_class()
+    
+    def get_message_list_serializer(self, messages):
+        serializer_class = FastMessageSerializer if fast_reads_enabled() else MessageSerializer
+        return serializer_class(messages, many=True)
+    
+    def retrieve(self, request, *args, **kwargs):
+        conversation = self.get_object()
+        snapshot = SnapshotService.response(request, conversation, ConversationSnapshot.DETAIL)
+        if snapshot is not None:
+            return snapshot
+        return Response(self.get_serializer(conversation).data)
+    
+    def get_validators(self):
+        """
+        Every message write saves its conversation, so ``updated_at`` (plus
+        the message counters) versions a conversation and its messages.
+        One aggregate or one primary-key lookup, no message is loaded.
+        The list has no Last-Modified: deleting or archiving its most
+        recently updated conversation moves ``Max(updated_at)`` backwards,
+        and an ``If-Modified-Since`` client would keep the stale list.
+        """
+        if self.action == 'list':
+            state = self.get_queryset().order_by().aggregate(
+                last_updated=Max('updated_at'), count=Count('id', distinct=True)
+            )
+            return (state['last_updated'], state['count']), None
+        
+        state = Conversation.objects.filter(
+            pk=self.kwargs.get('pk'), user=self.request.user
+        ).values_list('updated_at', 'last_message_at', 'message_count').first()
+        if state is None:
+            # Let the view answer 404
+            return None
+        return state, state[0]
+    
     def create(self, request, *args, **kwargs):
         """Create a new conversation with initial message"""
         initial_message = request.data.get('initial_message')
@@ -62,11 +131,14 @@ class ConversationViewSet(viewsets.ModelViewSet):
         
         try:
             with transaction.atomic():
-                # Créer la conversation avec un titre temporaire
+                # Titre heuristique tout de suite, titre généré plus tard (en lot)
+                title = request.data.get('title')
                 conversation = ConversationService.create_conversation(
                     user=request.user,
-                    title=request.data.get('title') or initial_message[:50] + '...'
+                    title=title or TitleService.heuristic(initial_message)
                 )
+                if not title:
+                    TitleService.schedule(conversation, initial_message)
                 
                 # Créer le message initial
                 user_message = ConversationService.add_message_to_conversation(
@@ -76,43 +148,44 @@ class ConversationViewSet(viewsets.ModelViewSet):
                     content_type='text'
                 )
                 
-                # Générer la réponse Mistral
-                from .mistral_client import MistralClient
-                client = MistralClient()
-                try:
-                    ai_response = client.generate_response(initial_message)
-                    
-                    # Créer le message AI
-                    ai_message = ConversationService.add_message_to_conversation(
-                        conversation=conversation,
-                        content=ai_response,
-                        role='assistant',
-                        parent_message=user_message,
-                        content_type='text'
-                    )
-                except Exception as e:
-                    # En cas d'erreur avec Mistral, on continue quand même
-                    print(f"Erreur Mistral: {str(e)}")
-                
-                # Récupérer la conversation mise à jour avec le message
-                conversation.refresh_from_db()
-                serializer = self.get_serializer(conversation)
-                
-                return Response(
-                    serializer.data,
-                    status=status.HTTP_201_CREATED
-                )
+                # La réponse du modèle est générée après le commit, en arrière-plan
+                GenerationService.schedule(user_message)
+            
+            conversation.refresh_from_db()
+            return Response({
+                **self.get_serializer(conversation).data,
+                'user_message': MessageSerializer(user_message).data,
+                'reply_status': 'pending',
+            }, status=status.HTTP_201_CREATED)
         except Exception as e:
             return self.handle_exception(e)
     
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Conversations matching ``q`` by meaning and by keywords, best first"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        results = SearchService.search(
+            request.user, query, limit=limit, status=request.query_params.get('status')
+        )
+        return Response({'query': query, 'results': results})
+    
     @action(detail=True, methods=['get', 'post'])
     def messages(self, request, pk=None):
         """Get all messages or add a new message to the conversation"""
         conversation = self.get_object()
         
         if request.method == 'GET':
-            messages = conversation.messages.all().order_by('created_at')
-            serializer = MessageSerializer(messages, many=True)
+            snapshot = SnapshotService.response(request, conversation, ConversationSnapshot.MESSAGES)
+            if snapshot is not None:
+                return snapshot
+            messages = conversation.bounded_messages().order_by('created_at')
+            serializer = self.get_message_list_serializer(messages)
             return Response(serializer.data)
         
         # POST - Add new message
@@ -123,22 +196,29 @@ class ConversationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # Reply to the given message (branching) or continue the latest branch
+        parent_id = request.data.get('parent_id')
+        if parent_id:
+            parent_message = get_object_or_404(conversation.bounded_messages(), id=parent_id)
+        else:
+            parent_message = MessageTreeService.get_leaf(conversation)
+        
         try:
-            # Add user message with transaction
-            with transaction.atomic():
-                # Créer le message utilisateur
-                user_message = ConversationService.add_message_to_conversation(
-                    conversation=conversation,
-                    content=content,
-                    role='user',
-                    content_type='text'
-                )
-                
-                # Retourner immédiatement le message utilisateur
-                return Response({
-                    'user_message': MessageSerializer(user_message).data,
-                    'status': 'pending'
-                }, status=status.HTTP_201_CREATED)
+            # Créer le message utilisateur (the service opens its own
+            # transaction, or hands the insert to the SQLite write queue)
+            user_message = ConversationService.add_message_to_conversation(
+                conversation=conversation,
+                content=content,
+                role='user',
+                parent_message=parent_message,
+                content_type='text'
+            )
+            
+            # Retourner immédiatement le message utilisateur
+            return Response({
+                'user_message': MessageSerializer(user_message).data,
+                'status': 'pending'
+            }, status=status.HTTP_201_CREATED)
             
         except Exception as e:
             return self.handle_exception(e)
@@ -194,13 +274,10 @@ class ConversationViewSet(viewsets.ModelViewSet):
         conversation = self.get_object()
         try:
             # Récupérer le message utilisateur
-            user_message = get_object_or_404(conversation.messages, id=message_id)
+            user_message = get_object_or_404(conversation.bounded_messages(), id=message_id)
             
             # Vérifier si une réponse AI existe
-            ai_message = conversation.messages.filter(
-                parent_message=user_message,
-                role='assistant'
-            ).first()
+            ai_message = user_message.replies.filter(role='assistant').order_by('-seq').first()
             
             if ai_message:
                 return Response({
@@ -208,20 +285,15 @@ class ConversationViewSet(viewsets.ModelViewSet):
                     'ai_message': MessageSerializer(ai_message).data
                 })
             
+            # Réponse en cours de génération en arrière-plan
+            if GenerationService.is_pending(user_message):
+                return Response({'status': 'pending'})
+            
             # Si pas de réponse AI, générer une
             try:
-                from .mistral_client import MistralClient
-                client = MistralClient()
-                ai_response = client.generate_response(user_message.content)
-                
-                # Créer le message AI
-                ai_message = ConversationService.add_message_to_conversation(
-                    conversation=conversation,
-                    content=ai_response,
-                    role='assistant',
-                    parent_message=user_message,
-                    content_type='text'
-                )
+                from .mistral_client import get_client
+                # Tokens and completion are also pushed to /ws/chat/
+                ai_message = GenerationService.reply(user_message, get_client())
                 
                 return Response({
                     'status': 'completed',
@@ -241,6 +313,79 @@ class ConversationViewSet(viewsets.ModelViewSet):
             return self.handle_exception(e)
 
 
+    @action(detail=True, methods=['get'], url_path='messages/(?P<message_id>[^/.]+)/branch')
+    def message_branch(self, request, pk=None, message_id=None):
+        """Messages from the root of the tree down to this message"""
+        conversation = self.get_object()
+        message = get_object_or_404(conversation.bounded_messages(), id=message_id)
+        return Response(self.get_message_list_serializer(MessageTreeService.branch(message)).data)
+    
+    @action(detail=True, methods=['get'], url_path='messages/(?P<message_id>[^/.]+)/alternatives')
+    def message_alternatives(self, request, pk=None, message_id=None):
+        """Sibling versions of this message (regenerations, edits)"""
+        conversation = self.get_object()
+        message = get_object_or_404(conversation.bounded_messages(), id=message_id)
+        return Response(self.get_message_list_serializer(MessageTreeService.alternatives(message)).data)
+    
+    @action(detail=True, methods=['get'], url_path='messages/(?P<message_id>[^/.]+)/revisions')
+    def message_revisions(self, request, pk=None, message_id=None):
+        """Stored revisions of an edited message (0 is the original content)"""
+        conversation = self.get_object()
+        message = get_object_or_404(conversation.bounded_messages(), id=message_id)
+        return Response({
+            'message_id': message.id,
+            'edit_count': message.edit_count,
+            'revisions': RevisionService.history(message),
+        })
+    
+    @action(detail=True, methods=['get'], url_path=r'messages/(?P<message_id>[^/.]+)/revisions/(?P<revision>\d+)')
+    def message_revision(self, request, pk=None, message_id=None, revision=None):
+        """Content of the message at one revision"""
+        conversation = self.get_object()
+        message = get_object_or_404(conversation.bounded_messages(), id=message_id)
+        result = RevisionService.get(message, int(revision))
+        if result is None:
+            return Response({'error': 'Unknown revision'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'message_id': message.id, **result})
+    
+    @action(detail=True, methods=['post'], url_path='messages/(?P<message_id>[^/.]+)/edit')
+    def edit_message(self, request, pk=None, message_id=None):
+        """Edit a user message into a new sibling branch"""
+        conversation = self.get_object()
+        message = get_object_or_404(conversation.bounded_messages(), id=message_id)
+        content = request.data.get('content')
+        if not content:
+            return Response(
+                {'error': 'content is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        new_message = MessageTreeService.edit_into_branch(message, content)
+        return Response({
+            'user_message': MessageSerializer(new_message).data,
+            'status': 'pending'
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'], url_path='messages/(?P<message_id>[^/.]+)/regenerate')
+    def regenerate_message(self, request, pk=None, message_id=None):
+        """Generate an alternative assistant reply as a new sibling branch"""
+        conversation = self.get_object()
+        message = get_object_or_404(conversation.bounded_messages().select_related('parent'), id=message_id)
+        if message.role != 'assistant' or message.parent is None:
+            raise service_exceptions.MessageOrderingError('Only assistant replies can be regenerated')
+        try:
+            from .mistral_client import get_client
+            new_message = MessageTreeService.regenerate(message, get_client())
+        except service_exceptions.ChatBaseException:
+            raise
+        except Exception as e:
+            # En cas d'erreur avec Mistral (503: not stored for an Idempotency-Key retry)
+            return Response({'status': 'error', 'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({
+            'status': 'completed',
+            'ai_message': MessageSerializer(new_message).data
+        }, status=status.HTTP_201_CREATED)
+
+
 class AskMistralView(views.APIView):
     """Vue pour interroger Mistral AI"""
     permission_classes = [IsAuthenticated]
@@ -255,8 +400,8 @@ class AskMistralView(views.APIView):
         
         try:
             # Appeler Mistral et obtenir la réponse
-            from .mistral_client import MistralClient
-            client = MistralClient()
+            from .mistral_client import get_client
+            client = get_client()
             response = client.generate_response(message)
             
             return Response({
@@ -297,4 +442,74 @@ class AskMistralView(views.APIView):
                     status=status.HTTP_201_CREATED
                 )
         except Exception as e:
-            return self.handle_exception(e)
\ No newline at end of file
+            return self.handle_exception(e)
+
+
+class ExportView(views.APIView):
+    """Stream the user's whole chat history as NDJSON"""
+    permission_classes = [IsAuthenticated]
+
+    EXTENSIONS = {'none': 'ndjson', 'gzip': 'ndjson.gz', 'zstd': 'ndjson.zst'}
+
+    def get(self, request):
+        compression = request.query_params.get('compression', 'none')
+        if compression not in available_compressions():
+            return Response(
+                {'error': f'compression must be one of {", ".join(available_compressions())}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        response = StreamingHttpResponse(
+            ExportService.stream(request.user, compression),
+            content_type='application/x-ndjson' if compression == 'none' else 'application/octet-stream'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="conversations.{self.EXTENSIONS[compression]}"'
+        )
+        return response
+
+
+class RawStreamParser(BaseParser):
+    """Expose a raw request body (NDJSON, gzip or zstd) as the ``file`` upload"""
+    media_type = '*/*'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return DataAndFiles({}, {'file': stream})
+
+
+class ImportView(views.APIView):
+    """Import an NDJSON export (multipart ``file`` or raw request body)"""
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, RawStreamParser]
+
+    def post(self, request):
+        source = request.FILES.get('file')
+        if source is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = ExportService.import_stream(request.user, source)
+        except InvalidExportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
+class SyncView(views.APIView):
+    """Changes to the user's conversations and messages since a cursor"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', 0)) or None
+        except ValueError:
+            return Response({'error': 'since and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or (limit is not None and limit < 0):
+            return Response({'error': 'since and limit must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+
+        changes = SyncService.changes_since(request.user, since, limit)
+        return Response({
+            **changes,
+            'conversations': SyncConversationSerializer(changes['conversations'], many=True).data,
+            'messages': SyncMessageSerializer(changes['messages'], many=True).data,
+        })
@@ -0,0 +1,120 @@
+"""
+WebSocket endpoint ``/ws/chat/`` (raw ASGI, routed by config/asgi.py).
+
+The client connects once and receives the events of all its
+conversations (see apps/chat/realtime.py) instead of polling
+``message_status``. Authentication, checked at the handshake:
+
+- ``/ws/chat/?token=<access token>`` (same tokens as the API), or
+- the session cookie, if the ``Origin`` is the site itself or one of
+  ``CSRF_TRUSTED_ORIGINS`` (browsers send cookies cross-site too).
+
+The server sends ``{"type": "ready"}`` once subscribed; events published
+before that are only available through ``/api/chat/sync/``. The client
+may send ``{"type": "ping"}`` and gets ``{"type": "pong"}`` back.
+"""
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.utils.module_loading import import_string
+
+from apps.accounts.cache import load_user
+from apps.accounts.tokens import ACCESS, InvalidToken, decode_token
+from apps.core.events import hub
+
+from .realtime import user_channel
+
+CLOSE_UNAUTHORIZED = 4401
+
+
+def _user_id_from_token(token):
+    try:
+        claims = decode_token(token, ACCESS)
+    except InvalidToken:
+        return None
+    # As for the API: a deleted or deactivated user's token no longer works
+    user = load_user(claims['sub'])
+    if user is None or not user.is_active:
+        return None
+    return user.pk
+
+
+def _user_id_from_session(session_key):
+    session = import_string(settings.SESSION_ENGINE).SessionStore(session_key)
+    # get_user() also checks the session hash (password changes log out)
+    user = get_user(SimpleNamespace(session=session))
+    return user.pk if user.is_authenticated else None
+
+
+def _origin_allowed(headers) -> bool:
+    origin = headers.get(b'origin')
+    if origin is None:
+        # Not a browser
+        return True
+    origin = origin.decode('latin-1')
+    host = headers.get(b'host', b'').decode('latin-1')
+    return urlsplit(origin).netloc == host or origin in settings.CSRF_TRUSTED_ORIGINS
+
+
+async def authenticate(scope):
+    """Id of the connecting user, or None"""
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    if token:
+        return await sync_to_async(_user_id_from_token)(token[0])
+
+    headers = dict(scope.get('headers', ()))
+    cookies = SimpleCookie(headers.get(b'cookie', b'').decode('latin-1'))
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None or not _origin_allowed(headers):
+        return None
+    return await sync_to_async(_user_id_from_session)(morsel.value)
+
+
+async def _send_json(send, data) -> None:
+    await send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+
+async def chat_events(scope, receive, send):
+    """ASGI application of one WebSocket connection"""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    user_id = await authenticate(scope)
+    if user_id is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+    await send({'type': 'websocket.accept'})
+
+    async with hub.subscribe(user_channel(user_id)) as events:
+        await _send_json(send, {'type': 'ready'})
+        incoming = asyncio.ensure_future(receive())
+        outgoing = asyncio.ensure_future(events.get())
+        try:
+            while True:
+                done, _ = await asyncio.wait({incoming, outgoing}, return_when=asyncio.FIRST_COMPLETED)
+                if outgoing in done:
+                    await _send_json(send, outgoing.result())
+                    outgoing = asyncio.ensure_future(events.get())
+                if incoming in done:
+                    message = incoming.result()
+                    if message['type'] == 'websocket.disconnect':
+                        return
+                    if _is_ping(message.get('text')):
+                        await _send_json(send, {'type': 'pong'})
+                    incoming = asyncio.ensure_future(receive())
+        finally:
+            incoming.cancel()
+            outgoing.cancel()
+
+
+def _is_ping(text) -> bool:
+    try:
+        return json.loads(text or '{}').get('type') == 'ping'
+    except (ValueError, AttributeError):
+        return False
@@ -1,3 +1,82 @@
+"""
+Admin helpers for large tables.
+
+The changelist runs ``COUNT(*)`` for its paginator (and a second one for
+the unfiltered total). On PostgreSQL an unfiltered count is replaced by
+the planner's estimate (``pg_class.reltuples``, summed over partitions),
+exact only below ``ADMIN['EXACT_COUNT_BELOW']`` rows.
+
+The date hierarchy is replaced by ``MonthListFilter``: links to ``__gte`` /
+``__lt`` ranges over the last months, computed without a query (the date
+hierarchy lists its years and months with ``SELECT DISTINCT`` over the
+table), which an index on the field or monthly partitions can serve.
+"""
+import datetime
+
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.filters import DateFieldListFilter
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.utils import timezone
+from django.utils.formats import date_format
+from django.utils.functional import cached_property
+
+
+def estimated_count(queryset):
+    """Planner estimate of the rows of the queryset's table, ``None`` when unavailable"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        # A partitioned table has no rows of its own: add up its partitions
+        cursor.execute(
+            'SELECT SUM(GREATEST(c.reltuples, 0)) FROM pg_class c '
+            'WHERE c.oid = to_regclass(%s) '
+            'OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))',
+            [table, table],
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator counting an unfiltered queryset with the planner's estimate"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate >= getattr(settings, 'ADMIN', {}).get('EXACT_COUNT_BELOW', 10000):
+                return estimate
+        return super().count
+
+
+class MonthListFilter(DateFieldListFilter):
+    """``DateFieldListFilter`` plus one link for each of the ``ADMIN['FILTER_MONTHS']`` months before this one"""
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        now = timezone.localtime() if settings.USE_TZ else timezone.now()
+        start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        if not isinstance(field, models.DateTimeField):
+            start = start.date()
+        months = []
+        start = (start - datetime.timedelta(days=1)).replace(day=1)
+        for _ in range(getattr(settings, 'ADMIN', {}).get('FILTER_MONTHS', 12)):
+            months.append((date_format(start, 'YEAR_MONTH_FORMAT'), {
+                self.lookup_kwarg_since: start,
+                self.lookup_kwarg_until: (start + datetime.timedelta(days=32)).replace(day=1),
+            }))
+            start = (start - datetime.timedelta(days=1)).replace(day=1)
+        self.links += tuple(months)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """ModelAdmin for big tables: estimated counts, no full-table count, no facets"""
 
-# Register your models here.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
@@ -0,0 +1,115 @@
+"""In-process background workers that process queued items in batches"""
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWorker:
+    """
+    Daemon thread draining a queue in batches.
+
+    Items are handed to ``handler(batch)`` once ``batch_size`` items are
+    waiting or ``flush_interval`` seconds after the first item of the batch
+    arrived, whichever comes first. The thread starts on the first submit.
+    With ``BACKGROUND_TASKS_EAGER`` the handler runs inline, which keeps
+    tests and management commands deterministic.
+    """
+
+    def __init__(self, name: str, handler, batch_size: int = 20,
+                 flush_interval: float = 0.5, max_queue_size: int = 10000):
+        self.name = name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    @property
+    def eager(self) -> bool:
+        return getattr(settings, 'BACKGROUND_TASKS_EAGER', False)
+
+    def submit(self, item) -> None:
+        """Queue an item; never blocks the caller"""
+        if self.eager:
+            self._handle([item])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            logger.error('%s queue is full, dropping item', self.name)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every queued item has been handled"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout: float = 5) -> None:
+        self.flush(timeout)
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        self._stopping.clear()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            batch = self._collect()
+            if not batch:
+                self.idle()
+                continue
+            try:
+                self._handle(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _handle(self, batch) -> None:
+        close_old_connections()
+        try:
+            self.handler(batch)
+        except Exception:
+            logger.exception('%s failed to handle a batch of %d item(s)', self.name, len(batch))
+        finally:
+            close_old_connections()
+
+    def idle(self) -> None:
+        """Hook called when the queue stayed empty for a while"""
+        pass
@@ -0,0 +1,76 @@
+"""Shared helpers for the ``bench_*`` management commands"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+def measure(func, iterations: int, count_queries: bool = True) -> dict:
+    """Call ``func`` ``iterations`` times, return timing and query stats"""
+    timings = []
+    queries = 0
+    for _ in range(iterations):
+        if count_queries:
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+            queries += len(ctx.captured_queries)
+        else:
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return {
+        'iterations': iterations,
+        'total_s': sum(timings),
+        'mean_us': statistics.mean(timings) * 1e6,
+        'p50_us': statistics.median(timings) * 1e6,
+        'p95_us': sorted(timings)[int(len(timings) * 0.95) - 1] * 1e6 if len(timings) > 1 else timings[0] * 1e6,
+        'queries_per_call': queries / iterations if count_queries else None,
+    }
+
+
+class BenchmarkCommand(BaseCommand):
+    """
+    Base class for benchmark commands.
+    ``run()`` executes inside a transaction that is rolled back afterwards
+    unless ``rollback`` is False (multi-connection benchmarks clean up after
+    themselves instead).
+    """
+
+    default_iterations = 1000
+    rollback = True
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=self.default_iterations)
+
+    def handle(self, *args, **options):
+        if not self.rollback:
+            self.run(**options)
+            return
+        with transaction.atomic():
+            self.run(**options)
+            transaction.set_rollback(True)
+
+    def run(self, **options):
+        raise NotImplementedError
+
+    def report(self, rows, columns):
+        """Print ``rows`` (list of dicts) as an aligned table"""
+        widths = {
+            col: max(len(col), *(len(self._format(row.get(col))) for row in rows))
+            for col in columns
+        }
+        self.stdout.write('  '.join(col.ljust(widths[col]) for col in columns))
+        for row in rows:
+            self.stdout.write('  '.join(self._format(row.get(col)).ljust(widths[col]) for col in columns))
+
+    @staticmethod
+    def _format(value):
+        if value is None:
+            return '-'
+        if isinstance(value, float):
+            return f'{value:,.2f}'
+        return str(value)
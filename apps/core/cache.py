@@ -0,0 +1,322 @@
+"""
+Two-tier cache backend.
+
+``TieredCache`` keeps a small in-process L1 (a few seconds of TTL) in
+front of a shared L2 cache alias (``LOCATION``, e.g. ``'shared'``):
+repeated reads of hot keys skip the network, while every process still
+agrees on the data through L2.
+
+Writes go to L2 first. They are then announced on an invalidation log
+stored in L2 (a sequence counter and a ring of recent keys); every
+process polls the counter at most every ``POLL_INTERVAL`` seconds and
+drops the L1 entries written elsewhere. If it fell too far behind, it
+clears its whole L1.
+
+Atomic operations (``add``, ``incr``, ...) are answered by L2. Locks and
+counters shared between workers should use ``caches['shared']``
+directly rather than this backend.
+
+Hits and misses are counted per key prefix (the part before the first
+``:``) and periodically added to counters in L2, see ``cache_stats``.
+"""
+import pickle
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SEQ_KEY = 'tiered:seq'
+LOG_KEY = 'tiered:log:{}'
+STATS_KEY = 'tiered:stats:{}:{}'
+STATS_PREFIXES_KEY = 'tiered:stats:prefixes'
+STATS_KINDS = ('l1_hits', 'l2_hits', 'misses')
+
+_MISSING = object()
+
+# L1 stores are per process (shared by the per-thread backend instances)
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def key_prefix(key) -> str:
+    return str(key).split(':', 1)[0][:50] if ':' in str(key) else '(other)'
+
+
+class _L1Store:
+    """Process-wide LRU of pickled values with per-entry expiry"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (key, version) -> (expires_at, pickled)
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.origin = uuid.uuid4().hex
+        self.seen_seq = None
+        self.next_poll = 0.0
+        self.next_stats_flush = 0.0
+        self.stats = Counter()  # (prefix, kind) -> count not yet flushed to L2
+
+    def get(self, cache_key):
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is None:
+                return _MISSING
+            if entry[0] <= time.monotonic():
+                del self.entries[cache_key]
+                return _MISSING
+            self.entries.move_to_end(cache_key)
+            pickled = entry[1]
+        return pickle.loads(pickled)
+
+    def set(self, cache_key, value, ttl):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[cache_key] = (time.monotonic() + ttl, pickled)
+            self.entries.move_to_end(cache_key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, cache_key):
+        with self.lock:
+            self.entries.pop(cache_key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def count(self, key, kind):
+        self.stats[key_prefix(key), kind] += 1
+
+
+class TieredCache(BaseCache):
+    """
+    In-process L1 in front of a shared L2 cache alias.
+
+    OPTIONS: ``L1_TIMEOUT`` (seconds an entry stays in L1, default 5),
+    ``L1_MAX_ENTRIES`` (1000), ``POLL_INTERVAL`` (seconds between two
+    reads of the invalidation log, 1), ``LOG_SIZE`` (1000) and
+    ``STATS_FLUSH_INTERVAL`` (10).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location or 'shared'
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.poll_interval = options.get('POLL_INTERVAL', 1)
+        self.log_size = options.get('LOG_SIZE', 1000)
+        self.stats_flush_interval = options.get('STATS_FLUSH_INTERVAL', 10)
+        with _stores_lock:
+            self.l1 = _stores.setdefault(
+                self.shared_alias, _L1Store(options.get('L1_MAX_ENTRIES', 1000))
+            )
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _l1_ttl(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return self.l1_timeout if timeout is None else min(self.l1_timeout, timeout)
+
+    # Reads
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        value = self.l1.get((key, version))
+        if value is not _MISSING:
+            self.l1.count(key, 'l1_hits')
+            return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self.l1.count(key, 'misses')
+            return default
+        self.l1.count(key, 'l2_hits')
+        self.l1.set((key, version), value, self.l1_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found, remaining = {}, []
+        for key in keys:
+            value = self.l1.get((key, version))
+            if value is _MISSING:
+                remaining.append(key)
+            else:
+                self.l1.count(key, 'l1_hits')
+                found[key] = value
+        if remaining:
+            fetched = self.shared.get_many(remaining, version=version)
+            for key in remaining:
+                if key in fetched:
+                    self.l1.count(key, 'l2_hits')
+                    self.l1.set((key, version), fetched[key], self.l1_timeout)
+                else:
+                    self.l1.count(key, 'misses')
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        self._sync()
+        return self.l1.get((key, version)) is not _MISSING or self.shared.has_key(key, version=version)
+
+    # Writes
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._set_local(key, value, timeout, version)
+        self._publish([(key, version)])
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self.shared.add(key, value, timeout, version=version):
+            return False
+        self._set_local(key, value, timeout, version)
+        return True
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._set_local(key, value, timeout, version)
+        self._publish([(key, version) for key in data])
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l1.delete((key, version))
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.l1.delete((key, version))
+        deleted = self.shared.delete(key, version=version)
+        self._publish([(key, version)])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self.l1.delete((key, version))
+        self.shared.delete_many(keys, version=version)
+        self._publish([(key, version) for key in keys])
+
+    def incr(self, key, delta=1, version=None):
+        self.l1.delete((key, version))
+        value = self.shared.incr(key, delta, version=version)
+        self._publish([(key, version)])
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def clear(self):
+        # Wipes the invalidation log too: other processes see the counter
+        # go backwards and clear their L1
+        self.shared.clear()
+        self.l1.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+    def _set_local(self, key, value, timeout, version):
+        ttl = self._l1_ttl(timeout)
+        if ttl <= 0:
+            self.l1.delete((key, version))
+        else:
+            self.l1.set((key, version), value, ttl)
+
+    # Invalidation fan-out
+
+    def _publish(self, cache_keys):
+        """Append the written keys to the invalidation log read by the other processes"""
+        if not cache_keys:
+            return
+        shared = self.shared
+        try:
+            end = shared.incr(SEQ_KEY, len(cache_keys))
+        except ValueError:
+            shared.add(SEQ_KEY, 0, None)
+            end = shared.incr(SEQ_KEY, len(cache_keys))
+        start = end - len(cache_keys) + 1
+        shared.set_many({
+            LOG_KEY.format(seq % self.log_size): (seq, self.l1.origin, cache_key)
+            for seq, cache_key in zip(range(start, end + 1), cache_keys)
+        }, None)
+
+    def _sync(self):
+        """Drop the L1 entries written by other processes since the last poll"""
+        store = self.l1
+        now = time.monotonic()
+        if now < store.next_poll or not store.sync_lock.acquire(blocking=False):
+            return
+        try:
+            store.next_poll = now + self.poll_interval
+            seq = self.shared.get(SEQ_KEY, 0)
+            seen = store.seen_seq
+            store.seen_seq = seq
+            if seen is None:
+                # First poll of this process: nothing older can be in L1
+                return
+            if seq < seen or seq - seen > self.log_size:
+                store.clear()
+            elif seq > seen:
+                expected = range(seen + 1, seq + 1)
+                log = self.shared.get_many([LOG_KEY.format(n % self.log_size) for n in expected])
+                for n in expected:
+                    entry = log.get(LOG_KEY.format(n % self.log_size))
+                    if entry is None or entry[0] != n:
+                        # Slot missing or already reused: we can't know what changed
+                        store.clear()
+                        break
+                    if entry[1] != store.origin:
+                        store.delete(entry[2])
+            if now >= store.next_stats_flush:
+                store.next_stats_flush = now + self.stats_flush_interval
+                self._flush_stats()
+        finally:
+            store.sync_lock.release()
+
+    # Statistics
+
+    def _flush_stats(self):
+        """Add the local hit/miss counts to the counters kept in L2"""
+        store = self.l1
+        pending, store.stats = store.stats, Counter()
+        if not pending:
+            return
+        shared = self.shared
+        prefixes = set(shared.get(STATS_PREFIXES_KEY) or ())
+        new_prefixes = {prefix for prefix, _ in pending} - prefixes
+        if new_prefixes:
+            shared.set(STATS_PREFIXES_KEY, sorted(prefixes | new_prefixes), None)
+        for (prefix, kind), count in pending.items():
+            key = STATS_KEY.format(prefix, kind)
+            try:
+                shared.incr(key, count)
+            except ValueError:
+                if not shared.add(key, count, None):
+                    shared.incr(key, count)
+
+    def stats(self, flush: bool = True) -> dict:
+        """Hit/miss counters per key prefix, summed over every process"""
+        if flush:
+            self._flush_stats()
+        shared = self.shared
+        prefixes = shared.get(STATS_PREFIXES_KEY) or []
+        keys = [STATS_KEY.format(prefix, kind) for prefix in prefixes for kind in STATS_KINDS]
+        counts = shared.get_many(keys)
+        return {
+            prefix: {kind: counts.get(STATS_KEY.format(prefix, kind), 0) for kind in STATS_KINDS}
+            for prefix in prefixes
+        }
+
+    def reset_stats(self) -> None:
+        shared = self.shared
+        prefixes = shared.get(STATS_PREFIXES_KEY) or []
+        shared.delete_many(
+            [STATS_KEY.format(prefix, kind) for prefix in prefixes for kind in STATS_KINDS]
+            + [STATS_PREFIXES_KEY]
+        )
+        self.l1.stats = Counter()
@@ -0,0 +1,112 @@
+"""
+HTTP content codings: gzip (stdlib), br (``brotli``) and zstd
+(``zstandard``), the last two when installed.
+"""
+import gzip
+import io
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# Server preference, best ratio/speed trade-off first
+PREFERENCE = ('zstd', 'br', 'gzip')
+
+DEFAULT_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+
+
+def available_encodings():
+    return [
+        encoding for encoding in PREFERENCE
+        if (encoding != 'br' or brotli is not None) and (encoding != 'zstd' or zstandard is not None)
+    ]
+
+
+def compress(data: bytes, encoding: str, level: int = None) -> bytes:
+    level = DEFAULT_LEVELS[encoding] if level is None else level
+    if encoding == 'gzip':
+        # mtime=0: the same input always gives the same bytes
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f'Unsupported encoding: {encoding!r}')
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'br':
+        return brotli.decompress(data)
+    if encoding == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f'Unsupported encoding: {encoding!r}')
+
+
+class _BrotliReader(io.RawIOBase):
+    """Decompresses a brotli file object as it is read"""
+
+    def __init__(self, fileobj, chunk_size: int = 64 * 1024):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.decompressor = brotli.Decompressor()
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            data = self.fileobj.read(self.chunk_size)
+            if not data:
+                return 0
+            self.pending = self.decompressor.process(data)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size], self.pending = self.pending[:size], self.pending[size:]
+        return size
+
+
+def decompressing_reader(fileobj, encoding: str):
+    """Binary file object reading ``fileobj`` decompressed, without loading it whole"""
+    if encoding == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj)
+    if encoding == 'br':
+        return io.BufferedReader(_BrotliReader(fileobj))
+    if encoding == 'zstd':
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(fileobj))
+    raise ValueError(f'Unsupported encoding: {encoding!r}')
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Codings allowed by an ``Accept-Encoding`` header (``q=0`` excluded)"""
+    accepted = set()
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.add(name)
+    return accepted
+
+
+def negotiate(accept_encoding: str, offered=None):
+    """The preferred coding among ``offered`` that the client accepts, or None"""
+    accepted = accepted_encodings(accept_encoding or '')
+    for encoding in offered or available_encodings():
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
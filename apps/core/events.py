@@ -0,0 +1,247 @@
+"""
+Real-time event fan-out.
+
+``hub.publish(channel, event)`` can be called from any thread or process
+(views, workers). The event goes through the configured broker, which
+delivers it to every process that has subscribers on that channel;
+there, ``EventHub`` copies it into each subscriber's asyncio queue
+(one per WebSocket connection).
+
+Brokers (``REALTIME['BROKER']``):
+
+- ``InMemoryBroker``: delivers in the publishing process only. Enough
+  when one ASGI process serves both the HTTP API and the WebSockets, and
+  for tests.
+- ``DatabaseBroker``: events go through the ``core_event`` table, polled
+  by every process with subscribers. Works across processes with no
+  extra service; fine for moderate traffic and for tests.
+- ``RedisBroker``: Redis pub/sub, for production (needs ``redis``).
+
+Delivery is best effort: a subscriber that can't keep up loses events
+and must catch up with ``/api/chat/sync/``.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BROKER': 'apps.core.events.InMemoryBroker',
+    'OPTIONS': {},
+    'QUEUE_SIZE': 1000,  # events buffered per subscriber
+}
+
+
+def realtime_settings(name):
+    return getattr(settings, 'REALTIME', {}).get(name, DEFAULTS[name])
+
+
+class InMemoryBroker:
+    """Delivers events to the subscribers of the current process"""
+
+    def __init__(self, deliver, **options):
+        self.deliver = deliver
+
+    def publish(self, channel: str, data: str) -> None:
+        self.deliver(channel, data)
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class DatabaseBroker:
+    """
+    Events stored in the ``core_event`` table and polled every
+    ``POLL_INTERVAL`` seconds by the processes that have subscribers.
+    Rows older than ``RETENTION`` seconds are deleted by the publishers.
+    """
+
+    def __init__(self, deliver, POLL_INTERVAL=0.1, RETENTION=60, **options):
+        self.deliver = deliver
+        self.poll_interval = POLL_INTERVAL
+        self.retention = RETENTION
+        self._thread = None
+        self._stopping = threading.Event()
+        self._next_prune = 0.0
+
+    def publish(self, channel: str, data: str) -> None:
+        from .models import Event
+
+        Event.objects.create(channel=channel, payload=data)
+        now = time.monotonic()
+        if now >= self._next_prune:
+            self._next_prune = now + self.retention
+            Event.objects.filter(
+                created_at__lt=timezone.now() - timedelta(seconds=self.retention)
+            ).delete()
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='event-broker', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(5)
+        self._thread = None
+
+    def _run(self) -> None:
+        from .models import Event
+
+        # Only the events published from now on
+        last_id = Event.objects.aggregate(last=Max('id'))['last'] or 0
+        while not self._stopping.wait(self.poll_interval):
+            try:
+                events = list(
+                    Event.objects.filter(id__gt=last_id).order_by('id').values_list(
+                        'id', 'channel', 'payload'
+                    )[:500]
+                )
+            except Exception:
+                logger.exception('Polling the event table failed')
+                close_old_connections()
+                continue
+            for event_id, channel, payload in events:
+                last_id = event_id
+                self.deliver(channel, payload)
+        close_old_connections()
+
+
+class RedisBroker:
+    """Redis pub/sub (``OPTIONS``: ``URL``, ``PREFIX``)"""
+
+    def __init__(self, deliver, URL='redis://localhost:6379/0', PREFIX='events:', **options):
+        if redis is None:
+            raise ImportError('RedisBroker requires the redis package')
+        self.deliver = deliver
+        self.prefix = PREFIX
+        self.client = redis.Redis.from_url(URL)
+        self._pubsub = None
+        self._thread = None
+
+    def publish(self, channel: str, data: str) -> None:
+        self.client.publish(self.prefix + channel, data)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(**{self.prefix + '*': self._on_message})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._thread.stop()
+            self._pubsub.close()
+        self._thread = None
+
+    def _on_message(self, message) -> None:
+        channel = message['channel'].decode()[len(self.prefix):]
+        self.deliver(channel, message['data'].decode())
+
+
+class _Subscriber:
+    __slots__ = ('loop', 'queue', 'dropped')
+
+    def __init__(self, loop, queue):
+        self.loop = loop
+        self.queue = queue
+        self.dropped = 0
+
+    def push(self, event) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+
+class EventHub:
+    """Routes published events to the local subscribers of each channel"""
+
+    def __init__(self):
+        self._broker = None
+        self._lock = threading.Lock()
+        self._subscribers = {}  # channel -> set of _Subscriber
+
+    @property
+    def broker(self):
+        if self._broker is None:
+            with self._lock:
+                if self._broker is None:
+                    broker_class = import_string(realtime_settings('BROKER'))
+                    self._broker = broker_class(self._deliver, **realtime_settings('OPTIONS'))
+        return self._broker
+
+    def publish(self, channel: str, event: dict) -> None:
+        """Send an event to every subscriber of ``channel``, in any process"""
+        try:
+            self.broker.publish(channel, json.dumps(event, default=str))
+        except Exception:
+            # Real-time delivery is best effort, never fail the request
+            logger.exception('Publishing an event on %s failed', channel)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        """Async context manager yielding an ``asyncio.Queue`` of events"""
+        subscriber = _Subscriber(
+            asyncio.get_running_loop(), asyncio.Queue(maxsize=realtime_settings('QUEUE_SIZE'))
+        )
+        broker = self.broker
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+        broker.start()
+        try:
+            yield subscriber.queue
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(channel)
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[channel]
+            if subscriber.dropped:
+                logger.warning('%d event(s) dropped for a slow subscriber of %s', subscriber.dropped, channel)
+
+    def _deliver(self, channel: str, data: str) -> None:
+        """Called by the broker (from any thread) for each incoming event"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        if not subscribers:
+            return
+        event = json.loads(data)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.push, event)
+            except RuntimeError:
+                # Event loop closed
+                pass
+
+    def reset(self) -> None:
+        """Stop the broker; the next use builds it again from the settings"""
+        with self._lock:
+            broker, self._broker = self._broker, None
+        if broker is not None:
+            broker.stop()
+
+
+hub = EventHub()
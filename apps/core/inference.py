@@ -0,0 +1,236 @@
+"""
+Batched model inference for work that doesn't need interactive latency.
+
+A job (``InferenceJob``) knows how to pack several inputs into one prompt
+and how to split the answer back into one result per input.
+``BatchInference.run()`` cuts the inputs into packs of ``PACK_SIZE``,
+sends the packs with at most ``CONCURRENCY`` calls in flight (or hands
+them all to the provider's own batch mode, ``complete_many``) and returns
+the results in input order with the run's statistics: throughput, token
+counts and cost per item.
+
+Providers (``BATCH_INFERENCE['PROVIDER']``):
+
+- ``mistral``: ``MistralClient`` (one chat completion per pack)
+- ``stub``: local, deterministic answers built by the job itself, with
+  an optional simulated latency; for tests and benchmarks
+"""
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_JSON_OBJECT_RE = re.compile(r'\{.*\}', re.S)
+
+
+def inference_settings(name):
+    defaults = {
+        'PROVIDER': 'mistral',
+        'PACK_SIZE': 10,
+        'CONCURRENCY': 4,
+        'PRICES': {},
+        'STUB_LATENCY': 0.0,
+    }
+    return getattr(settings, 'BATCH_INFERENCE', {}).get(name, defaults[name])
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token), good enough for cost estimates"""
+    return len(text) // 4 + 1 if text else 0
+
+
+def parse_numbered_json(response: str, count: int) -> Dict[int, object]:
+    """
+    Values of a ``{"1": ..., "2": ...}`` answer by 0-based position.
+    Text around the object is ignored, as are numbers out of range.
+    """
+    match = _JSON_OBJECT_RE.search(response or '')
+    try:
+        data = json.loads(match.group(0)) if match else None
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    values = {}
+    for key, value in data.items():
+        try:
+            index = int(key) - 1
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < count:
+            values[index] = value
+    return values
+
+
+class InferenceJob:
+    """A kind of task: prompt packing and answer splitting"""
+
+    name = 'job'
+
+    def build_prompt(self, inputs: List) -> str:
+        raise NotImplementedError
+
+    def parse(self, response: str, count: int) -> Dict[int, object]:
+        """Results by 0-based position; missing or invalid ones are left out"""
+        raise NotImplementedError
+
+    def stub_response(self, inputs: List) -> str:
+        """Plausible answer for the stub provider"""
+        raise NotImplementedError
+
+
+class InferenceRequest:
+    """One provider call: a pack of inputs and its prompt"""
+
+    def __init__(self, job: InferenceJob, inputs: List, prompt: str):
+        self.job = job
+        self.inputs = inputs
+        self.prompt = prompt
+
+
+class ClientProvider:
+    """Provider calling ``client.generate_response(prompt)``"""
+
+    def __init__(self, client, name: str = 'client'):
+        self.client = client
+        self.name = name
+
+    def complete(self, request: InferenceRequest) -> str:
+        return self.client.generate_response(request.prompt)
+
+
+class StubProvider:
+    """Local provider: the job answers itself after ``latency`` seconds"""
+
+    name = 'stub'
+
+    def __init__(self, latency: Optional[float] = None):
+        self.latency = inference_settings('STUB_LATENCY') if latency is None else latency
+        self.calls = 0
+
+    def complete(self, request: InferenceRequest) -> str:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return request.job.stub_response(request.inputs)
+
+
+def get_provider(name: Optional[str] = None):
+    name = name or inference_settings('PROVIDER')
+    if name == 'stub':
+        return StubProvider()
+    if name == 'mistral':
+        from apps.chat.mistral_client import get_client
+        return ClientProvider(get_client(), name='mistral')
+    raise ValueError(f'Unknown inference provider: {name!r}')
+
+
+class InferenceStats:
+    """Counters of a run; cost uses ``PRICES[provider]`` (input, output) per million tokens"""
+
+    def __init__(self, provider_name: str):
+        self.provider_name = provider_name
+        self.items = 0
+        self.completed = 0
+        self.calls = 0
+        self.failed_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.elapsed = 0.0
+
+    @property
+    def failed(self) -> int:
+        return self.items - self.completed
+
+    @property
+    def items_per_second(self) -> float:
+        return self.completed / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def cost(self) -> float:
+        input_price, output_price = inference_settings('PRICES').get(self.provider_name, (0.0, 0.0))
+        return (self.prompt_tokens * input_price + self.completion_tokens * output_price) / 1e6
+
+    @property
+    def cost_per_item(self) -> float:
+        return self.cost / self.completed if self.completed else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'provider': self.provider_name,
+            'items': self.items,
+            'completed': self.completed,
+            'failed': self.failed,
+            'calls': self.calls,
+            'failed_calls': self.failed_calls,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'elapsed_s': self.elapsed,
+            'items_per_s': self.items_per_second,
+            'cost': self.cost,
+            'cost_per_item': self.cost_per_item,
+        }
+
+
+class BatchInference:
+    """Runs a job over many inputs, several inputs per model call"""
+
+    def __init__(self, provider=None, pack_size: Optional[int] = None, concurrency: Optional[int] = None):
+        self.provider = provider if provider is not None else get_provider()
+        self.pack_size = max(pack_size or inference_settings('PACK_SIZE'), 1)
+        self.concurrency = max(concurrency or inference_settings('CONCURRENCY'), 1)
+
+    def run(self, job: InferenceJob, inputs: List) -> Tuple[List, InferenceStats]:
+        """Results aligned with ``inputs`` (None where the model gave none)"""
+        stats = InferenceStats(getattr(self.provider, 'name', type(self.provider).__name__))
+        stats.items = len(inputs)
+        results = [None] * len(inputs)
+        if not inputs:
+            return results, stats
+
+        requests = [
+            InferenceRequest(job, inputs[start:start + self.pack_size], None)
+            for start in range(0, len(inputs), self.pack_size)
+        ]
+        for request in requests:
+            request.prompt = job.build_prompt(request.inputs)
+
+        start = time.perf_counter()
+        if hasattr(self.provider, 'complete_many'):
+            # Provider-side batch mode: one submission for every pack
+            try:
+                responses = list(self.provider.complete_many(requests))
+            except Exception:
+                logger.exception('%s batch failed (%d packs)', job.name, len(requests))
+                responses = [None] * len(requests)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(requests))) as executor:
+                responses = list(executor.map(lambda request: self._complete(job, request), requests))
+        stats.elapsed = time.perf_counter() - start
+
+        offset = 0
+        for request, response in zip(requests, responses):
+            stats.calls += 1
+            stats.prompt_tokens += estimate_tokens(request.prompt)
+            if response is None:
+                stats.failed_calls += 1
+            else:
+                stats.completion_tokens += estimate_tokens(response)
+                for index, result in job.parse(response, len(request.inputs)).items():
+                    results[offset + index] = result
+            offset += len(request.inputs)
+        stats.completed = sum(result is not None for result in results)
+        return results, stats
+
+    def _complete(self, job: InferenceJob, request: InferenceRequest) -> Optional[str]:
+        try:
+            return self.provider.complete(request)
+        except Exception:
+            logger.exception('%s call failed (%d items)', job.name, len(request.inputs))
+            return None
@@ -0,0 +1,118 @@
+"""
+Outbound mail queue.
+
+Views hand messages (or callables building them) to ``mail_queue`` and
+return immediately. A background worker sends them in batches over one
+SMTP connection that is kept open between batches, retrying failures
+with exponential backoff.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from .background import BatchWorker
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 50,
+    'FLUSH_INTERVAL': 0.5,  # seconds
+    'MAX_RETRIES': 3,
+    'RETRY_BACKOFF': 2.0,  # seconds, doubled on each attempt
+    'CONNECTION_KEEPALIVE': 60,  # seconds an idle connection stays open
+}
+
+
+def mail_settings(name):
+    return getattr(settings, 'MAIL_QUEUE', {}).get(name, DEFAULTS[name])
+
+
+class BatchingEmailSender:
+    """Send batches of messages over a reused connection"""
+
+    def __init__(self):
+        self.connection = None
+        self.last_used = 0.0
+
+    def _open(self):
+        if self.connection is not None and time.monotonic() - self.last_used > mail_settings('CONNECTION_KEEPALIVE'):
+            self.close()
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                logger.warning('Error while closing the mail connection', exc_info=True)
+            self.connection = None
+
+    def __call__(self, batch):
+        messages = []
+        for item in batch:
+            # Callables are built here so the request never pays for it;
+            # one failing builder doesn't cost the rest of the batch
+            try:
+                message = item() if callable(item) else item
+            except Exception:
+                logger.exception('Failed to build a queued mail, dropping it')
+                continue
+            if message is not None:
+                messages.append(message)
+        if messages:
+            self.send(messages)
+
+    def send(self, messages):
+        pending = list(messages)
+        max_retries = mail_settings('MAX_RETRIES')
+
+        for attempt in range(max_retries + 1):
+            failed = []
+            try:
+                connection = self._open()
+            except Exception:
+                logger.warning('Could not open mail connection (attempt %d)', attempt + 1, exc_info=True)
+                failed = pending
+            else:
+                for message in pending:
+                    try:
+                        connection.send_messages([message])
+                    except Exception:
+                        logger.warning('Failed to send mail to %s (attempt %d)', message.to, attempt + 1, exc_info=True)
+                        failed.append(message)
+                self.last_used = time.monotonic()
+
+            if not failed:
+                return
+            # The connection is likely broken, start the next attempt afresh
+            self.close()
+            pending = failed
+            if attempt < max_retries:
+                time.sleep(mail_settings('RETRY_BACKOFF') * (2 ** attempt))
+
+        for message in pending:
+            logger.error('Giving up sending mail to %s after %d attempts', message.to, max_retries + 1)
+
+
+class MailQueue(BatchWorker):
+    def __init__(self):
+        self.sender = BatchingEmailSender()
+        super().__init__(
+            'mail-queue',
+            self.sender,
+            batch_size=mail_settings('BATCH_SIZE'),
+            flush_interval=mail_settings('FLUSH_INTERVAL'),
+        )
+
+    def idle(self):
+        if self.sender.connection is not None and \
+                time.monotonic() - self.sender.last_used > mail_settings('CONNECTION_KEEPALIVE'):
+            self.sender.close()
+
+
+mail_queue = MailQueue()
@@ -0,0 +1,26 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Show the hit/miss counters of the tiered cache per key prefix (all processes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters afterwards')
+
+    def handle(self, *args, reset, **options):
+        if not hasattr(cache, 'stats'):
+            raise CommandError('The default cache is not a TieredCache')
+
+        stats = cache.stats()
+        self.stdout.write(f"{'prefix':<30} {'l1_hits':>10} {'l2_hits':>10} {'misses':>10} {'hit_rate':>9}")
+        for prefix, counts in sorted(stats.items()):
+            total = sum(counts.values())
+            hit_rate = (counts['l1_hits'] + counts['l2_hits']) / total if total else 0
+            self.stdout.write(
+                f"{prefix:<30} {counts['l1_hits']:>10} {counts['l2_hits']:>10} "
+                f"{counts['misses']:>10} {hit_rate:>8.1%}"
+            )
+        if reset:
+            cache.reset_stats()
+            self.stdout.write('Counters reset')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.smtp_sink import SMTPSink
+
+
+class Command(BaseCommand):
+    help = 'Run a local SMTP server that accepts and prints every message'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+
+    def handle(self, *args, host, port, **options):
+        def on_message(sender, recipients, message):
+            self.stdout.write(f"{sender} -> {', '.join(recipients)}: {message['Subject']}")
+
+        sink = SMTPSink(host, port, on_message=on_message)
+        self.stdout.write(f'SMTP sink listening on {host}:{sink.address[1]}')
+        try:
+            sink.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sink.stop()
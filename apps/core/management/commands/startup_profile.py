@@ -0,0 +1,112 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+from apps.core.benchmark import BenchmarkCommand
+
+# Runs in a fresh interpreter under -X importtime; the phase timings go to stdout
+PROFILE_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+phases = {}
+import django
+django.setup()
+phases['django.setup'] = time.perf_counter() - start
+mark = time.perf_counter()
+if sys.argv[1] == 'asgi':
+    import config.asgi
+elif sys.argv[1] == 'wsgi':
+    import config.wsgi
+else:
+    from apps.core.startup import load_urlconf
+    load_urlconf()
+phases[sys.argv[1]] = time.perf_counter() - mark
+if sys.argv[1] == 'urlconf' and sys.argv[2:]:
+    from apps.core.startup import prewarm
+    for hook, seconds in prewarm(sys.argv[2].split(',')).items():
+        phases['prewarm ' + hook] = seconds
+phases['total'] = time.perf_counter() - start
+print(json.dumps(phases))
+'''
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Cold start of a worker in a fresh interpreter: time of each phase, and the '
+        'modules and packages that cost the most to import (python -X importtime)'
+    )
+    default_iterations = 3
+    rollback = False
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--target', choices=['urlconf', 'wsgi', 'asgi'], default='wsgi',
+                            help='What a worker imports after django.setup()')
+        parser.add_argument('--prewarm', default=None,
+                            help='Comma-separated prewarm hooks to time (urlconf target; default STARTUP["PREWARM"])')
+        parser.add_argument('--top', type=int, default=15)
+
+    def cold_start(self, target, prewarm):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings')}
+        if target != 'urlconf':
+            # wsgi.py/asgi.py run the hooks themselves
+            env['STARTUP_PREWARM'] = prewarm
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROFILE_SCRIPT, target, prewarm],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        imports = {}
+        for line in result.stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package"
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            imports[name.strip()] = (int(self_us), int(cumulative_us))
+        return json.loads(result.stdout.strip().splitlines()[-1]), imports
+
+    def run(self, iterations, target, prewarm, top, **options):
+        if prewarm is None:
+            prewarm = ','.join(getattr(settings, 'STARTUP', {}).get('PREWARM', []))
+        runs = [self.cold_start(target, prewarm) for _ in range(iterations)]
+
+        phases = defaultdict(list)
+        for run_phases, _ in runs:
+            for phase, seconds in run_phases.items():
+                phases[phase].append(seconds)
+        self.stdout.write(f'{iterations} cold start(s), target {target}, prewarm {prewarm or "-"}')
+        self.report(
+            [{'phase': phase, 'median_ms': statistics.median(values) * 1e3, 'max_ms': max(values) * 1e3}
+             for phase, values in phases.items()],
+            ['phase', 'median_ms', 'max_ms'],
+        )
+
+        # Median over the runs of each module's own and cumulative import time
+        modules = defaultdict(lambda: ([], []))
+        for _, imports in runs:
+            for name, (self_us, cumulative_us) in imports.items():
+                modules[name][0].append(self_us)
+                modules[name][1].append(cumulative_us)
+        rows = [
+            {'module': name, 'self_ms': statistics.median(own) / 1e3, 'cumulative_ms': statistics.median(cumulative) / 1e3}
+            for name, (own, cumulative) in modules.items()
+        ]
+        packages = defaultdict(float)
+        for row in rows:
+            packages[row['module'].split('.')[0]] += row['self_ms']
+
+        self.stdout.write('')
+        self.stdout.write(f'Import time: {sum(packages.values()):,.1f} ms in {len(rows)} modules')
+        self.report(
+            [{'package': name, 'self_ms': ms} for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:top]],
+            ['package', 'self_ms'],
+        )
+        self.stdout.write('')
+        self.report(sorted(rows, key=lambda row: -row['cumulative_ms'])[:top], ['module', 'self_ms', 'cumulative_ms'])
@@ -0,0 +1,34 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from apps.core.routers import replica_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the SQLite primary into the SQLite replicas, to exercise the '
+        'replica routing locally (replication lag = time since the last sync)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*', help='Replicas to refresh (all by default)')
+
+    def handle(self, *args, aliases, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Only SQLite databases can be synced locally; use real replication')
+
+        for alias in aliases or replica_aliases():
+            replica = connections[alias]
+            if replica.vendor != 'sqlite':
+                raise CommandError(f'{alias} is not a SQLite database')
+            source = sqlite3.connect(primary.settings_dict['NAME'])
+            target = sqlite3.connect(replica.settings_dict['NAME'])
+            try:
+                source.backup(target)
+            finally:
+                source.close()
+                target.close()
+            self.stdout.write(f'{alias} synced from {DEFAULT_DB_ALIAS}')
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .compression import compress, negotiate
+from .routers import pin_to_primary
+
+COMPRESSION_DEFAULTS = {
+    'MIN_SIZE': 1024,  # bytes; smaller bodies go out as they are
+    'PATH_PREFIXES': ('/api/chat/',),
+    'CONTENT_TYPES': ('application/json', 'text/'),
+    'ENCODINGS': None,  # server preference, default: every available coding
+    'LEVELS': {},  # coding -> level
+}
+
+
+def compression_settings(name):
+    return getattr(settings, 'RESPONSE_COMPRESSION', {}).get(name, COMPRESSION_DEFAULTS[name])
+
+
+class PrimaryStickinessMiddleware:
+    """
+    After a successful write, pin the user to the primary database so the
+    following reads don't hit a replica that hasn't replayed it yet.
+    Runs on the way out, when DRF has already authenticated ``request.user``.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in self.SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(getattr(request, 'user', None))
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Compress API responses with the best coding the client accepts
+    (zstd, br or gzip, see apps/core/compression.py), above
+    ``RESPONSE_COMPRESSION['MIN_SIZE']`` bytes. Streaming responses (the
+    export has its own compression) and already encoded ones are left
+    alone.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not request.path.startswith(tuple(compression_settings('PATH_PREFIXES'))):
+            return response
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(tuple(compression_settings('CONTENT_TYPES'))):
+            return response
+        # Vary even when not compressed: the next client may accept a coding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < compression_settings('MIN_SIZE'):
+            return response
+
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), compression_settings('ENCODINGS'))
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding, compression_settings('LEVELS').get(encoding))
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The encoded body is a different representation
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import compression
+from .routers import is_pinned_to_primary, use_replicas
+
+
+class ReplicaReadMixin:
+    """
+    Serve the read-only actions listed in ``replica_actions`` from a read
+    replica, unless the user has just written (see ``pin_to_primary``).
+    """
+
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            request.method in ('GET', 'HEAD')
+            and getattr(self, 'action', None) in self.replica_actions
+            and not is_pinned_to_primary(request.user)
+        ):
+            self._replica_reads = use_replicas()
+            self._replica_reads.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica_reads = getattr(self, '_replica_reads', None)
+        if replica_reads is not None:
+            self._replica_reads = None
+            replica_reads.__exit__(None, None, None)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class _NotModified(APIException):
+    status_code = 304
+
+
+class ConditionalGetMixin:
+    """
+    ``ETag``/``Last-Modified`` validators for the GET actions listed in
+    ``conditional_actions``.
+
+    ``get_validators()`` returns the state the response is derived from
+    (any hashable values) and its last modification date, computed with a
+    cheap query. When the client already holds that version the view is
+    not run at all and a bodiless 304 is returned. Place this mixin before
+    ``ReplicaReadMixin`` so validators and body come from the same database.
+    """
+
+    conditional_actions = ('list', 'retrieve')
+    # Bump when the serialized representation changes
+    representation_version = 1
+
+    def get_validators(self):
+        """Return ``(state, last_modified)`` for the current request, or None"""
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._validators = None
+        if request.method not in ('GET', 'HEAD') or getattr(self, 'action', None) not in self.conditional_actions:
+            return
+        validators = self.get_validators()
+        if validators is None:
+            return
+        state, last_modified = validators
+        digest = hashlib.sha1(repr((
+            self.representation_version, request.user.pk, request.get_full_path(), state
+        )).encode()).hexdigest()
+        # HTTP dates have a one-second resolution: compare on whole seconds
+        self._validators = (quote_etag(digest), int(last_modified.timestamp()) if last_modified else None)
+        etag, timestamp = self._validators
+        if get_conditional_response(request._request, etag=etag, last_modified=timestamp) is not None:
+            raise _NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _NotModified):
+            return self._set_validators(Response(status=304))
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if response.status_code == 200:
+            self._set_validators(response)
+        return response
+
+    def _set_validators(self, response):
+        validators = getattr(self, '_validators', None)
+        if validators is None:
+            return response
+        etag, timestamp = validators
+        # Precomputed compressed bodies are a different representation
+        response['ETag'] = 'W/' + etag if response.has_header('Content-Encoding') else etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        # Per-user data: browsers may keep it but must revalidate every time
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+def _idempotency_setting(name, default):
+    return getattr(settings, 'IDEMPOTENCY', {}).get(name, default)
+
+
+class _Replay(APIException):
+    def __init__(self, response):
+        self.response = response
+
+
+class _InFlight(APIException):
+    status_code = 409
+    default_detail = 'A request with this Idempotency-Key is still in progress'
+
+
+class _KeyReused(APIException):
+    status_code = 422
+    default_detail = 'This Idempotency-Key was used for a different request'
+
+
+_next_purge = 0.0
+
+
+class IdempotencyMixin:
+    """
+    ``Idempotency-Key`` header support for the POST actions listed in
+    ``idempotent_actions``.
+
+    The first request with a key reserves it (``IdempotencyKey`` row) and
+    its response is stored, compressed, for ``IDEMPOTENCY['TTL']``
+    seconds. A retry with the same key gets the stored response back
+    (``Idempotent-Replayed: true``) without the view running. A retry
+    arriving while the first request is in flight waits for it, up to
+    ``WAIT_TIMEOUT`` seconds, then gets a 409. Server errors and transient
+    answers (409, 429) are not stored: the key is released for the retry.
+    """
+
+    idempotent_actions = ()
+    idempotency_header = 'Idempotency-Key'
+    # Responses the retry must not get back
+    transient_statuses = (409, 429)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._idempotency_record = None
+        if request.method != 'POST' or getattr(self, 'action', None) not in self.idempotent_actions:
+            return
+        key = request.headers.get(self.idempotency_header)
+        if not key:
+            return
+        if len(key) > 255:
+            raise ValidationError({'error': f'{self.idempotency_header} is longer than 255 characters'})
+        data = dict(request.data.items()) if hasattr(request.data, 'items') else request.data
+        fingerprint = hashlib.sha256(json.dumps(
+            [request.method, request.path, data], cls=JSONEncoder, sort_keys=True
+        ).encode()).hexdigest()
+        self._idempotency_record = self._reserve_idempotency_key(request.user, key, fingerprint)
+
+    def _reserve_idempotency_key(self, user, key, fingerprint):
+        from .models import IdempotencyKey
+
+        self._purge_idempotency_keys()
+        deadline = time.monotonic() + _idempotency_setting('WAIT_TIMEOUT', 30)
+        while True:
+            now = timezone.now()
+            try:
+                # Committed right away, so concurrent duplicates see the reservation
+                with transaction.atomic():
+                    return IdempotencyKey.objects.create(
+                        user=user, key=key, fingerprint=fingerprint,
+                        expires_at=now + timedelta(seconds=_idempotency_setting('PENDING_TIMEOUT', 120)),
+                    )
+            except IntegrityError:
+                pass
+            record = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if record is None:
+                continue
+            if record.fingerprint != fingerprint:
+                raise _KeyReused()
+            if record.response_status is not None and record.expires_at > now:
+                raise _Replay(self._stored_response(record))
+            if record.expires_at <= now:
+                # Expired, or the first request died before answering
+                IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+                continue
+            if time.monotonic() >= deadline:
+                raise _InFlight()
+            time.sleep(_idempotency_setting('POLL_INTERVAL', 0.1))
+
+    @staticmethod
+    def _stored_response(record):
+        body = bytes(record.response_body)
+        if record.encoding:
+            body = compression.decompress(body, record.encoding)
+        response = Response(json.loads(body) if body else None, status=record.response_status)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    @staticmethod
+    def _purge_idempotency_keys():
+        global _next_purge
+        from .models import IdempotencyKey
+
+        now = time.monotonic()
+        if now >= _next_purge:
+            _next_purge = now + _idempotency_setting('PURGE_INTERVAL', 300)
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _Replay):
+            return exc.response
+        if isinstance(exc, (_InFlight, _KeyReused)):
+            return Response({'error': str(exc.detail)}, status=exc.status_code)
+        try:
+            return super().handle_exception(exc)
+        except Exception:
+            # Unhandled error: the retry may run the request again
+            record = getattr(self, '_idempotency_record', None)
+            if record is not None:
+                self._idempotency_record = None
+                record.delete()
+            raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        from .models import IdempotencyKey
+
+        response = super().finalize_response(request, response, *args, **kwargs)
+        record = getattr(self, '_idempotency_record', None)
+        if record is None:
+            return response
+        self._idempotency_record = None
+        if response.status_code >= 500 or response.status_code in self.transient_statuses:
+            record.delete()
+            return response
+        data = getattr(response, 'data', None)
+        body = b'' if data is None else json.dumps(data, cls=JSONEncoder).encode()
+        encoding = ''
+        if len(body) > _idempotency_setting('COMPRESS_ABOVE', 512):
+            encoding = compression.available_encodings()[0]
+            body = compression.compress(body, encoding)
+        # Past PENDING_TIMEOUT a retry may have taken the key over: the
+        # reservation is then gone (or answered), and no row is updated
+        IdempotencyKey.objects.filter(
+            pk=record.pk, fingerprint=record.fingerprint, response_status__isnull=True
+        ).update(
+            response_status=response.status_code, response_body=body, encoding=encoding,
+            expires_at=timezone.now() + timedelta(seconds=_idempotency_setting('TTL', 86400)),
+        )
+        return response
@@ -1,3 +1,37 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class Event(models.Model):
+    """Event in transit through ``DatabaseBroker`` (see apps/core/events.py)"""
+    channel = models.CharField(max_length=100)
+    payload = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = 'core_event'
+
+
+class IdempotencyKey(models.Model):
+    """
+    First response to a request sent with an ``Idempotency-Key`` header
+    (see ``IdempotencyMixin``). ``response_status`` is null while the
+    first request is in flight; the row is deleted after ``expires_at``.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text='Hash of the method, path and body of the request')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.BinaryField(blank=True, default=b'')
+    encoding = models.CharField(max_length=10, blank=True, help_text='Compression of response_body (gzip, br, zstd)')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'Idempotency key {self.key!r} of user {self.user_id}'
+
+    class Meta:
+        db_table = 'core_idempotency_key'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='core_idempotency_user_key'),
+        ]
@@ -0,0 +1,36 @@
+"""
+JSON renderer backed by orjson (optional dependency).
+
+Produces the same bytes as DRF's ``JSONRenderer`` with the default
+settings (compact, UTF-8, ``\\u2028``/``\\u2029`` escaped), several
+times faster on large payloads. Known differences: floats written in
+exponent notation (``1e16`` instead of ``1e+16``) and NaN/infinity
+(``null`` instead of an error). Without orjson, or for what orjson can't
+encode (integers over 64 bits), it falls back to ``JSONRenderer``.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                # Datetimes, decimals, lazy strings... as DRF's encoder writes them
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except (orjson.JSONEncodeError, TypeError):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same as JSONRenderer: keep the output a strict JavaScript subset
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
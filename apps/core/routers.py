@@ -0,0 +1,73 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default``. Reads go to a replica only inside
+``use_replicas()`` (opened by ``ReplicaReadMixin`` for read-only
+endpoints) and never for a user who wrote recently: ``pin_to_primary``
+marks the user for ``READ_REPLICAS['STICKY_SECONDS']`` so they read
+their own writes while the replicas catch up.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_reading_from_replica = ContextVar('reading_from_replica', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def _sticky_key(user_id):
+    return f'db:primary-pin:{user_id}'
+
+
+def pin_to_primary(user) -> None:
+    """Serve this user's reads from the primary for the next few seconds"""
+    if user is None or not user.is_authenticated or not replica_aliases():
+        return
+    timeout = getattr(settings, 'READ_REPLICAS', {}).get('STICKY_SECONDS', 5)
+    # Shared tier: the next request may land on another worker
+    caches['shared'].set(_sticky_key(user.pk), True, timeout)
+
+
+def is_pinned_to_primary(user) -> bool:
+    return user is not None and user.is_authenticated and bool(caches['shared'].get(_sticky_key(user.pk)))
+
+
+@contextmanager
+def use_replicas(enabled: bool = True):
+    """Route the reads of the enclosed block to a replica (if any)"""
+    token = _reading_from_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _reading_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Database router for ``DATABASE_ROUTERS``"""
+
+    def db_for_read(self, model, **hints):
+        if not _reading_from_replica.get():
+            return DEFAULT_DB_ALIAS
+        # A transaction on the primary must see its own rows
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = replica_aliases()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication
+        return db == DEFAULT_DB_ALIAS
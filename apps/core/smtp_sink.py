@@ -0,0 +1,104 @@
+"""
+Minimal local SMTP server that accepts and keeps every message.
+Point EMAIL_HOST/EMAIL_PORT at it to exercise the mail queue end to end.
+"""
+import email
+import socketserver
+import threading
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        sink = self.server.sink
+        sink.connections += 1
+        self.reply('220 localhost smtp-sink ready')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command[:4].upper()
+
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                sender, recipients = command.split(':', 1)[1].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b'.\r\n', b'.\n'):
+                        break
+                    # Undo dot-stuffing
+                    data.append(chunk[1:] if chunk.startswith(b'..') else chunk)
+                if sink.fail_next > 0:
+                    sink.fail_next -= 1
+                    self.reply('451 Temporary failure')
+                    continue
+                sink.store(sender, recipients, b''.join(data))
+                self.reply('250 OK')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """
+    Accepts messages on ``host:port`` (port 0 picks a free one).
+    ``fail_next`` makes the next N deliveries fail with a 451, to
+    exercise retries.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, on_message=None):
+        self.messages = []
+        self.connections = 0
+        self.fail_next = 0
+        self.on_message = on_message
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _SMTPHandler)
+        self._server.sink = self
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def store(self, sender, recipients, raw: bytes):
+        message = email.message_from_bytes(raw)
+        with self._lock:
+            self.messages.append({'from': sender, 'to': recipients, 'message': message})
+        if self.on_message:
+            self.on_message(sender, recipients, message)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,62 @@
+"""
+Process start-up.
+
+Heavy dependencies (langchain, numpy) are imported on first use, which
+keeps workers quick to start but moves that cost to the first request.
+``prewarm()``, called by ``config/wsgi.py`` and ``config/asgi.py`` once
+the application is built, pays it up front for the hooks listed in
+``STARTUP['PREWARM']``: names of ``HOOKS`` below or dotted paths to
+callables. ``python manage.py startup_profile`` shows what each costs.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def load_urlconf():
+    """Views, serializers and services, imported by the URLconf"""
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+
+
+def load_llm_client():
+    """The process-wide Mistral client (langchain and its connection pool)"""
+    from apps.chat.mistral_client import get_client
+
+    get_client()
+
+
+def load_embedder():
+    """numpy and the semantic search embedder"""
+    from apps.chat.services.search import EmbeddingService
+
+    if EmbeddingService.enabled():
+        EmbeddingService.embedder()
+
+
+HOOKS = {
+    'urlconf': load_urlconf,
+    'llm': load_llm_client,
+    'embedder': load_embedder,
+}
+
+
+def prewarm(hooks=None) -> dict:
+    """Run the hooks, return ``{hook: seconds}``; a failing hook is logged and skipped"""
+    timings = {}
+    for name in getattr(settings, 'STARTUP', {}).get('PREWARM', []) if hooks is None else hooks:
+        start = time.perf_counter()
+        try:
+            hook = HOOKS[name] if name in HOOKS else import_string(name)
+            hook()
+        except Exception:
+            logger.exception('Prewarm hook %s failed', name)
+            continue
+        timings[name] = time.perf_counter() - start
+        logger.info('Prewarm hook %s took %.0f ms', name, timings[name] * 1e3)
+    return timings
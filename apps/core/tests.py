@@ -1,3 +1,358 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.mail import EmailMessage
+from django.db import DEFAULT_DB_ALIAS
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from config.cache import parse_cache_url
+from config.database import parse_database_url
+
+from .cache import TieredCache, _L1Store
+from .compression import available_encodings, compress, decompress, decompressing_reader, negotiate
+from .inference import BatchInference, InferenceJob, StubProvider, parse_numbered_json
+from .mail import BatchingEmailSender
+from .routers import ReplicaRouter, use_replicas
+from .smtp_sink import SMTPSink
+from .startup import prewarm
+from .vectors import numpy_available
+from .write_queue import _PendingWrite, group_commit
+
+
+class UpperJob(InferenceJob):
+    """Upper-cases each input; the stub provider answers it exactly"""
+
+    name = 'upper'
+
+    def build_prompt(self, inputs):
+        return '\n'.join(f'{number}. {text}' for number, text in enumerate(inputs, 1))
+
+    def parse(self, response, count):
+        return parse_numbered_json(response, count)
+
+    def stub_response(self, inputs):
+        return json.dumps({str(number): text.upper() for number, text in enumerate(inputs, 1)})
+
+
+class TrackingProvider(StubProvider):
+    """Stub provider recording how many calls run at once; fails on the packs it is told to"""
+
+    def __init__(self, latency=0.02, fail_on=()):
+        super().__init__(latency)
+        self.fail_on = set(fail_on)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def complete(self, request):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if request.inputs[0] in self.fail_on:
+                time.sleep(self.latency)
+                raise RuntimeError('model down')
+            return super().complete(request)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class ParseNumberedJsonTests(SimpleTestCase):
+    def test_text_around_the_object_is_ignored(self):
+        response = 'Sure! Here you go:\n{"1": "a", "2": "b"}\nAnything else?'
+        self.assertEqual(parse_numbered_json(response, 2), {0: 'a', 1: 'b'})
+
+    def test_out_of_range_and_invalid_keys_are_skipped(self):
+        response = '{"0": "x", "1": "a", "3": "c", "two": "b"}'
+        self.assertEqual(parse_numbered_json(response, 2), {0: 'a'})
+
+    def test_invalid_answers(self):
+        self.assertEqual(parse_numbered_json('', 2), {})
+        self.assertEqual(parse_numbered_json('{"1": }', 2), {})
+        self.assertEqual(parse_numbered_json(None, 2), {})
+
+
+class BatchInferenceTests(SimpleTestCase):
+    inputs = [f'item {n}' for n in range(10)]
+
+    def test_results_follow_input_order(self):
+        provider = StubProvider(latency=0)
+        results, stats = BatchInference(provider, pack_size=3, concurrency=2).run(UpperJob(), self.inputs)
+
+        self.assertEqual(results, [text.upper() for text in self.inputs])
+        self.assertEqual(provider.calls, 4)
+        self.assertEqual((stats.items, stats.completed, stats.failed, stats.calls), (10, 10, 0, 4))
+        self.assertGreater(stats.prompt_tokens, 0)
+
+    def test_calls_run_side_by_side_up_to_concurrency(self):
+        provider = TrackingProvider()
+        BatchInference(provider, pack_size=1, concurrency=3).run(UpperJob(), self.inputs)
+
+        self.assertEqual(provider.calls, 10)
+        self.assertEqual(provider.max_in_flight, 3)
+
+    def test_failed_call_leaves_its_pack_empty(self):
+        provider = TrackingProvider(latency=0, fail_on=['item 3'])
+        with self.assertLogs('apps.core.inference', 'ERROR'):
+            results, stats = BatchInference(provider, pack_size=3, concurrency=4).run(UpperJob(), self.inputs)
+
+        self.assertEqual(results[3:6], [None, None, None])
+        self.assertEqual(results[:3] + results[6:], [text.upper() for text in self.inputs[:3] + self.inputs[6:]])
+        self.assertEqual((stats.completed, stats.failed, stats.failed_calls), (7, 3, 1))
+
+    def test_provider_batch_mode(self):
+        class BatchProvider:
+            name = 'batch'
+
+            def __init__(self):
+                self.submissions = []
+
+            def complete_many(self, requests):
+                self.submissions.append(len(requests))
+                return [request.job.stub_response(request.inputs) for request in requests]
+
+        provider = BatchProvider()
+        results, stats = BatchInference(provider, pack_size=4).run(UpperJob(), self.inputs)
+
+        self.assertEqual(provider.submissions, [3])
+        self.assertEqual(results, [text.upper() for text in self.inputs])
+        self.assertEqual(stats.provider_name, 'batch')
+
+    @override_settings(BATCH_INFERENCE={'PRICES': {'stub': (1.0, 2.0)}})
+    def test_cost_uses_provider_prices(self):
+        _, stats = BatchInference(StubProvider(latency=0), pack_size=5).run(UpperJob(), self.inputs)
+
+        expected = (stats.prompt_tokens * 1.0 + stats.completion_tokens * 2.0) / 1e6
+        self.assertAlmostEqual(stats.cost, expected)
+        self.assertAlmostEqual(stats.cost_per_item, expected / 10)
+
+    def test_no_inputs(self):
+        provider = StubProvider(latency=0)
+        results, stats = BatchInference(provider).run(UpperJob(), [])
+
+        self.assertEqual((results, stats.calls, provider.calls), ([], 0, 0))
+
+
+class DatabaseUrlTests(SimpleTestCase):
+    def test_server_url(self):
+        config = parse_database_url('postgres://chat:s%40cret@db:5433/chat?sslmode=require')
+        self.assertEqual(config, {
+            'ENGINE': 'django.db.backends.postgresql', 'NAME': 'chat', 'USER': 'chat', 'PASSWORD': 's@cret',
+            'HOST': 'db', 'PORT': '5433', 'OPTIONS': {'sslmode': 'require'},
+        })
+
+    def test_sqlite_url(self):
+        base_dir = Path('/srv/chat')
+        self.assertEqual(parse_database_url('sqlite:///db.sqlite3', base_dir)['NAME'], base_dir / 'db.sqlite3')
+        self.assertEqual(parse_database_url('sqlite:////data/db.sqlite3', base_dir)['NAME'], '/data/db.sqlite3')
+        self.assertEqual(parse_database_url('sqlite://')['NAME'], ':memory:')
+
+    def test_unknown_scheme(self):
+        with self.assertRaises(ValueError):
+            parse_database_url('oracle://db/chat')
+
+
+@mock.patch('apps.core.routers.replica_aliases', return_value=['replica_1'])
+class ReplicaRouterTests(SimpleTestCase):
+    router = ReplicaRouter()
+
+    def test_reads_use_a_replica_only_when_asked(self, _aliases):
+        self.assertEqual(self.router.db_for_read(None), DEFAULT_DB_ALIAS)
+        with use_replicas():
+            self.assertEqual(self.router.db_for_read(None), 'replica_1')
+            with use_replicas(False):
+                self.assertEqual(self.router.db_for_read(None), DEFAULT_DB_ALIAS)
+            self.assertEqual(self.router.db_for_write(None), DEFAULT_DB_ALIAS)
+
+    def test_reads_inside_a_transaction_stay_on_the_primary(self, _aliases):
+        with use_replicas(), mock.patch('apps.core.routers.connections') as connections:
+            connections.__getitem__.return_value.in_atomic_block = True
+            self.assertEqual(self.router.db_for_read(None), DEFAULT_DB_ALIAS)
+
+    def test_migrations_only_run_on_the_primary(self, _aliases):
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'chat'))
+        self.assertFalse(self.router.allow_migrate('replica_1', 'chat'))
+
+
+class CacheUrlTests(SimpleTestCase):
+    def test_urls(self):
+        self.assertEqual(parse_cache_url('redis://cache:6379/0')['LOCATION'], 'redis://cache:6379/0')
+        self.assertEqual(parse_cache_url('memcached://a:11211,b:11211')['LOCATION'], ['a:11211', 'b:11211'])
+        self.assertEqual(parse_cache_url('db://cache_table')['LOCATION'], 'cache_table')
+
+    def test_file_cache_is_refused(self):
+        with self.assertRaisesMessage(ValueError, 'atomic add/incr'):
+            parse_cache_url('file:///tmp/cache')
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        self.addCleanup(caches['shared'].clear)
+
+    def process(self):
+        """A TieredCache with its own L1, as in another worker process"""
+        cache = TieredCache('shared', {'OPTIONS': {'POLL_INTERVAL': 0}})
+        cache.l1 = _L1Store(100)
+        return cache
+
+    def test_writes_elsewhere_invalidate_l1(self):
+        first, second = self.process(), self.process()
+        first.set('user:1', 'old')
+        self.assertEqual(second.get('user:1'), 'old')
+
+        first.set('user:1', 'new')
+        self.assertEqual(second.get('user:1'), 'new')
+        first.delete('user:1')
+        self.assertIsNone(second.get('user:1'))
+
+    def test_reads_are_served_from_l1(self):
+        first = self.process()
+        first.set('user:2', 'value')
+        caches['shared'].set('user:2', 'changed behind its back')
+
+        self.assertEqual(first.get('user:2'), 'value')
+        self.assertEqual(first.stats()['user'], {'l1_hits': 1, 'l2_hits': 0, 'misses': 0})
+
+
+class CompressionTests(SimpleTestCase):
+    def test_round_trip(self):
+        data = b'{"content": "hello"}' * 100
+        for encoding in available_encodings():
+            with self.subTest(encoding=encoding):
+                self.assertEqual(decompress(compress(data, encoding), encoding), data)
+
+    def test_streamed_decompression(self):
+        lines = [f'{{"line": {n}}}\n'.encode() for n in range(20000)]
+        for encoding in available_encodings():
+            with self.subTest(encoding=encoding):
+                reader = decompressing_reader(io.BytesIO(compress(b''.join(lines), encoding)), encoding)
+                self.assertEqual(list(reader), lines)
+
+    def test_negotiate(self):
+        self.assertEqual(negotiate('gzip, deflate', ['zstd', 'br', 'gzip']), 'gzip')
+        self.assertEqual(negotiate('gzip;q=0.5, br', ['zstd', 'br', 'gzip']), 'br')
+        self.assertEqual(negotiate('*', ['zstd', 'gzip']), 'zstd')
+        self.assertIsNone(negotiate('gzip;q=0, identity', ['gzip']))
+        self.assertIsNone(negotiate('', ['gzip']))
+
+
+class GroupCommitTests(TestCase):
+    def test_failed_write_only_rolls_back_its_savepoint(self):
+        User = get_user_model()
+
+        def create(username):
+            return User.objects.create_user(username, f'{username}@example.com', 'x').username
+
+        def fail():
+            create('rolled-back')
+            raise ValueError('invalid write')
+
+        batch = [_PendingWrite(create, ('first',), {}), _PendingWrite(fail, (), {}),
+                 _PendingWrite(create, ('second',), {})]
+        group_commit(batch)
+
+        self.assertEqual(batch[0].future.result(), 'first')
+        self.assertRaises(ValueError, batch[1].future.result)
+        self.assertEqual(batch[2].future.result(), 'second')
+        self.assertEqual(sorted(User.objects.values_list('username', flat=True)), ['first', 'second'])
+
+
+class BatchingEmailSenderTests(SimpleTestCase):
+    def setUp(self):
+        self.sink = SMTPSink().start()
+        self.addCleanup(self.sink.stop)
+        host, port = self.sink.address
+        settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST=host, EMAIL_PORT=port, EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+            EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+            MAIL_QUEUE={'RETRY_BACKOFF': 0},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.sender = BatchingEmailSender()
+        self.addCleanup(self.sender.close)
+
+    def message(self, n):
+        return EmailMessage(f'Subject {n}', 'Body', 'from@example.com', [f'user{n}@example.com'])
+
+    def test_batch_shares_one_connection(self):
+        self.sender([self.message(1), lambda: self.message(2), self.message(3)])
+
+        self.assertEqual([m['to'] for m in self.sink.messages],
+                         [['<user1@example.com>'], ['<user2@example.com>'], ['<user3@example.com>']])
+        self.assertEqual(self.sink.connections, 1)
+
+    def test_failed_delivery_is_retried(self):
+        self.sink.fail_next = 1
+        with self.assertLogs('apps.core.mail', 'WARNING'):
+            self.sender([self.message(1), self.message(2)])
+
+        self.assertEqual(sorted(m['to'][0] for m in self.sink.messages),
+                         ['<user1@example.com>', '<user2@example.com>'])
+
+    def test_failing_builder_does_not_drop_the_batch(self):
+        def broken():
+            raise KeyError('user')
+
+        with self.assertLogs('apps.core.mail', 'ERROR'):
+            self.sender([self.message(1), broken, lambda: self.message(2)])
+
+        self.assertEqual(len(self.sink.messages), 2)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def test_exact_count_without_an_estimate(self):
+        from .admin import EstimatedCountPaginator, estimated_count
+
+        get_user_model().objects.create_user('paginated', 'paginated@example.com', 'x')
+        queryset = get_user_model().objects.order_by('pk')
+
+        self.assertIsNone(estimated_count(queryset))  # SQLite has no planner estimate
+        self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 1)
+
+
+def failing_hook():
+    raise RuntimeError('no model')
+
+
+class PrewarmTests(SimpleTestCase):
+    def test_hooks_by_name_and_path(self):
+        with self.assertLogs('apps.core.startup', 'INFO'):
+            timings = prewarm(['urlconf', 'apps.core.tests.failing_hook', 'apps.core.startup.load_urlconf'])
+        self.assertEqual(list(timings), ['urlconf', 'apps.core.startup.load_urlconf'])
+
+    @override_settings(STARTUP={'PREWARM': ['apps.core.tests.missing_hook']})
+    def test_failing_hooks_are_skipped(self):
+        with self.assertLogs('apps.core.startup', 'ERROR'):
+            self.assertEqual(prewarm(), {})
+
+
+@unittest.skipUnless(numpy_available(), 'numpy is not installed')
+class HashingEmbedderTests(SimpleTestCase):
+    def test_deterministic_and_normalized(self):
+        from .vectors import HashingEmbedder
+
+        embedder = HashingEmbedder(dimensions=64)
+        first = embedder.embed(['password reset email', 'chocolate cake recipe'])
+        second = HashingEmbedder(dimensions=64).embed(['password reset email', 'chocolate cake recipe'])
+
+        self.assertEqual(first.shape, (2, 64))
+        self.assertTrue((first == second).all())
+        self.assertAlmostEqual(float((first[0] ** 2).sum()), 1.0, places=5)
+
+    def test_similar_texts_score_higher(self):
+        from .vectors import HashingEmbedder
+
+        query, close, far = HashingEmbedder().embed(['reset my password', 'password reset link', 'cake recipe'])
+
+        self.assertGreater(float(query @ close), float(query @ far))
@@ -0,0 +1,232 @@
+"""
+Text embeddings and on-disk vector indexes (needs ``numpy``).
+
+Vectors are L2-normalized ``float32`` rows, so the inner product is the
+cosine similarity. Two index layouts, both saved as ``.npy`` files and
+memory-mapped when loaded:
+
+- ``FlatIndex``: every vector is scored (exact; fine up to tens of
+  thousands of vectors),
+- ``IVFIndex``: vectors are grouped around k-means centroids (inverted
+  lists stored contiguously) and a query only scores the ``nprobe``
+  lists closest to it (approximate, sublinear).
+
+Embedders: ``hashing`` (local and deterministic: hashed words and
+character trigrams; for tests and as a keyword-ish fallback) and
+``mistral`` (``mistral-embed`` through ``langchain_mistralai``).
+"""
+import json
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+_WORD_RE = re.compile(r'\w\w+', re.U)
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class HashingEmbedder:
+    """Feature hashing of words (weight 1) and of their character trigrams (weight 0.5)"""
+
+    name = 'hashing'
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def features(self, text: str):
+        for word in _WORD_RE.findall(text.lower()):
+            yield word, 1.0
+            padded = f'#{word}#'
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.5
+
+    def embed(self, texts: List[str]):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self.features(text or ''):
+                h = zlib.crc32(feature.encode())
+                vectors[row, h % self.dimensions] += weight if h & 0x80000000 else -weight
+        return normalize(vectors)
+
+
+class MistralEmbedder:
+    """``mistral-embed`` (1024 dimensions)"""
+
+    name = 'mistral'
+    dimensions = 1024
+
+    def __init__(self, dimensions: int = None):
+        from langchain_mistralai.embeddings import MistralAIEmbeddings
+
+        self.client = MistralAIEmbeddings(model='mistral-embed', api_key=os.getenv('MISTRAL_API_KEY'))
+
+    def embed(self, texts: List[str]):
+        return normalize(np.asarray(self.client.embed_documents(list(texts)), dtype=np.float32))
+
+
+EMBEDDERS = {'hashing': HashingEmbedder, 'mistral': MistralEmbedder}
+
+
+def get_embedder(name: str = 'hashing', dimensions: int = 256):
+    if np is None:
+        raise RuntimeError('numpy is required for embeddings')
+    try:
+        return EMBEDDERS[name](dimensions)
+    except KeyError:
+        raise ValueError(f'Unknown embedder: {name!r}')
+
+
+def _top_k(scores, k: int):
+    """Positions of the ``k`` best scores, best first"""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class FlatIndex:
+    """Exact search: one matrix-vector product over every vector"""
+
+    kind = 'flat'
+
+    def __init__(self, ids, vectors):
+        self.ids = ids
+        self.vectors = vectors
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids, vectors, **options):
+        return cls(np.asarray(ids, dtype=np.int64), np.ascontiguousarray(vectors, dtype=np.float32))
+
+    def search(self, query, k: int, **options) -> Tuple[list, list]:
+        if not len(self):
+            return [], []
+        scores = self.vectors @ query
+        top = _top_k(scores, k)
+        return self.ids[top].tolist(), scores[top].tolist()
+
+    def save(self, path: Path) -> dict:
+        np.save(path / 'ids.npy', self.ids)
+        np.save(path / 'vectors.npy', self.vectors)
+        return {}
+
+    @classmethod
+    def load(cls, path: Path, meta: dict):
+        return cls(np.load(path / 'ids.npy', mmap_mode='r'), np.load(path / 'vectors.npy', mmap_mode='r'))
+
+
+class IVFIndex:
+    """
+    Inverted file index: vectors sorted by nearest centroid, so list ``i``
+    is the slice ``offsets[i]:offsets[i + 1]`` of one memory-mapped array
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, ids, vectors, centroids, offsets, nprobe: int = 8):
+        self.ids = ids
+        self.vectors = vectors
+        self.centroids = centroids
+        self.offsets = offsets
+        self.nprobe = nprobe
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _assign(vectors, centroids, chunk: int = 16384):
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk):
+            assignment[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        return assignment
+
+    @classmethod
+    def build(cls, ids, vectors, nlist: int = None, iterations: int = 10, sample: int = 50000,
+              seed: int = 0, nprobe: int = 8, **options):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        nlist = max(1, min(nlist or int(np.sqrt(len(vectors))), len(vectors)))
+
+        # Spherical k-means on a sample
+        rng = np.random.default_rng(seed)
+        training = vectors if len(vectors) <= sample else vectors[rng.choice(len(vectors), sample, replace=False)]
+        centroids = training[rng.choice(len(training), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = cls._assign(training, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, training)
+            empty = ~sums.any(axis=1)
+            # An empty list restarts from a random vector
+            sums[empty] = training[rng.choice(len(training), int(empty.sum()))]
+            centroids = normalize(sums)
+
+        assignment = cls._assign(vectors, centroids)
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.searchsorted(assignment[order], np.arange(nlist + 1)).astype(np.int64)
+        return cls(ids[order], vectors[order], centroids, offsets, nprobe)
+
+    def search(self, query, k: int, nprobe: int = None, **options) -> Tuple[list, list]:
+        if not len(self):
+            return [], []
+        probe = _top_k(self.centroids @ query, min(nprobe or self.nprobe, len(self.centroids)))
+        ids, scores = [], []
+        for i in probe:
+            start, end = self.offsets[i], self.offsets[i + 1]
+            if end > start:
+                ids.append(self.ids[start:end])
+                scores.append(self.vectors[start:end] @ query)
+        if not ids:
+            return [], []
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        top = _top_k(scores, k)
+        return ids[top].tolist(), scores[top].tolist()
+
+    def save(self, path: Path) -> dict:
+        np.save(path / 'ids.npy', self.ids)
+        np.save(path / 'vectors.npy', self.vectors)
+        np.save(path / 'centroids.npy', self.centroids)
+        np.save(path / 'offsets.npy', self.offsets)
+        return {'nlist': len(self.centroids), 'nprobe': self.nprobe}
+
+    @classmethod
+    def load(cls, path: Path, meta: dict):
+        return cls(
+            np.load(path / 'ids.npy', mmap_mode='r'),
+            np.load(path / 'vectors.npy', mmap_mode='r'),
+            np.load(path / 'centroids.npy'),
+            np.load(path / 'offsets.npy'),
+            meta.get('nprobe', 8),
+        )
+
+
+INDEX_TYPES = {FlatIndex.kind: FlatIndex, IVFIndex.kind: IVFIndex}
+
+
+def save_index(index, path: Path, meta: dict) -> None:
+    """Write the index files and ``meta.json`` in ``path`` (created)"""
+    path.mkdir(parents=True, exist_ok=True)
+    meta = {**meta, 'kind': index.kind, 'count': len(index), **index.save(path)}
+    (path / 'meta.json').write_text(json.dumps(meta))
+
+
+def load_index(path: Path):
+    """``(index, meta)``, vectors memory-mapped"""
+    meta = json.loads((path / 'meta.json').read_text())
+    return INDEX_TYPES[meta['kind']].load(path, meta), meta
@@ -0,0 +1,100 @@
+"""
+Single-writer queue for SQLite deployments.
+
+SQLite allows one writer at a time: concurrent request threads each
+opening a write transaction spend their time waiting on the file lock
+(or failing with "database is locked"). With ``WRITE_QUEUE['ENABLED']``
+writes are handed to one background thread instead, which runs every
+waiting write in a single transaction (group commit): one lock
+acquisition and one WAL sync for the whole batch. Callers still block
+until their write is committed and get its result (or its exception).
+"""
+import logging
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .background import BatchWorker
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'BATCH_SIZE': 64,
+    'FLUSH_INTERVAL': 0.002,  # seconds to wait for more writes to join a batch
+    'TIMEOUT': 30,  # seconds a caller waits for its write
+}
+
+
+def write_queue_settings(name):
+    return getattr(settings, 'WRITE_QUEUE', {}).get(name, DEFAULTS[name])
+
+
+class _PendingWrite:
+    __slots__ = ('func', 'args', 'kwargs', 'future')
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+def group_commit(batch) -> None:
+    """Run a batch of writes in one transaction, each in its own savepoint"""
+    done = []
+    try:
+        with transaction.atomic():
+            for pending in batch:
+                try:
+                    with transaction.atomic():
+                        result = pending.func(*pending.args, **pending.kwargs)
+                except Exception as e:
+                    # Only this write's savepoint is rolled back
+                    pending.future.set_exception(e)
+                else:
+                    done.append((pending, result))
+    except Exception as e:
+        logger.exception('Group commit of %d write(s) failed', len(batch))
+        for pending, _ in done:
+            pending.future.set_exception(e)
+        return
+    # Results are only handed back once they are durable
+    for pending, result in done:
+        pending.future.set_result(result)
+
+
+class WriteQueue(BatchWorker):
+    def __init__(self):
+        super().__init__(
+            'write-queue',
+            group_commit,
+            batch_size=write_queue_settings('BATCH_SIZE'),
+            flush_interval=write_queue_settings('FLUSH_INTERVAL'),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return (
+            write_queue_settings('ENABLED')
+            and connections[DEFAULT_DB_ALIAS].vendor == 'sqlite'
+        )
+
+    def run(self, func, *args, **kwargs):
+        """
+        Execute ``func(*args, **kwargs)`` on the writer thread and return its
+        result. Runs inline when the queue is disabled, in eager mode, or
+        when the caller is already in a transaction (its writes must stay
+        in that transaction).
+        """
+        if not self.enabled or self.eager or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return func(*args, **kwargs)
+        pending = _PendingWrite(func, args, kwargs)
+        self._ensure_started()
+        # Blocks when the queue is full: dropping a write is not an option
+        self._queue.put(pending)
+        return pending.future.result(timeout=write_queue_settings('TIMEOUT'))
+
+
+write_queue = WriteQueue()
@@ -2,6 +2,8 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; WebSocket connections are routed by path to the
+raw ASGI applications of ``websocket_routes``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +15,25 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from apps.chat.websocket import chat_events  # noqa: E402
+from apps.core.startup import prewarm  # noqa: E402
+
+prewarm()
+
+websocket_routes = {
+    '/ws/chat/': chat_events,
+}
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        handler = websocket_routes.get(scope['path'])
+        if handler is None:
+            await receive()  # websocket.connect
+            await send({'type': 'websocket.close'})
+            return
+        return await handler(scope, receive, send)
+    return await django_application(scope, receive, send)
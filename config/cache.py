@@ -0,0 +1,66 @@
+"""
+Cache configuration from the environment.
+
+``CACHE_URL`` selects the shared cache every process agrees on (locks,
+counters, L2 of the default cache):
+
+    CACHE_URL=redis://cache:6379/0
+    CACHE_URL=memcached://cache-1:11211,cache-2:11211
+    CACHE_URL=db://cache_table            (run `manage.py createcachetable`)
+    CACHE_URL=locmem://chat               (default: one process only)
+
+Locks and counters rely on atomic ``add``/``incr``, which the file
+backend doesn't have (a has_key then a set on a file): ``file://`` is
+refused.
+
+``default`` is a ``TieredCache``: a per-process L1 in front of ``shared``.
+"""
+import os
+from urllib.parse import urlsplit
+
+BACKENDS = {
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+def parse_cache_url(url):
+    parts = urlsplit(url)
+    if parts.scheme == 'file':
+        raise ValueError('file:// caches have no atomic add/incr; use redis://, memcached:// or db://')
+    if parts.scheme not in BACKENDS:
+        raise ValueError(f'Unsupported cache scheme: {parts.scheme!r}')
+    config = {'BACKEND': BACKENDS[parts.scheme]}
+    if parts.scheme in ('redis', 'rediss'):
+        config['LOCATION'] = url
+    elif parts.scheme == 'memcached':
+        config['LOCATION'] = parts.netloc.split(',')
+    elif parts.scheme == 'db':
+        config['LOCATION'] = parts.netloc or parts.path.lstrip('/')
+    else:
+        config['LOCATION'] = parts.netloc
+    return config
+
+
+def cache_config():
+    shared = parse_cache_url(os.environ.get('CACHE_URL') or 'locmem://chat-shared')
+    shared['KEY_PREFIX'] = os.environ.get('CACHE_KEY_PREFIX', 'chat')
+    shared['TIMEOUT'] = 300
+    return {
+        'default': {
+            'BACKEND': 'apps.core.cache.TieredCache',
+            'LOCATION': 'shared',
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'L1_TIMEOUT': int(os.environ.get('CACHE_L1_TIMEOUT', 5)),  # seconds
+                'L1_MAX_ENTRIES': 1000,
+                'POLL_INTERVAL': 1,  # seconds between invalidation log reads
+                'LOG_SIZE': 1000,
+                'STATS_FLUSH_INTERVAL': 10,  # seconds
+            },
+        },
+        'shared': shared,
+    }
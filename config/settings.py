@@ -23,6 +23,9 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from config.cache import cache_config
+from config.database import database_config
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -49,18 +52,21 @@ INSTALLED_APPS = [
     'apps.accounts',
     'apps.chat',
     'rest_framework',
+    'rest_framework.authtoken',
     'corsheaders',
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'apps.core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.core.middleware.PrimaryStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -87,13 +93,31 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# Configured from DATABASE_URL / DATABASE_REPLICA_URLS (config/database.py),
+# SQLite (db.sqlite3) when unset
+DATABASES = database_config(BASE_DIR)
+
+# Read-only endpoints are served by the replicas, writes by `default`
+DATABASE_ROUTERS = ['apps.core.routers.ReplicaRouter']
+
+READ_REPLICAS = {
+    # Reads stay on the primary this long after a user's write (read-your-writes)
+    'STICKY_SECONDS': int(os.environ.get('REPLICA_STICKY_SECONDS', 5)),
+}
+
+# SQLite only: funnel message inserts through one writer thread that
+# group-commits them (apps/core/write_queue.py)
+WRITE_QUEUE = {
+    'ENABLED': os.environ.get('SQLITE_WRITE_QUEUE', '') == 'True',
+    'BATCH_SIZE': 64,
+    'FLUSH_INTERVAL': 0.002,  # seconds
+    'TIMEOUT': 30,  # seconds
 }
 
+# Cache: `default` is a per-process L1 in front of the `shared` cache
+# configured by CACHE_URL (config/cache.py). Locks and counters use `shared`.
+CACHES = cache_config()
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -135,6 +159,18 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Start-up work done before the first request (apps/core/startup.py):
+# `urlconf`, `llm` (Mistral client), `embedder` (numpy) or dotted paths
+STARTUP = {
+    'PREWARM': [hook for hook in os.environ.get('STARTUP_PREWARM', 'urlconf').split(',') if hook],
+}
+
+# Admin changelists of the chat tables (apps/core/admin.py)
+ADMIN = {
+    'EXACT_COUNT_BELOW': 10000,  # below this estimate, the paginator runs COUNT(*)
+    'FILTER_MONTHS': 12,  # months listed by the created_at filters
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -143,6 +179,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Tells Django to use our custom User model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Resolves request.user from the user cache instead of the users table
+AUTHENTICATION_BACKENDS = [
+    'apps.accounts.backends.CachedModelBackend',
+]
+
+# Lifetime (seconds) of cached users, refreshed on every save
+USER_CACHE_TIMEOUT = int(os.environ.get('USER_CACHE_TIMEOUT', 300))
+
 # Base authentication configuration
 LOGIN_URL = 'account_login'
 LOGIN_REDIRECT_URL = 'core:home'
@@ -151,12 +195,205 @@ LOGOUT_REDIRECT_URL = 'core:home'
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'apps.accounts.authentication.SignedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        # Same bytes as JSONRenderer, faster (needs orjson, see apps/core/renderers.py)
+        'apps.core.renderers.ORJSONRenderer' if os.environ.get('API_ORJSON', 'True') == 'True'
+        else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Conversation and message lists serialized from values_list() rows
+# (apps/core/serializers.py), same output as the ModelSerializers
+CHAT_SERIALIZATION = {
+    'FAST_READS': os.environ.get('CHAT_FAST_READS', 'True') == 'True',
+}
+
+# Signed bearer tokens (apps/accounts/tokens.py)
+# Rotate keys by moving the current key to TOKEN_FALLBACK_KEYS
+SIGNED_TOKENS = {
+    'ACCESS_LIFETIME': int(os.environ.get('TOKEN_ACCESS_LIFETIME', 300)),  # seconds
+    'REFRESH_LIFETIME': int(os.environ.get('TOKEN_REFRESH_LIFETIME', 14 * 24 * 3600)),
+    'SIGNING_KEY': os.environ.get('TOKEN_SIGNING_KEY') or SECRET_KEY,
+    'FALLBACK_KEYS': [k for k in os.environ.get('TOKEN_FALLBACK_KEYS', '').split(',') if k],
+    'REVOCATION_RELOAD_INTERVAL': 30,  # seconds
+}
+
+# Sessions are read from the cache, the database only backs them up
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Chat history export/import (apps/chat/services/export.py)
+CHAT_EXPORT = {
+    'CHUNK_SIZE': 2000,  # rows fetched per round trip while exporting
+    'IMPORT_BATCH_SIZE': 1000,  # rows per bulk insert while importing
+}
+
+# Idempotency-Key support of conversation and message creation
+# (IdempotencyMixin, apps/core/mixins.py)
+IDEMPOTENCY = {
+    'TTL': int(os.environ.get('IDEMPOTENCY_TTL', 86400)),  # seconds a response is replayed
+    'PENDING_TIMEOUT': 120,  # an in-flight reservation older than this is taken over
+    'WAIT_TIMEOUT': 30,  # a concurrent duplicate waits this long, then gets a 409
+    'POLL_INTERVAL': 0.1,
+    'PURGE_INTERVAL': 300,  # expired keys are deleted at most this often per process
+    'COMPRESS_ABOVE': 512,  # bytes
+}
+
+# Edit history of messages (apps/chat/services/revisions.py): diffs against
+# the previous revision, the full content every SNAPSHOT_EVERY revisions
+CHAT_REVISIONS = {
+    'SNAPSHOT_EVERY': 10,
+    'COMPRESS_ABOVE': 512,  # bytes
+}
+
+# Delta sync changelog (apps/chat/services/sync.py)
+CHAT_SYNC = {
+    'PAGE_SIZE': 500,  # changelog entries per /sync/ response
+    'MAX_PAGE_SIZE': 5000,
+    # Entries younger than this wait for the next call, so a cursor never
+    # skips a concurrent transaction that committed late
+    'SETTLE_SECONDS': 1,
+}
+
+# Archived conversations are served from compressed snapshots
+# (apps/chat/services/snapshot.py), built once after archiving
+CHAT_SNAPSHOTS = {
+    'ENABLED': True,
+    'ENCODING': 'gzip',  # stored coding; every client accepts gzip
+    'LEVEL': 9,  # compressed once, read many times
+}
+
+# Messages of archived conversations move out of the message table into
+# one compressed blob per conversation (apps/chat/services/cold_storage.py):
+# at archive time with ON_ARCHIVE, otherwise `manage.py move_to_cold_storage`
+# packs those archived more than AFTER_DAYS ago
+COLD_STORAGE = {
+    'BACKEND': os.environ.get('COLD_STORAGE_BACKEND', 'db'),  # 'db' or 'file'
+    'PATH': Path(os.environ.get('COLD_STORAGE_PATH') or BASE_DIR / 'cold_storage'),
+    'ENCODING': 'zstd',  # gzip when zstandard is not installed
+    'ON_ARCHIVE': os.environ.get('COLD_STORAGE_ON_ARCHIVE', '') == 'True',
+    'AFTER_DAYS': 30,
+    # file backend: blobs of rolled-back packs older than this are deleted by move_to_cold_storage
+    'PENDING_MAX_AGE': 3600,  # seconds
+}
+
+# New conversations get a heuristic title at once, then a model-generated one
+# from a background worker titling BATCH_SIZE conversations per model call
+CHAT_TITLES = {
+    'LLM': os.environ.get('CHAT_LLM_TITLES', 'True') == 'True',
+    'BATCH_SIZE': 20,
+    'FLUSH_INTERVAL': 2.0,  # seconds waited for a batch to fill up
+    'MAX_LENGTH': 50,
+    'EXCERPT_LENGTH': 500,  # characters of the first message sent to the model
+}
+
+# Non-interactive model calls (titles, summaries, tags...) go through the
+# batch inference layer, apps/core/inference.py: PACK_SIZE inputs per prompt,
+# at most CONCURRENCY calls in flight. PROVIDER 'stub' answers locally (tests)
+BATCH_INFERENCE = {
+    'PROVIDER': os.environ.get('BATCH_INFERENCE_PROVIDER', 'mistral'),
+    'PACK_SIZE': 10,
+    'CONCURRENCY': 4,
+    'PRICES': {'mistral': (2.0, 6.0)},  # USD per million input / output tokens
+    'STUB_LATENCY': 0.0,  # seconds per stub call
+}
+
+# Summary, tags and category of archived conversations (manage.py enrich_conversations)
+CHAT_ENRICHMENT = {
+    'ON_ARCHIVE': os.environ.get('CHAT_ENRICH_ON_ARCHIVE', '') == 'True',
+    'FIELDS': ['summary', 'tags', 'category'],
+    'CATEGORIES': ['programming', 'writing', 'learning', 'work', 'personal', 'other'],
+    'EXCERPT_LENGTH': 2000,  # characters of the conversation sent to the model
+    'SUMMARY_LENGTH': 500,
+    'MAX_TAGS': 5,
+}
+
+# Semantic search (apps/chat/services/search.py): messages are embedded in the
+# background and indexed per user in local files under PATH, exact search up
+# to IVF_THRESHOLD vectors, inverted lists (NPROBE lists scanned) beyond
+SEMANTIC_SEARCH = {
+    'ENABLED': os.environ.get('SEMANTIC_SEARCH', 'True') == 'True',
+    'EMBEDDER': os.environ.get('SEMANTIC_SEARCH_EMBEDDER', 'hashing'),  # 'hashing' (local) or 'mistral'
+    'DIMENSIONS': 256,  # hashing embedder only; mistral-embed has 1024
+    'PATH': Path(os.environ.get('SEMANTIC_SEARCH_PATH') or BASE_DIR / 'vector_index'),
+    'IVF_THRESHOLD': 20000,
+    'NLIST': None,  # default: sqrt(vector count)
+    'NPROBE': 8,
+    'REBUILD_AFTER': 500,  # embeddings not in the index before a background rebuild
+    'MAX_LOADED_INDEXES': 100,  # per process, least recently used unloaded first
+    'CANDIDATES': 200,  # vector and keyword candidates ranked per query
+    'KEYWORD_WEIGHT': 0.3,
+    'MIN_SCORE': 0.15,
+}
+
+# Retrieval-augmented prompts: snippets of the user's other conversations
+# (semantic search index) added to the message, within TOKEN_BUDGET tokens.
+# Retrieval never delays the model call by more than TIMEOUT seconds
+RETRIEVAL = {
+    'ENABLED': os.environ.get('CHAT_RETRIEVAL', '') == 'True',
+    'TOP_K': 4,
+    'MIN_SCORE': 0.3,
+    'TOKEN_BUDGET': 800,
+    'SNIPPET_TOKENS': 150,
+    'TIMEOUT': 0.25,
+    'STAGE_BUDGETS': {'search': 0.1},  # seconds; a search over budget is logged
+    'MAX_PENDING': 8,  # searches queued or running per process before new ones are shed
+    'CACHE_TIMEOUT': 3600,  # results cached per user message
+}
+
+# First replies of new conversations are generated in the background, after
+# the creation commits (apps/chat/services/generation.py)
+CHAT_REPLIES = {
+    'CONCURRENCY': 8,  # model calls in flight per process
+    'FLUSH_INTERVAL': 0.05,  # seconds
+    # The status endpoint answers `pending` this long, then generates itself
+    'PENDING_TIMEOUT': 300,
+}
+
+# Prompt layout, see apps/chat/services/prompts.py: system prompt, summary and
+# history form a stable prefix (reused by the provider's prompt cache); the
+# history start moves by WINDOW_STEP tokens once over HISTORY_TOKENS.
+PROMPT = {
+    'SYSTEM': os.environ.get('CHAT_SYSTEM_PROMPT') or None,
+    'HISTORY_TOKENS': 3000,
+    'WINDOW_STEP': 1000,
+    'STATE_TIMEOUT': 86400,  # prefix hashes kept per conversation
+}
+
+# Monthly partitions of chat_message on PostgreSQL, see apps/chat/partitions.py.
+# ENABLED once `manage.py partition_messages` has run: conversation queries
+# then bound created_at so that older partitions are skipped
+MESSAGE_PARTITIONS = {
+    'ENABLED': os.environ.get('MESSAGE_PARTITIONS', '') == 'True',
+    'MONTHS_AHEAD': 3,  # partitions created in advance by rotate_message_partitions
+    'RETENTION_MONTHS': int(os.environ['MESSAGE_RETENTION_MONTHS']) if os.environ.get('MESSAGE_RETENTION_MONTHS') else None,
+}
+
+# Chat API responses above MIN_SIZE bytes are compressed with the best
+# coding the client accepts (zstd, br, gzip), see apps/core/middleware.py
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': 1024,
+    'PATH_PREFIXES': ('/api/chat/', '/chat/'),
+    'CONTENT_TYPES': ('application/json', 'text/'),
+    'ENCODINGS': None,  # default: every available coding, zstd first
+    'LEVELS': {'zstd': 3, 'br': 4, 'gzip': 6},
+}
+
+# Real-time events pushed on /ws/chat/ (apps/core/events.py). The
+# in-memory broker only reaches WebSockets served by the publishing
+# process; use the database or Redis broker with several processes.
+REALTIME = {
+    'BROKER': os.environ.get('REALTIME_BROKER', 'apps.core.events.InMemoryBroker'),
+    'OPTIONS': {'URL': os.environ['REALTIME_REDIS_URL']} if os.environ.get('REALTIME_REDIS_URL') else {},
+    'QUEUE_SIZE': 1000,  # events buffered per connection
+    'TOKEN_FLUSH_INTERVAL': 0.05,  # seconds of generated tokens per event
 }
 
 # CORS configuration for development
@@ -186,7 +423,15 @@ CSRF_COOKIE_SECURE = False  # In production, put True
 SESSION_COOKIE_SECURE = False  # In production, put True
 
 # Email sending configuration
-if DEBUG:
+if os.environ.get('EMAIL_HOST'):
+    # Explicit SMTP server, e.g. `manage.py smtp_sink` for local testing
+    EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    EMAIL_HOST = os.environ['EMAIL_HOST']
+    EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+    EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '') == 'True'
+    EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+    EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+elif DEBUG:
     # Displays emails in the console during development
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 else:
@@ -198,6 +443,20 @@ else:
     EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
     EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 
+EMAIL_TIMEOUT = 10  # seconds
+
+# Outbound mail queue (apps/core/mail.py)
+MAIL_QUEUE = {
+    'BATCH_SIZE': 50,
+    'FLUSH_INTERVAL': 0.5,  # seconds
+    'MAX_RETRIES': 3,
+    'RETRY_BACKOFF': 2.0,  # seconds, doubled on each attempt
+    'CONNECTION_KEEPALIVE': 60,  # seconds
+}
+
+# Run background workers inline (tests, management commands)
+BACKGROUND_TASKS_EAGER = os.environ.get('BACKGROUND_TASKS_EAGER', '') == 'True'
+
 # The sender address that will appear
 DEFAULT_FROM_EMAIL = 'noreply@thicodeai.com'
 